@@ -0,0 +1,55 @@
+from functools import partial
+from asyncio import get_running_loop, wrap_future
+
+from expK8.remoteFS.Node import Node
+
+
+class AsyncNode:
+    """AsyncNode wraps a Node so that its methods can be awaited from asyncio code. Any method of Node can be 
+    called on AsyncNode and returns a coroutine that runs the method on the thread pool of the node. 
+
+        async_node = AsyncNode(node)
+        stdout, stderr, exit_code = await async_node.exec_command(["ls", "-lh"])
+        size = await async_node.get_file_size("~/disk/disk.file")
+
+    Attributes:
+        node: The Node whose methods are called. 
+    """
+    def __init__(
+            self,
+            node: Node 
+    ) -> None:
+        self.node = node 
+        self.host = node.host 
+        self.name = node.name 
+
+
+    async def exec_command(
+            self,
+            command_str_arr: list,
+            timeout: float = None
+    ) -> tuple:
+        """Run a command in the node and wait for it without blocking the event loop. 
+
+        Args:
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            timeout: Seconds to wait before before a remote command times out. 
+        
+        Return:
+            The tuple (stdout, stderr, exit code) of the command. 
+        """
+        return await wrap_future(self.node.submit(command_str_arr, timeout=timeout))
+
+
+    def __getattr__(
+            self,
+            name: str 
+    ):
+        attr = getattr(self.node, name)
+        if not callable(attr):
+            return attr 
+
+        async def call(*args, **kwargs):
+            loop = get_running_loop()
+            return await loop.run_in_executor(self.node.get_submit_pool(), partial(attr, *args, **kwargs))
+        return call 
@@ -0,0 +1,380 @@
+import os
+import zlib
+import hashlib
+from time import time
+from shlex import quote
+from threading import Lock, Thread
+
+from expK8.remoteFS.SFTPPool import SFTPPool
+from expK8.remoteFS.TransferCheckpoint import TransferCheckpoint
+from expK8.remoteFS.TransferManifest import combine_chunk_digests
+
+
+"""Files are transferred to a temporary '.part' path which is renamed once every chunk has been written, so a
+partially transferred file never has the size of the complete file. Scripts check if a block trace is ready by
+comparing its size in the remote node to the local file, which would pass on a file that was preallocated but
+not completely written.
+"""
+PART_SUFFIX = ".part"
+READ_WINDOW_BYTE = 4*1024*1024
+MAX_PREFETCH_REQUESTS = 64
+
+# Prints the CRC32 of each 'offset:size' chunk of the file given as the first argument.
+REMOTE_CRC_SCRIPT = """import sys, zlib
+with open(sys.argv[1], "rb") as handle:
+    for chunk in sys.argv[2:]:
+        offset, size = map(int, chunk.split(":"))
+        handle.seek(offset)
+        print(zlib.crc32(handle.read(size)))
+"""
+
+
+class ChunkedTransfer:
+    """ChunkedTransfer splits a file into byte ranges and transfers them concurrently over several SFTP sessions
+    of the same node. Each session is a separate channel with its own window, so on high latency links the
+    throughput grows with the number of sessions until the link is saturated. Each thread hashes the chunks it
+    transfers, so the digest of the file is known when the transfer completes without reading the file again.
+
+    Attributes:
+        parallelism: Number of SFTP sessions transferring chunks at the same time.
+        chunk_size_byte: Size of the byte range transferred by a session at a time.
+        _sftp_pool: Pool of SFTP sessions of the node.
+        _host_name: Host name of the node, used to identify checkpoints.
+        _checkpoint_dir: Directory where checkpoints of interrupted transfers are kept, None to not resume transfers.
+        _exec_command: Function that runs a command in the node, used to verify chunks uploaded earlier.
+        _progress_callback: Function called with the number of bytes after every piece is transferred. It is called
+                            from the transfer threads and can block to slow the transfer down.
+    """
+    def __init__(
+            self,
+            sftp_pool: SFTPPool,
+            parallelism: int = 4,
+            chunk_size_byte: int = 16*1024*1024,
+            host_name: str = "",
+            checkpoint_dir: str = None,
+            exec_command = None,
+            progress_callback = None
+    ) -> None:
+        self.parallelism = max(1, parallelism)
+        self.chunk_size_byte = max(1, chunk_size_byte)
+        self._sftp_pool = sftp_pool
+        self._host_name = host_name
+        self._checkpoint_dir = checkpoint_dir
+        self._exec_command = exec_command
+        self._progress_callback = progress_callback
+
+
+    def _get_chunk_list(
+            self,
+            file_size_byte: int
+    ) -> list:
+        """Split a file into byte ranges.
+
+        Args:
+            file_size_byte: Size of the file in bytes.
+
+        Returns:
+            chunk_list: List of tuples (offset, size) covering the file.
+        """
+        return [(offset, min(self.chunk_size_byte, file_size_byte - offset))
+                    for offset in range(0, file_size_byte, self.chunk_size_byte)]
+
+
+    def _run_workers(
+            self,
+            chunk_list: list,
+            worker_fn
+    ) -> None:
+        """Transfer chunks using as many workers as the parallelism. Each worker keeps one SFTP session and takes
+        the next chunk from the list until it is empty, so a slow session transfers fewer chunks.
+
+        Args:
+            chunk_list: List of tuples (offset, size) to transfer.
+            worker_fn: Function that takes a SFTP session and a function returning the next chunk or None.
+
+        Raises:
+            Exception: The first exception raised by a worker, after all workers have stopped.
+        """
+        pending_chunk_list = list(reversed(chunk_list))
+        error_list = []
+        lock = Lock()
+
+        def next_chunk():
+            with lock:
+                if error_list or not pending_chunk_list:
+                    return None
+                return pending_chunk_list.pop()
+
+        def worker():
+            try:
+                with self._sftp_pool.session() as sftp:
+                    worker_fn(sftp, next_chunk)
+            except Exception as e:
+                with lock:
+                    error_list.append(e)
+
+        thread_list = [Thread(target=worker) for _ in range(min(self.parallelism, max(1, len(chunk_list))))]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+
+        if error_list:
+            raise error_list[0]
+
+
+    def _get_report(
+            self,
+            file_size_byte: int,
+            chunk_digest_dict: dict,
+            resumed_byte: int,
+            start_time: float,
+            remote_mtime: int
+    ) -> dict:
+        """Get the report of a completed transfer.
+
+        Args:
+            file_size_byte: Size of the file.
+            chunk_digest_dict: Dictionary of offset of each chunk to its SHA256.
+            resumed_byte: Number of bytes that were transferred earlier and not sent again.
+            start_time: Time when the transfer started.
+            remote_mtime: Modification time of the remote file as returned by SFTP.
+
+        Returns:
+            report: Dictionary with keys 'size_byte', 'chunks', 'parallelism', 'resumed_byte', 'duration_sec',
+                        'throughput_mb_per_sec', the throughput of the bytes sent in this transfer, 'digest',
+                        'chunk_size_byte', the chunk size the digest was computed with, and 'remote_mtime'.
+        """
+        duration_sec = time() - start_time
+        sent_byte = file_size_byte - resumed_byte
+        return {
+            "size_byte": file_size_byte,
+            "chunks": len(chunk_digest_dict),
+            "parallelism": self.parallelism,
+            "resumed_byte": resumed_byte,
+            "duration_sec": duration_sec,
+            "throughput_mb_per_sec": sent_byte/(1024**2)/duration_sec if duration_sec > 0 else 0.0,
+            "digest": combine_chunk_digests([chunk_digest_dict[offset] for offset in sorted(chunk_digest_dict)]),
+            "chunk_size_byte": self.chunk_size_byte,
+            "remote_mtime": remote_mtime
+        }
+
+
+    def _get_checkpoint(
+            self,
+            direction: str,
+            remote_path: str,
+            local_path: str,
+            size_byte: int
+    ) -> TransferCheckpoint:
+        """Get the checkpoint of a transfer. A file that fits in one chunk is not checkpointed, as resuming it
+        would send the whole file again anyway.
+
+        Args:
+            direction: Direction of the transfer, 'upload' or 'download'.
+            remote_path: Path of the file in remote node.
+            local_path: Path of the local file.
+            size_byte: Size of the file transferred.
+
+        Returns:
+            checkpoint: TransferCheckpoint of the transfer, None if the transfer is not resumable.
+        """
+        if self._checkpoint_dir is None or size_byte <= self.chunk_size_byte:
+            return None
+        return TransferCheckpoint.for_transfer(self._checkpoint_dir, direction, self._host_name, remote_path, local_path)
+
+
+    def _get_remote_crc_dict(
+            self,
+            remote_path: str,
+            chunk_list: list
+    ) -> dict:
+        """Compute the CRC32 of chunks of a file in the remote node with a single command.
+
+        Args:
+            remote_path: Path of the file in remote node.
+            chunk_list: List of tuples (offset, size) of chunks.
+
+        Returns:
+            crc_dict: Dictionary of offset of each chunk to its CRC32, empty if the CRC could not be computed.
+        """
+        crc_cmd = ["python3", "-c", quote(REMOTE_CRC_SCRIPT), quote(remote_path)]
+        crc_cmd += ["{}:{}".format(offset, size) for offset, size in chunk_list]
+        stdout, stderr, exit_code = self._exec_command(crc_cmd)
+        if exit_code:
+            return {}
+        return {offset: int(crc) for (offset, _), crc in zip(chunk_list, stdout.split())}
+
+
+    def upload(
+            self,
+            local_path: str,
+            remote_path: str
+    ) -> dict:
+        """Upload a local file to the remote node. If a checkpoint of a previous upload of the same file exists,
+        chunks whose CRC32 in the remote node matches the checkpoint are not sent again.
+
+        Args:
+            local_path: Local path of file to upload.
+            remote_path: Target path in remote node.
+
+        Returns:
+            report: Dictionary with the size, number of chunks, resumed bytes, duration, throughput and digest of
+                        the transfer.
+        """
+        start_time = time()
+        local_stat = os.stat(local_path)
+        chunk_list = self._get_chunk_list(local_stat.st_size)
+        chunk_size_dict = dict(chunk_list)
+        remote_part_path = remote_path + PART_SUFFIX
+
+        # Verifying the remote chunks needs a command, so uploads only resume if commands can be run.
+        checkpoint = self._get_checkpoint("upload", remote_path, local_path, local_stat.st_size) if self._exec_command else None
+        done_dict = {}
+        if checkpoint is not None:
+            done_dict = checkpoint.load(local_stat.st_size, local_stat.st_mtime, self.chunk_size_byte)
+            if done_dict:
+                remote_crc_dict = self._get_remote_crc_dict(remote_part_path, [(offset, chunk_size_dict[offset]) for offset in done_dict])
+                done_dict = {offset: crc for offset, crc in done_dict.items() if remote_crc_dict.get(offset) == crc}
+            checkpoint.reset(done_dict)
+
+        # Chunks that are not sent again are hashed from the local file.
+        chunk_digest_dict = {}
+        with open(local_path, "rb") as local_handle:
+            for offset in done_dict:
+                local_handle.seek(offset)
+                chunk_digest_dict[offset] = hashlib.sha256(local_handle.read(chunk_size_dict[offset])).digest()
+
+        if not done_dict:
+            with self._sftp_pool.session() as sftp:
+                # Create the file so that each session can write its chunks without truncating it.
+                with sftp.open(remote_part_path, "wb"):
+                    pass
+
+        def upload_chunks(sftp, next_chunk):
+            with open(local_path, "rb") as local_handle:
+                chunk = next_chunk()
+                while chunk is not None:
+                    offset, size = chunk
+                    crc, chunk_hash = 0, hashlib.sha256()
+                    local_handle.seek(offset)
+                    # The handle is closed after each chunk so that every write is acknowledged before the chunk
+                    # is recorded in the checkpoint.
+                    with sftp.open(remote_part_path, "r+b") as remote_handle:
+                        remote_handle.set_pipelined(True)
+                        remote_handle.seek(offset)
+                        while size > 0:
+                            data = local_handle.read(min(size, 1024*1024))
+                            remote_handle.write(data)
+                            crc = zlib.crc32(data, crc)
+                            chunk_hash.update(data)
+                            size -= len(data)
+                            if self._progress_callback is not None:
+                                self._progress_callback(len(data))
+                    chunk_digest_dict[offset] = chunk_hash.digest()
+                    if checkpoint is not None:
+                        checkpoint.mark_done(offset, crc)
+                    chunk = next_chunk()
+
+        try:
+            self._run_workers([chunk for chunk in chunk_list if chunk[0] not in done_dict], upload_chunks)
+            with self._sftp_pool.session() as sftp:
+                sftp.posix_rename(remote_part_path, remote_path)
+                remote_mtime = sftp.stat(remote_path).st_mtime
+        except Exception:
+            if checkpoint is None:
+                try:
+                    with self._sftp_pool.session() as sftp:
+                        sftp.remove(remote_part_path)
+                except Exception:
+                    # The connection might be gone, the partial file is replaced by the next upload anyway.
+                    pass
+            raise
+
+        if checkpoint is not None:
+            checkpoint.remove()
+        resumed_byte = sum(chunk_size_dict[offset] for offset in done_dict)
+        return self._get_report(local_stat.st_size, chunk_digest_dict, resumed_byte, start_time, remote_mtime)
+
+
+    def download(
+            self,
+            remote_path: str,
+            local_path: str
+    ) -> dict:
+        """Download a file from the remote node. If a checkpoint of a previous download of the same file exists,
+        chunks whose CRC32 in the local partial file matches the checkpoint are not read again.
+
+        Args:
+            remote_path: Path of file in remote node.
+            local_path: Target local path.
+
+        Returns:
+            report: Dictionary with the size, number of chunks, resumed bytes, duration, throughput and digest of
+                        the transfer.
+        """
+        start_time = time()
+        with self._sftp_pool.session() as sftp:
+            remote_stat = sftp.stat(remote_path)
+        chunk_list = self._get_chunk_list(remote_stat.st_size)
+        chunk_size_dict = dict(chunk_list)
+        local_part_path = str(local_path) + PART_SUFFIX
+
+        checkpoint = self._get_checkpoint("download", remote_path, local_path, remote_stat.st_size)
+        done_dict = {}
+        chunk_digest_dict = {}
+        if checkpoint is not None:
+            done_dict = checkpoint.load(remote_stat.st_size, remote_stat.st_mtime, self.chunk_size_byte)
+            if done_dict and os.path.exists(local_part_path):
+                with open(local_part_path, "rb") as part_handle:
+                    for offset in list(done_dict):
+                        part_handle.seek(offset)
+                        data = part_handle.read(chunk_size_dict[offset])
+                        if zlib.crc32(data) != done_dict[offset]:
+                            done_dict.pop(offset)
+                        else:
+                            chunk_digest_dict[offset] = hashlib.sha256(data).digest()
+            else:
+                done_dict = {}
+            checkpoint.reset(done_dict)
+
+        open_flags = os.O_WRONLY | os.O_CREAT
+        if not done_dict:
+            open_flags |= os.O_TRUNC
+        local_fd = os.open(local_part_path, open_flags, 0o644)
+        def download_chunks(sftp, next_chunk):
+            with sftp.open(remote_path, "rb") as remote_handle:
+                chunk = next_chunk()
+                while chunk is not None:
+                    offset, size = chunk
+                    crc, chunk_hash = 0, hashlib.sha256()
+                    # Reads are prefetched one window at a time, too many outstanding requests slow paramiko down.
+                    for window_offset in range(offset, offset + size, READ_WINDOW_BYTE):
+                        window_size = min(READ_WINDOW_BYTE, offset + size - window_offset)
+                        data = next(remote_handle.readv(
+                                        [(window_offset, window_size)],
+                                        max_concurrent_prefetch_requests=MAX_PREFETCH_REQUESTS))
+                        os.pwrite(local_fd, data, window_offset)
+                        crc = zlib.crc32(data, crc)
+                        chunk_hash.update(data)
+                        if self._progress_callback is not None:
+                            self._progress_callback(len(data))
+                    chunk_digest_dict[offset] = chunk_hash.digest()
+                    if checkpoint is not None:
+                        checkpoint.mark_done(offset, crc)
+                    chunk = next_chunk()
+
+        try:
+            self._run_workers([chunk for chunk in chunk_list if chunk[0] not in done_dict], download_chunks)
+        except Exception:
+            os.close(local_fd)
+            if checkpoint is None:
+                os.remove(local_part_path)
+            raise
+        os.close(local_fd)
+        os.replace(local_part_path, local_path)
+
+        if checkpoint is not None:
+            checkpoint.remove()
+        resumed_byte = sum(chunk_size_dict[offset] for offset in done_dict)
+        return self._get_report(remote_stat.st_size, chunk_digest_dict, resumed_byte, start_time, remote_stat.st_mtime)
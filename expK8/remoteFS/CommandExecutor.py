@@ -0,0 +1,332 @@
+from io import BytesIO
+from time import time
+from codecs import getincrementaldecoder
+from select import select
+from threading import BoundedSemaphore, Lock
+
+from paramiko import SSHClient, Channel
+
+from expK8.remoteFS.NodeException import RemoteCommandTimeout, ChannelOpenError
+
+
+# Seconds between checks for window space while stdin is pending, as a window adjust does not wake up select.
+SEND_POLL_INTERVAL_SEC = 0.002
+
+"""According to channel documentation, the call to recv_exit_status can hang indefinitely
+if the channel has not yet received any bytes from remote node where command was run. So instead
+of blocking on recv_exit_status, we wait on the channel with select and read stdout and stderr
+as they become ready until the exit status arrives or the timeout expires. When the timeout
+expires the channel is closed so that nothing is left running on our side.
+
+Ref: https://docs.paramiko.org/en/stable/api/channel.html (last checked 16/07/2023)
+"""
+class CommandExecutor:
+    """CommandExecutor runs commands in a remote node on channels of a single SSH transport. The number of
+    channels open at the same time is bounded since SSH servers limit the number of sessions per connection.
+
+    Attributes:
+        host: Host name of the remote node.
+        max_channels: Maximum number of channels running commands at the same time.
+        _ssh: SSHClient whose transport is used to open channels.
+        _slots: Semaphore bounding the number of channels open at the same time.
+        _in_flight: Set of channels currently running a command.
+        _timed_out_count: Number of commands whose channel was closed due to timeout.
+        _leaked_count: Number of channels closed due to timeout that were still open after closing or whose
+                        remote command had not exited, so the command may still be running in the remote node.
+        _lock: Lock protecting the channel bookkeeping.
+    """
+    def __init__(
+            self,
+            host_name: str,
+            ssh_client: SSHClient,
+            max_channels: int = 8,
+            poll_interval_sec: float = 1.0
+    ) -> None:
+        self.host = host_name
+        self.max_channels = max_channels
+        self._ssh = ssh_client
+        self._poll_interval_sec = poll_interval_sec
+        self._slots = BoundedSemaphore(max_channels)
+        self._in_flight = set()
+        self._timed_out_count = 0
+        self._leaked_count = 0
+        self._lock = Lock()
+
+
+    def set_client(
+            self,
+            ssh_client: SSHClient
+    ) -> None:
+        """Replace the SSHClient used to open channels.
+
+        Args:
+            ssh_client: New SSHClient to open channels with.
+        """
+        self._ssh = ssh_client
+
+
+    def get_stats(self) -> dict:
+        """Get the number of channels in flight, of commands that timed out and of those that may still be running
+        in the remote node after their channel was closed.
+
+        Returns:
+            stats: Dictionary with keys 'in_flight', 'timed_out', 'leaked' and 'max_channels'.
+        """
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "timed_out": self._timed_out_count,
+                "leaked": self._leaked_count,
+                "max_channels": self.max_channels
+            }
+
+
+    def _open_channel(
+            self,
+            command_str: str,
+            combine_stderr: bool = False
+    ) -> Channel:
+        """Open a channel and start a command on it.
+
+        Args:
+            command_str: The command to run in remote node.
+            combine_stderr: If True, stderr of the command is interleaved with its stdout.
+
+        Returns:
+            channel: The channel running the command.
+
+        Raises:
+            ChannelOpenError: If the channel could not be opened. The command did not run.
+        """
+        try:
+            transport = self._ssh.get_transport()
+            if transport is None or not transport.is_active():
+                raise ConnectionError("SSH transport is not active")
+            channel = transport.open_session(timeout=self._poll_interval_sec * 10)
+        except Exception as e:
+            raise ChannelOpenError(self.host, e)
+
+        with self._lock:
+            self._in_flight.add(channel)
+        try:
+            channel.settimeout(self._poll_interval_sec)
+            channel.set_combine_stderr(combine_stderr)
+            channel.exec_command(command_str)
+        except Exception as e:
+            self._close_channel(channel)
+            raise ChannelOpenError(self.host, e)
+        return channel
+
+
+    def _close_channel(
+            self,
+            channel: Channel,
+            timed_out: bool = False
+    ) -> None:
+        """Close a channel and remove it from the channels in flight. A channel closed because its command timed
+        out is counted as leaked if it is still open or its command had not exited. Closing the channel does not
+        kill a command run without a terminal, so it keeps running in the remote node.
+
+        Args:
+            channel: The channel to close.
+            timed_out: Boolean indicating if the channel is closed because its command timed out.
+        """
+        # A closed channel always reports its exit status as ready, so check before closing.
+        exited = channel.exit_status_ready()
+        try:
+            channel.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._in_flight.discard(channel)
+            if timed_out and (not exited or not channel.closed):
+                self._leaked_count += 1
+
+
+    def _acquire_slot(
+            self,
+            command_str: str,
+            timeout: float
+    ) -> None:
+        """Wait for a free channel slot.
+
+        Args:
+            command_str: The command waiting for a slot.
+            timeout: Maximum seconds to wait, None to wait forever.
+
+        Raises:
+            RemoteCommandTimeout: If no slot was freed before the timeout.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._timed_out_count += 1
+            raise RemoteCommandTimeout([command_str], self.host, timeout, "", "")
+
+
+    def run(
+            self,
+            command_str: str,
+            timeout: float = None,
+            stdin_bytes: bytes = None,
+            stdin_file = None,
+            stdout_file = None
+    ) -> tuple:
+        """Run a command in remote node and wait for it to complete.
+
+        Args:
+            command_str: The command to run in remote node.
+            timeout: Seconds to wait for the command to complete, None to wait forever.
+            stdin_bytes: Bytes written to the stdin of the command, which is closed after they are written.
+            stdin_file: Readable binary file whose contents are streamed to the stdin of the command.
+            stdout_file: Writable binary file that stdout is streamed to instead of being returned.
+
+        Returns:
+            The tuple (stdout, stderr, exit code) of the command.
+
+        Raises:
+            ChannelOpenError: If the channel could not be opened. The command did not run.
+            RemoteCommandTimeout: If the command did not complete before the timeout. Its channel is closed.
+        """
+        start_time = time()
+        self._acquire_slot(command_str, timeout)
+        try:
+            channel = self._open_channel(command_str)
+            timed_out = False
+            stdout_bytes, stderr_bytes = bytearray(), bytearray()
+            if stdin_bytes is not None:
+                stdin_file = BytesIO(stdin_bytes)
+            stdin_view = None if stdin_file is None else memoryview(b"")
+            try:
+                while True:
+                    remaining = None if timeout is None else timeout - (time() - start_time)
+                    if remaining is not None and remaining <= 0:
+                        timed_out = True
+                        with self._lock:
+                            self._timed_out_count += 1
+                        raise RemoteCommandTimeout(
+                                [command_str],
+                                self.host,
+                                timeout,
+                                stdout_bytes.decode("utf-8", errors="replace"),
+                                stderr_bytes.decode("utf-8", errors="replace"))
+
+                    if stdin_view is not None and channel.send_ready():
+                        # Stdin is written as the window allows so that output is read while it is sent.
+                        if not len(stdin_view):
+                            stdin_view = memoryview(stdin_file.read(32768))
+                        if len(stdin_view):
+                            stdin_view = stdin_view[channel.send(stdin_view):]
+                        else:
+                            channel.shutdown_write()
+                            stdin_view = None
+                        continue
+
+                    if channel.recv_ready():
+                        if stdout_file is None:
+                            stdout_bytes += channel.recv(32768)
+                        else:
+                            stdout_file.write(channel.recv(32768))
+                    elif channel.recv_stderr_ready():
+                        stderr_bytes += channel.recv_stderr(32768)
+                    elif channel.exit_status_ready():
+                        # Data is sent before the exit status, so whatever remains is already buffered.
+                        while channel.recv_ready():
+                            if stdout_file is None:
+                                stdout_bytes += channel.recv(32768)
+                            else:
+                                stdout_file.write(channel.recv(32768))
+                        while channel.recv_stderr_ready():
+                            stderr_bytes += channel.recv_stderr(32768)
+                        break
+                    else:
+                        wait_sec = self._poll_interval_sec if remaining is None else min(self._poll_interval_sec, remaining)
+                        if stdin_view is not None:
+                            # The send window is full. Paramiko only signals inbound data on fileno, so a window
+                            # adjust from the remote node is noticed by polling send_ready.
+                            select([channel], [], [], min(SEND_POLL_INTERVAL_SEC, wait_sec))
+                        elif channel.eof_received:
+                            # The pipe behind fileno is always readable after EOF, wait for the exit status instead.
+                            channel.status_event.wait(wait_sec)
+                        else:
+                            select([channel], [], [], wait_sec)
+                exit_code = channel.recv_exit_status()
+            finally:
+                self._close_channel(channel, timed_out=timed_out)
+        finally:
+            self._slots.release()
+        return stdout_bytes.decode("utf-8"), stderr_bytes.decode("utf-8"), exit_code
+
+
+    def stream(
+            self,
+            command_str: str,
+            timeout: float = None,
+            combine_stderr: bool = False
+    ):
+        """Run a command in remote node and yield lines of its stdout as they arrive. Stdout is only read from
+        the channel when the next line is requested, so a slow consumer makes the remote command block on a full
+        channel window instead of its output piling up in memory.
+
+        Args:
+            command_str: The command to run in remote node.
+            timeout: Seconds to wait for the command to complete, None to wait forever.
+            combine_stderr: If True, lines of stderr are yielded interleaved with lines of stdout.
+
+        Yields:
+            line: Decoded line of stdout without the trailing newline.
+
+        Returns:
+            The tuple (stderr, exit code) of the command, which is the value of a 'yield from' expression.
+
+        Raises:
+            ChannelOpenError: If the channel could not be opened. The command did not run.
+            RemoteCommandTimeout: If the command did not complete before the timeout. Its channel is closed.
+        """
+        start_time = time()
+        self._acquire_slot(command_str, timeout)
+        try:
+            channel = self._open_channel(command_str, combine_stderr=combine_stderr)
+            decoder = getincrementaldecoder("utf-8")(errors="replace")
+            pending_str, stderr_bytes = "", bytearray()
+            timed_out = False
+            try:
+                while True:
+                    remaining = None if timeout is None else timeout - (time() - start_time)
+                    if remaining is not None and remaining <= 0:
+                        timed_out = True
+                        with self._lock:
+                            self._timed_out_count += 1
+                        raise RemoteCommandTimeout(
+                                [command_str],
+                                self.host,
+                                timeout,
+                                pending_str,
+                                stderr_bytes.decode("utf-8", errors="replace"))
+
+                    if channel.recv_ready():
+                        pending_str += decoder.decode(channel.recv(32768))
+                        *line_list, pending_str = pending_str.split("\n")
+                        for line in line_list:
+                            yield line
+                    elif channel.recv_stderr_ready():
+                        stderr_bytes += channel.recv_stderr(32768)
+                    elif channel.exit_status_ready():
+                        # Data is sent before the exit status, so loop again if any arrived after the checks above.
+                        if not channel.recv_ready() and not channel.recv_stderr_ready():
+                            break
+                    else:
+                        wait_sec = self._poll_interval_sec if remaining is None else min(self._poll_interval_sec, remaining)
+                        if channel.eof_received:
+                            channel.status_event.wait(wait_sec)
+                        else:
+                            select([channel], [], [], wait_sec)
+
+                pending_str += decoder.decode(b"", final=True)
+                if pending_str:
+                    yield pending_str
+                exit_code = channel.recv_exit_status()
+            finally:
+                self._close_channel(channel, timed_out=timed_out)
+        finally:
+            self._slots.release()
+        return stderr_bytes.decode("utf-8"), exit_code
@@ -0,0 +1,387 @@
+import os
+import zlib
+import lzma
+from time import time
+from shlex import quote
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from expK8.remoteFS.NodeException import RemoteRuntimeError
+from expK8.remoteFS.TransferManifest import ChunkedDigest
+
+
+"""Each codec maps to its default level, to the factories of its local compressor and decompressor, which are
+objects with the compress/flush and decompress methods of zlib, and to the remote commands that compress a file to
+stdout and decompress stdin to stdout. zstd is only used if the zstandard package is installed locally.
+"""
+CODEC_DICT = {
+    "gzip": {
+        "default_level": 6,
+        "compressor": lambda level: zlib.compressobj(level, zlib.DEFLATED, 31),
+        "decompressor": lambda: zlib.decompressobj(31),
+        "remote_compress": "gzip -c -{level} {path}",
+        "remote_decompress": "gzip -dc"
+    },
+    "xz": {
+        "default_level": 1,
+        "compressor": lambda level: lzma.LZMACompressor(preset=level),
+        "decompressor": lambda: lzma.LZMADecompressor(),
+        "remote_compress": "xz -c -{level} -T0 {path}",
+        "remote_decompress": "xz -dc"
+    },
+    "zstd": {
+        "default_level": 3,
+        "compressor": lambda level: zstandard.ZstdCompressor(level=level).compressobj(),
+        "decompressor": lambda: zstandard.ZstdDecompressor().decompressobj(),
+        "remote_compress": "zstd -c -q -{level} {path}",
+        "remote_decompress": "zstd -dc -q"
+    }
+}
+
+# Bandwidth assumed when picking a codec for a node whose link has not been measured yet.
+DEFAULT_BANDWIDTH_MB_PER_SEC = 12.5
+
+# Codec and level pairs tried when the codec is picked adaptively, from fastest to strongest.
+CANDIDATE_LIST = [("zstd", 1), ("gzip", 1), ("zstd", 3), ("gzip", 6), ("zstd", 9), ("xz", 1)]
+
+# Prints the size of the sample, then the compressed size and nanoseconds taken by each available codec.
+REMOTE_PROBE_SCRIPT = """f={path}
+head -c {sample_size} "$f" | wc -c
+for candidate in {candidates}; do
+    codec=${{candidate%:*}}; level=${{candidate#*:}}
+    command -v $codec > /dev/null || continue
+    start=$(date +%s%N)
+    size=$(head -c {sample_size} "$f" | $codec -c -$level | wc -c)
+    echo "$codec $level $size $(( $(date +%s%N) - start ))"
+done
+"""
+
+
+class _CompressedReader:
+    """Readable stream of the compressed contents of a file."""
+    def __init__(
+            self,
+            file_handle,
+            compressor,
+            digest: ChunkedDigest,
+            progress_callback = None
+    ) -> None:
+        self.raw_byte = 0
+        self.compressed_byte = 0
+        self.digest = digest
+        self._file_handle = file_handle
+        self._compressor = compressor
+        self._progress_callback = progress_callback
+        self._buffer = bytearray()
+        self._eof = False
+
+
+    def read(
+            self,
+            size: int
+    ) -> bytes:
+        while len(self._buffer) < size and not self._eof:
+            data = self._file_handle.read(1024*1024)
+            if data:
+                self.raw_byte += len(data)
+                self.digest.update(data)
+                self._buffer += self._compressor.compress(data)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.compressed_byte += len(data)
+        if self._progress_callback is not None and data:
+            self._progress_callback(len(data))
+        return data
+
+
+class _DecompressedWriter:
+    """Writable stream that decompresses data into a file."""
+    def __init__(
+            self,
+            file_handle,
+            decompressor,
+            digest: ChunkedDigest,
+            progress_callback = None
+    ) -> None:
+        self.raw_byte = 0
+        self.compressed_byte = 0
+        self.digest = digest
+        self._file_handle = file_handle
+        self._decompressor = decompressor
+        self._progress_callback = progress_callback
+
+
+    def write(
+            self,
+            data: bytes
+    ) -> None:
+        self.compressed_byte += len(data)
+        if self._progress_callback is not None:
+            self._progress_callback(len(data))
+        data = self._decompressor.decompress(data)
+        self.raw_byte += len(data)
+        self.digest.update(data)
+        self._file_handle.write(data)
+
+
+class CompressedTransfer:
+    """CompressedTransfer streams a file to or from a remote node through a compressor on the sending side and
+    a decompressor on the receiving side, using a single channel whose stdin or stdout carries the compressed
+    data. The codec and level can be picked adaptively by compressing a sample of the file and estimating the
+    time to transfer it with each codec given the bandwidth of the link. The uncompressed data is hashed as it
+    streams, giving the same digest as a ChunkedTransfer with the same chunk size.
+
+    Attributes:
+        host: Host name of the remote node.
+        _exec_command: Function that runs a command in the node, Node.exec_command.
+        _sample_size_byte: Size of the sample of the file compressed to pick the codec.
+        _chunk_size_byte: Chunk size the digest of the file is computed with.
+    """
+    def __init__(
+            self,
+            host_name: str,
+            exec_command,
+            sample_size_byte: int = 4*1024*1024,
+            chunk_size_byte: int = 16*1024*1024
+    ) -> None:
+        self.host = host_name
+        self._exec_command = exec_command
+        self._sample_size_byte = sample_size_byte
+        self._chunk_size_byte = chunk_size_byte
+
+
+    @staticmethod
+    def get_local_codec_list() -> list:
+        """Get the codecs that can be used locally.
+
+        Returns:
+            codec_list: List of names of codecs available locally.
+        """
+        return [codec for codec in CODEC_DICT if codec != "zstd" or zstandard is not None]
+
+
+    @staticmethod
+    def _pick_candidate(
+            probe_list: list,
+            bandwidth_mb_per_sec: float
+    ) -> tuple:
+        """Pick the codec with the lowest estimated transfer time. Compression and transfer overlap so the time
+        to transfer a MB of the file is the larger of the time to compress it and the time to send it compressed.
+
+        Args:
+            probe_list: List of tuples (codec, level, compression ratio, compression speed in MB/s).
+            bandwidth_mb_per_sec: Bandwidth of the link.
+
+        Returns:
+            candidate: Tuple (codec, level), or None if sending the file uncompressed is fastest.
+        """
+        best_candidate, best_sec_per_mb = None, 1/bandwidth_mb_per_sec
+        for codec, level, ratio, speed_mb_per_sec in probe_list:
+            sec_per_mb = max(1/speed_mb_per_sec if speed_mb_per_sec > 0 else float("inf"), ratio/bandwidth_mb_per_sec)
+            # Compressed transfers use a single stream, so only switch for a clear gain.
+            if sec_per_mb < 0.8 * best_sec_per_mb:
+                best_candidate, best_sec_per_mb = (codec, level), sec_per_mb
+        return best_candidate
+
+
+    def get_remote_codec_list(self) -> list:
+        """Get the codecs that can be used in the remote node.
+
+        Returns:
+            codec_list: List of names of codecs available in both the remote node and locally.
+        """
+        local_codec_list = self.get_local_codec_list()
+        check_cmd = ["for", "codec", "in"] + local_codec_list + ["; do command -v $codec > /dev/null && echo $codec; done"]
+        stdout, stderr, exit_code = self._exec_command(check_cmd)
+        return [codec for codec in stdout.split() if codec in local_codec_list]
+
+
+    def choose_upload_codec(
+            self,
+            local_path: str,
+            bandwidth_mb_per_sec: float
+    ) -> tuple:
+        """Pick the codec to upload a file by compressing a sample of it locally with each candidate.
+
+        Args:
+            local_path: Local path of file to upload.
+            bandwidth_mb_per_sec: Bandwidth of the link.
+
+        Returns:
+            candidate: Tuple (codec, level), or None if the file should be sent uncompressed.
+        """
+        with open(local_path, "rb") as local_handle:
+            sample = local_handle.read(self._sample_size_byte)
+        if not sample:
+            return None
+
+        remote_codec_list = self.get_remote_codec_list()
+        probe_list = []
+        for codec, level in CANDIDATE_LIST:
+            if codec not in remote_codec_list:
+                continue
+            start_time = time()
+            compressor = CODEC_DICT[codec]["compressor"](level)
+            compressed_size = len(compressor.compress(sample)) + len(compressor.flush())
+            duration_sec = time() - start_time
+            probe_list.append((codec, level, compressed_size/len(sample), len(sample)/(1024**2)/max(duration_sec, 1e-6)))
+        return self._pick_candidate(probe_list, bandwidth_mb_per_sec)
+
+
+    def choose_download_codec(
+            self,
+            remote_path: str,
+            bandwidth_mb_per_sec: float
+    ) -> tuple:
+        """Pick the codec to download a file by compressing a sample of it in the remote node with each candidate.
+
+        Args:
+            remote_path: Path of file in remote node.
+            bandwidth_mb_per_sec: Bandwidth of the link.
+
+        Returns:
+            candidate: Tuple (codec, level), or None if the file should be sent uncompressed.
+        """
+        local_codec_list = self.get_local_codec_list()
+        candidate_str = " ".join(["{}:{}".format(codec, level) for codec, level in CANDIDATE_LIST if codec in local_codec_list])
+        probe_script = REMOTE_PROBE_SCRIPT.format(path=quote(remote_path), sample_size=self._sample_size_byte, candidates=candidate_str)
+        stdout, stderr, exit_code = self._exec_command(["bash", "-s"], stdin_str=probe_script)
+        output_line_list = stdout.strip().split("\n")
+        if exit_code or not output_line_list[0].strip().isdigit() or int(output_line_list[0]) == 0:
+            return None
+
+        sample_size_byte = int(output_line_list[0])
+        probe_list = []
+        for output_line in output_line_list[1:]:
+            codec, level, compressed_size, duration_ns = output_line.split()
+            speed_mb_per_sec = sample_size_byte/(1024**2)/max(int(duration_ns)/1e9, 1e-6)
+            probe_list.append((codec, int(level), int(compressed_size)/sample_size_byte, speed_mb_per_sec))
+        return self._pick_candidate(probe_list, bandwidth_mb_per_sec)
+
+
+    def _get_report(
+            self,
+            codec: str,
+            level: int,
+            raw_byte: int,
+            compressed_byte: int,
+            digest: ChunkedDigest,
+            start_time: float,
+            remote_mtime: int = None
+    ) -> dict:
+        """Get the report of a completed transfer.
+
+        Returns:
+            report: Dictionary with keys 'size_byte', 'compressed_byte', 'codec', 'level', 'duration_sec',
+                        'throughput_mb_per_sec', the throughput of the uncompressed file, 'digest',
+                        'chunk_size_byte', the chunk size the digest was computed with, and 'remote_mtime', the
+                        modification time of the remote file if it is known.
+        """
+        duration_sec = time() - start_time
+        return {
+            "size_byte": raw_byte,
+            "compressed_byte": compressed_byte,
+            "codec": codec,
+            "level": level,
+            "duration_sec": duration_sec,
+            "throughput_mb_per_sec": raw_byte/(1024**2)/duration_sec if duration_sec > 0 else 0.0,
+            "digest": digest.hexdigest(),
+            "chunk_size_byte": self._chunk_size_byte,
+            "remote_mtime": remote_mtime
+        }
+
+
+    def upload(
+            self,
+            local_path: str,
+            remote_path: str,
+            codec: str,
+            level: int,
+            progress_callback = None
+    ) -> dict:
+        """Upload a local file compressing it locally and decompressing it in the remote node.
+
+        Args:
+            local_path: Local path of file to upload.
+            remote_path: Target path in remote node.
+            codec: Name of the codec.
+            level: Compression level.
+            progress_callback: Function called with the number of compressed bytes as they are transferred.
+
+        Returns:
+            report: Dictionary with the size, compressed size, codec, duration and throughput of the transfer.
+
+        Raises:
+            RemoteRuntimeError: If the remote decompression failed.
+        """
+        start_time = time()
+        remote_part_path = remote_path + ".part"
+        # The modification time of the uploaded file is printed so it does not take another command to get it.
+        upload_cmd = ["{} > {} && mv {} {} && stat -c %Y {}".format(
+                        CODEC_DICT[codec]["remote_decompress"],
+                        quote(remote_part_path),
+                        quote(remote_part_path),
+                        quote(remote_path),
+                        quote(remote_path))]
+        with open(local_path, "rb") as local_handle:
+            reader = _CompressedReader(
+                        local_handle,
+                        CODEC_DICT[codec]["compressor"](level),
+                        ChunkedDigest(self._chunk_size_byte),
+                        progress_callback)
+            stdout, stderr, exit_code = self._exec_command(upload_cmd, stdin_file=reader)
+        if exit_code:
+            raise RemoteRuntimeError(upload_cmd, self.host, exit_code, stdout, stderr)
+        remote_mtime = int(stdout.split()[-1]) if stdout.split() and stdout.split()[-1].isdigit() else None
+        return self._get_report(codec, level, reader.raw_byte, reader.compressed_byte, reader.digest, start_time, remote_mtime)
+
+
+    def download(
+            self,
+            remote_path: str,
+            local_path: str,
+            codec: str,
+            level: int,
+            progress_callback = None
+    ) -> dict:
+        """Download a file compressing it in the remote node and decompressing it locally.
+
+        Args:
+            remote_path: Path of file in remote node.
+            local_path: Target local path.
+            codec: Name of the codec.
+            level: Compression level.
+            progress_callback: Function called with the number of compressed bytes as they are transferred.
+
+        Returns:
+            report: Dictionary with the size, compressed size, codec, duration and throughput of the transfer.
+
+        Raises:
+            RemoteRuntimeError: If the remote compression failed.
+        """
+        start_time = time()
+        local_part_path = str(local_path) + ".part"
+        download_cmd = [CODEC_DICT[codec]["remote_compress"].format(level=level, path=quote(remote_path))]
+        try:
+            with open(local_part_path, "wb") as local_handle:
+                decompressor = CODEC_DICT[codec]["decompressor"]()
+                writer = _DecompressedWriter(local_handle, decompressor, ChunkedDigest(self._chunk_size_byte), progress_callback)
+                stdout, stderr, exit_code = self._exec_command(download_cmd, stdout_file=writer)
+                if exit_code:
+                    raise RemoteRuntimeError(download_cmd, self.host, exit_code, stdout, stderr)
+                if hasattr(decompressor, "flush"):
+                    data = decompressor.flush()
+                    writer.digest.update(data)
+                    local_handle.write(data)
+            os.replace(local_part_path, local_path)
+        finally:
+            # The partial file is removed whether the command failed, timed out or the channel closed.
+            if os.path.exists(local_part_path):
+                os.remove(local_part_path)
+        return self._get_report(codec, level, os.path.getsize(local_path), writer.compressed_byte, writer.digest, start_time)
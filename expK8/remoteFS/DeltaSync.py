@@ -0,0 +1,161 @@
+import os
+import shutil
+import hashlib
+from json import loads
+from time import time
+from shlex import quote
+
+from expK8.remoteFS.SFTPPool import SFTPPool
+from expK8.remoteFS.ChunkedTransfer import READ_WINDOW_BYTE, MAX_PREFETCH_REQUESTS
+from expK8.remoteFS.NodeException import RemoteRuntimeError
+
+
+# Prints the size, SHA1 of each block and SHA256 of the file given as the first argument as JSON.
+REMOTE_HASH_SCRIPT = """import sys, json, hashlib
+block_size, file_hash, block_hash_list, size = int(sys.argv[2]), hashlib.sha256(), [], 0
+with open(sys.argv[1], "rb") as handle:
+    for block in iter(lambda: handle.read(block_size), b""):
+        file_hash.update(block)
+        block_hash_list.append(hashlib.sha1(block).hexdigest())
+        size += len(block)
+print(json.dumps({"size": size, "blocks": block_hash_list, "sha256": file_hash.hexdigest()}))
+"""
+
+
+class DeltaSync:
+    """DeltaSync updates a local copy of a remote file by transferring only the blocks that differ. The SHA1 of
+    each fixed size block is computed on both sides, the remote node computing its hashes with a single python3
+    command, and only blocks whose hash differs or that are past the end of the local copy are read over SFTP.
+    The updated copy is verified against the SHA256 of the remote file before it replaces the local file.
+
+    Attributes:
+        host: Host name of the remote node.
+        block_size_byte: Size of the blocks that are compared.
+        _exec_command: Function that runs a command in the node, Node.exec_command.
+        _sftp_pool: Pool of SFTP sessions of the node.
+    """
+    def __init__(
+            self,
+            host_name: str,
+            exec_command,
+            sftp_pool: SFTPPool,
+            block_size_byte: int = 1024*1024
+    ) -> None:
+        self.host = host_name
+        self.block_size_byte = block_size_byte
+        self._exec_command = exec_command
+        self._sftp_pool = sftp_pool
+
+
+    def get_remote_hashes(
+            self,
+            remote_path: str
+    ) -> dict:
+        """Compute the block hashes of a file in the remote node.
+
+        Args:
+            remote_path: Path of file in remote node.
+
+        Returns:
+            hash_dict: Dictionary with keys 'size', 'blocks' and 'sha256'.
+
+        Raises:
+            RemoteRuntimeError: If the hashes could not be computed in the remote node.
+        """
+        hash_cmd = ["python3", "-c", quote(REMOTE_HASH_SCRIPT), quote(remote_path), str(self.block_size_byte)]
+        stdout, stderr, exit_code = self._exec_command(hash_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(hash_cmd, self.host, exit_code, stdout, stderr)
+        return loads(stdout)
+
+
+    def get_local_hashes(
+            self,
+            local_path: str
+    ) -> dict:
+        """Compute the block hashes of a local file.
+
+        Args:
+            local_path: Local path of file.
+
+        Returns:
+            hash_dict: Dictionary with keys 'size', 'blocks' and 'sha256', with no blocks if the file does not exist.
+        """
+        file_hash, block_hash_list, size = hashlib.sha256(), [], 0
+        if os.path.exists(local_path):
+            with open(local_path, "rb") as handle:
+                for block in iter(lambda: handle.read(self.block_size_byte), b""):
+                    file_hash.update(block)
+                    block_hash_list.append(hashlib.sha1(block).hexdigest())
+                    size += len(block)
+        return {"size": size, "blocks": block_hash_list, "sha256": file_hash.hexdigest()}
+
+
+    def sync_file(
+            self,
+            remote_path: str,
+            local_path: str
+    ) -> dict:
+        """Update a local file to match a file in the remote node.
+
+        Args:
+            remote_path: Path of file in remote node.
+            local_path: Local path of file to update.
+
+        Returns:
+            report: Dictionary with keys 'size_byte', 'blocks', 'changed_blocks', 'fetched_byte', 'sha256',
+                        'verified' and 'duration_sec'. If the updated copy does not match the SHA256 of the remote
+                        file, which happens when the file changes during the sync, 'verified' is False and the
+                        local file is left unchanged.
+        """
+        start_time = time()
+        remote_hash_dict = self.get_remote_hashes(remote_path)
+        local_hash_dict = self.get_local_hashes(local_path)
+
+        report = {
+            "size_byte": remote_hash_dict["size"],
+            "blocks": len(remote_hash_dict["blocks"]),
+            "changed_blocks": 0,
+            "fetched_byte": 0,
+            "sha256": remote_hash_dict["sha256"],
+            "verified": True,
+            "duration_sec": 0.0
+        }
+        if local_hash_dict["sha256"] == remote_hash_dict["sha256"] and local_hash_dict["size"] == remote_hash_dict["size"]:
+            report["duration_sec"] = time() - start_time
+            return report
+
+        changed_block_list = []
+        for block_index, block_hash in enumerate(remote_hash_dict["blocks"]):
+            if block_index >= len(local_hash_dict["blocks"]) or local_hash_dict["blocks"][block_index] != block_hash:
+                offset = block_index * self.block_size_byte
+                changed_block_list.append((offset, min(self.block_size_byte, remote_hash_dict["size"] - offset)))
+
+        # Blocks are written to a copy so the local file stays intact if the sync fails.
+        local_part_path = str(local_path) + ".part"
+        if os.path.exists(local_path):
+            shutil.copyfile(local_path, local_part_path)
+        with open(local_part_path, "ab") as part_handle:
+            part_handle.truncate(remote_hash_dict["size"])
+
+        with open(local_part_path, "r+b") as part_handle, self._sftp_pool.session() as sftp:
+            with sftp.open(remote_path, "rb") as remote_handle:
+                # Blocks are prefetched a window at a time, too many outstanding requests slow paramiko down.
+                batch_size = max(1, READ_WINDOW_BYTE//self.block_size_byte)
+                for batch_index in range(0, len(changed_block_list), batch_size):
+                    batch_block_list = changed_block_list[batch_index:batch_index + batch_size]
+                    data_iter = remote_handle.readv(batch_block_list, max_concurrent_prefetch_requests=MAX_PREFETCH_REQUESTS)
+                    for (offset, _), data in zip(batch_block_list, data_iter):
+                        part_handle.seek(offset)
+                        part_handle.write(data)
+                        report["fetched_byte"] += len(data)
+        report["changed_blocks"] = len(changed_block_list)
+
+        part_hash_dict = self.get_local_hashes(local_part_path)
+        if part_hash_dict["sha256"] != remote_hash_dict["sha256"]:
+            os.remove(local_part_path)
+            report["verified"] = False
+        else:
+            os.replace(local_part_path, local_path)
+        report["duration_sec"] = time() - start_time
+        return report
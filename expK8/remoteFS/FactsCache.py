@@ -0,0 +1,79 @@
+from time import time 
+from copy import deepcopy
+from threading import Lock
+
+
+class FactsCache:
+    """FactsCache stores facts about a remote node, such as its block devices, for a limited time so that 
+    repeated lookups do not need a round trip to the remote node. 
+
+    Attributes:
+        ttl_sec: Seconds for which a fact stays valid after it is stored. 
+        _facts: Dictionary of fact name to a tuple of (time stored, value). 
+        _lock: Lock to allow multiple threads to use the cache. 
+    """
+    def __init__(
+            self,
+            ttl_sec: float = 60
+    ) -> None:
+        self.ttl_sec = ttl_sec 
+        self._facts = {}
+        self._lock = Lock()
+
+
+    def get(
+            self,
+            key: str,
+            copy: bool = True 
+    ):
+        """Get a fact if it has not expired. 
+
+        Args:
+            key: Name of the fact. 
+            copy: If False, return the stored value itself, for values that are never modified. 
+        
+        Returns:
+            value: A copy of the value of the fact, None if it was not found or has expired. 
+        """
+        with self._lock:
+            if key not in self._facts:
+                return None 
+            
+            store_time, value = self._facts[key]
+            if time() - store_time > self.ttl_sec:
+                del self._facts[key]
+                return None 
+            return deepcopy(value) if copy else value
+
+
+    def set(
+            self,
+            key: str,
+            value,
+            copy: bool = True 
+    ) -> None:
+        """Store a fact. 
+
+        Args:
+            key: Name of the fact. 
+            value: Value of the fact. 
+            copy: If False, store the value itself, for values that are never modified. 
+        """
+        with self._lock:
+            self._facts[key] = (time(), deepcopy(value) if copy else value)
+
+
+    def invalidate(
+            self,
+            key: str = None 
+    ) -> None:
+        """Remove a fact or all facts from the cache. 
+
+        Args:
+            key: Name of the fact to remove, None to remove all facts. 
+        """
+        with self._lock:
+            if key is None:
+                self._facts = {}
+            else:
+                self._facts.pop(key, None)
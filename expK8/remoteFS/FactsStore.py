@@ -0,0 +1,138 @@
+from pathlib import Path 
+from threading import Lock
+
+from expK8.remoteFS.JsonFile import load_json, save_json
+
+
+class FactsStore:
+    """FactsStore persists facts discovered about remote nodes (home directory, block devices and mount state) in 
+    a local JSON file so that later invocations can skip discovering and mounting them again. Facts of a host are 
+    keyed by its boot ID, so they are only reused while the remote node has not rebooted. 
+
+    Attributes:
+        path: Path of the local JSON file storing the facts. 
+        _lock: Lock to allow multiple threads to update the file. 
+    """
+    def __init__(
+            self,
+            path: str 
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self._lock = Lock()
+
+
+    @staticmethod
+    def from_config(config: dict):
+        """Create a FactsStore from the 'facts_store_path' of a configuration. 
+
+        Args:
+            config: Dictionary of configuration parameters. 
+        
+        Returns:
+            facts_store: FactsStore using the path in the configuration, None if no path was configured. 
+        """
+        if config.get("facts_store_path") is None:
+            return None 
+        return FactsStore(config["facts_store_path"])
+
+
+    def _load(self) -> dict:
+        """Load all facts from the file. 
+
+        Returns:
+            facts_dict: Dictionary of host name to facts of the host. 
+        """
+        facts_dict = load_json(self.path)
+        # A missing or corrupt file only costs a full discovery, start over. 
+        return {} if facts_dict is None else facts_dict
+
+
+    def _save(
+            self,
+            facts_dict: dict 
+    ) -> None:
+        """Write all facts to the file. The file is replaced atomically so a reader never sees a partial file. 
+
+        Args:
+            facts_dict: Dictionary of host name to facts of the host. 
+        """
+        save_json(self.path, facts_dict)
+
+
+    def get(
+            self,
+            host_name: str,
+            boot_id: str 
+    ) -> dict:
+        """Get facts of a host if they were stored during the current boot of the host. 
+
+        Args:
+            host_name: Host name of the remote node. 
+            boot_id: Current boot ID of the remote node. 
+        
+        Returns:
+            facts: Dictionary of facts of the host, None if no facts are stored for the current boot. 
+        """
+        with self._lock:
+            facts = self._load().get(host_name)
+        if facts is None or facts.get("boot_id") != boot_id:
+            return None 
+        return facts 
+
+
+    def put(
+            self,
+            host_name: str,
+            facts: dict 
+    ) -> None:
+        """Store the facts of a host replacing any previously stored facts. 
+
+        Args:
+            host_name: Host name of the remote node. 
+            facts: Dictionary of facts that includes the key 'boot_id'. 
+        """
+        with self._lock:
+            facts_dict = self._load()
+            facts_dict[host_name] = facts 
+            self._save(facts_dict)
+
+
+    def update(
+            self,
+            host_name: str,
+            boot_id: str,
+            facts: dict 
+    ) -> None:
+        """Update some facts of a host if the stored facts are from the current boot of the host. Facts stored 
+        for an earlier boot are left to be replaced by the next discovery. 
+
+        Args:
+            host_name: Host name of the remote node. 
+            boot_id: Current boot ID of the remote node. 
+            facts: Dictionary of facts to update, a value of None marks the fact as unknown. 
+        """
+        with self._lock:
+            facts_dict = self._load()
+            stored_facts = facts_dict.get(host_name)
+            if stored_facts is None or stored_facts.get("boot_id") != boot_id:
+                return 
+            if all(stored_facts.get(key) == value for key, value in facts.items()):
+                return 
+            stored_facts.update(facts)
+            self._save(facts_dict)
+
+
+    def remove(
+            self,
+            host_name: str 
+    ) -> None:
+        """Remove the facts of a host. 
+
+        Args:
+            host_name: Host name of the remote node. 
+        """
+        with self._lock:
+            facts_dict = self._load()
+            if facts_dict.pop(host_name, None) is None:
+                return 
+            self._save(facts_dict)
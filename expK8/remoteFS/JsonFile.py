@@ -0,0 +1,45 @@
+from os import replace, getpid
+from json import load, dump
+from pathlib import Path
+from threading import get_ident
+
+
+"""Local state such as facts, checkpoints, the trace cache index and the transfer manifest is kept in JSON files
+that several threads and processes read and write. A file is written to a temporary file next to it which then
+replaces it, so a reader never sees a partially written file.
+"""
+
+
+def load_json(path: Path):
+    """Load the data in a JSON file.
+
+    Args:
+        path: Path of the JSON file.
+
+    Returns:
+        data: Data in the file, None if the file does not exist or is corrupt.
+    """
+    try:
+        with path.open("r") as json_handle:
+            return load(json_handle)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_json(
+        path: Path,
+        data,
+        indent: int = 2
+) -> None:
+    """Write data to a JSON file atomically, creating its directory if needed.
+
+    Args:
+        path: Path of the JSON file.
+        data: Data to write.
+        indent: Indent of the JSON, None to write it on a single line.
+    """
+    path.parent.mkdir(exist_ok=True, parents=True)
+    temp_path = path.with_name("{}.{}.{}.tmp".format(path.name, getpid(), get_ident()))
+    with temp_path.open("w") as json_handle:
+        dump(data, json_handle, indent=indent)
+    replace(temp_path, path)
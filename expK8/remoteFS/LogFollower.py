@@ -0,0 +1,132 @@
+from threading import Lock
+
+from expK8.remoteFS.RemoteFS import RemoteFS
+
+
+class LogFollower:
+    """LogFollower follows files that grow in remote nodes, such as replay logs, and returns only the lines that
+    were appended since the last poll. The offset of each file is tracked per host and path.
+
+    Attributes:
+        last_error_dict: Dictionary of host name to the exception raised in the host in the last poll.
+        _remote_fs: RemoteFS used to reach the remote nodes.
+        _max_bytes_per_poll: Maximum number of bytes read from a file in a single poll.
+        _max_parallel: Maximum number of nodes polled at the same time.
+        _offset_dict: Dictionary of host name to a dictionary of path to the offset read up to.
+        _lock: Lock protecting the offsets.
+    """
+    def __init__(
+            self,
+            remote_fs: RemoteFS,
+            max_bytes_per_poll: int = 1024*1024,
+            max_parallel: int = 64
+    ) -> None:
+        self.last_error_dict = {}
+        self._remote_fs = remote_fs
+        self._max_bytes_per_poll = max_bytes_per_poll
+        self._max_parallel = max_parallel
+        self._offset_dict = {}
+        self._lock = Lock()
+
+
+    def follow(
+            self,
+            host_name: str,
+            path: str,
+            from_offset: int = 0
+    ) -> None:
+        """Start following a file in a remote node.
+
+        Args:
+            host_name: Host name of the remote node.
+            path: Path of the file in the remote node.
+            from_offset: Byte offset to start following from, 0 to read the existing contents of the file.
+        """
+        with self._lock:
+            self._offset_dict.setdefault(host_name, {})[path] = from_offset
+
+
+    def unfollow(
+            self,
+            host_name: str,
+            path: str = None
+    ) -> None:
+        """Stop following a file, or all files of a host if no path is given.
+
+        Args:
+            host_name: Host name of the remote node.
+            path: Path of the file in the remote node.
+        """
+        with self._lock:
+            if path is None:
+                self._offset_dict.pop(host_name, None)
+            else:
+                self._offset_dict.get(host_name, {}).pop(path, None)
+
+
+    def get_offset(
+            self,
+            host_name: str,
+            path: str
+    ) -> int:
+        """Get the byte offset a file has been read up to.
+
+        Args:
+            host_name: Host name of the remote node.
+            path: Path of the file in the remote node.
+
+        Returns:
+            offset: Byte offset the file has been read up to, None if the file is not followed.
+        """
+        with self._lock:
+            return self._offset_dict.get(host_name, {}).get(path)
+
+
+    def _poll_node(
+            self,
+            node
+    ) -> dict:
+        """Read the lines appended to the followed files of a node.
+
+        Args:
+            node: Node whose files are read.
+
+        Returns:
+            line_dict: Dictionary of path to the list of new lines in the file.
+        """
+        with self._lock:
+            path_offset_dict = dict(self._offset_dict.get(node.host, {}))
+
+        line_dict = {}
+        for path, offset in path_offset_dict.items():
+            try:
+                text, new_offset = node.tail(path, from_offset=offset, max_bytes=self._max_bytes_per_poll, whole_lines=True)
+            except FileNotFoundError:
+                # The file has not been created yet.
+                text, new_offset = "", 0
+
+            line_dict[path] = text.splitlines()
+            with self._lock:
+                if path in self._offset_dict.get(node.host, {}):
+                    self._offset_dict[node.host][path] = new_offset
+        return line_dict
+
+
+    def poll(self) -> dict:
+        """Read the lines appended to all followed files since the last poll.
+
+        Returns:
+            poll_dict: Dictionary of host name to a dictionary of path to the list of new lines in the file. Hosts
+                        that raised an exception are left out and the exception is kept in last_error_dict.
+        """
+        with self._lock:
+            host_name_list = [host_name for host_name in self._offset_dict if self._offset_dict[host_name]]
+
+        poll_dict, self.last_error_dict = {}, {}
+        gather_dict = self._remote_fs.gather(self._poll_node, host_name_list=host_name_list, max_parallel=self._max_parallel)
+        for host_name, result in gather_dict.items():
+            if isinstance(result, Exception):
+                self.last_error_dict[host_name] = result
+            else:
+                poll_dict[host_name] = result
+        return poll_dict
@@ -1,41 +1,82 @@
+import re
 from os import getenv
+from time import time, sleep
 from json import loads 
+from shlex import quote
 from pathlib import Path 
-from threading import Thread
+from uuid import uuid4
+from threading import Lock, RLock
+from concurrent.futures import ThreadPoolExecutor, Future
 from paramiko import SSHClient, AutoAddPolicy
-
-from expK8.remoteFS.NodeException import BlockDeviceNotFound, NoValidPartitionFound, RemoteRuntimeError
-
-
-"""According to channel documentation, the call to recv_exit_status can hang indefinitely 
-if the channel has not yet received any bytes from remote node where command was run. If we
-directly call recv(nbytes) and read bytes, we will corrupt the output while it would ensure 
-that recv_exit_status never hands. So we use a new thread to call exec_command and if it takes too 
-long to finish it can be killed. 
-
-Ref: https://docs.paramiko.org/en/stable/api/channel.html (last checked 16/07/2023)
+import socket
+
+from expK8.remoteFS.SFTPPool import SFTPPool
+from expK8.remoteFS.ChunkedTransfer import ChunkedTransfer
+from expK8.remoteFS.DeltaSync import DeltaSync
+from expK8.remoteFS.TransferCheckpoint import DEFAULT_CHECKPOINT_DIR
+from expK8.remoteFS.CompressedTransfer import CompressedTransfer, CODEC_DICT, DEFAULT_BANDWIDTH_MB_PER_SEC
+from expK8.remoteFS.TransferManifest import TransferManifest, DEFAULT_MANIFEST_PATH, REMOTE_DIGEST_SCRIPT
+from expK8.remoteFS.FactsCache import FactsCache
+from expK8.remoteFS.ProcessSnapshot import ProcessSnapshot, PS_FORMAT
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.CommandExecutor import CommandExecutor
+from expK8.remoteFS.NodeException import BlockDeviceNotFound, NoValidPartitionFound, RemoteRuntimeError, \
+                                            RemoteCommandTimeout, ChannelOpenError, NodeUnavailable
+
+
+MAX_RECONNECT_BACKOFF_SEC = 30
+
+"""Kills processes whose command line matches the ERE pattern given as the first argument, owned by the user 
+given as the fifth argument unless it is empty, and, if the second argument is 1, all of their descendants. Matching processes are stopped before their children are listed so that 
+no child is spawned after the tree is collected. The signal given as the third argument is sent to the whole tree, 
+escalating to SIGKILL for processes still alive after the grace period in milliseconds given as the fourth 
+argument. Prints a line 
+'pid<TAB>signal<TAB>args' per process with the signal that ended it, or '-' if it survived SIGKILL. 
+"""
+KILL_MATCHING_SCRIPT = """pattern="$1"; tree="$2"; sig="$3"; grace_ms="$4"; user="$5"
+declare -A skip target args
+is_alive() { local state; state=$(ps -o stat= -p "$1") && [[ "$state" != Z* ]]; }
+# The pattern is in the command line of this script and the commands that started it, so they are skipped. 
+pid=$$
+while [ -n "$pid" ] && [ "$pid" -gt 1 ]; do skip[$pid]=1; pid=$(ps -o ppid= -p "$pid" | tr -d ' '); done
+match_file=$(mktemp)
+pgrep ${user:+-u "$user"} -f -- "$pattern" > "$match_file"
+new=""
+while read -r pid; do [ -z "${skip[$pid]}" ] && target[$pid]=1 && new="$new $pid"; done < "$match_file"
+while [ -n "$new" ]; do
+    kill -STOP $new 2>/dev/null
+    next=""
+    if [ "$tree" = 1 ]; then
+        for pid in $new; do
+            pgrep -P "$pid" > "$match_file"
+            while read -r child; do
+                [ -z "${target[$child]}${skip[$child]}" ] && target[$child]=1 && next="$next $child"
+            done < "$match_file"
+        done
+    fi
+    new="$next"
+done
+rm -f "$match_file"
+[ ${#target[@]} -eq 0 ] && exit 0
+for pid in "${!target[@]}"; do args[$pid]=$(ps -o args= -p "$pid"); done
+kill -"$sig" "${!target[@]}" 2>/dev/null
+kill -CONT "${!target[@]}" 2>/dev/null
+poll_count=$(((grace_ms + 199) / 200))
+alive="${!target[*]}"
+while [ -n "$alive" ]; do
+    still=""
+    for pid in $alive; do is_alive "$pid" && still="$still $pid"; done
+    alive="$still"
+    [ -z "$alive" ] || [ "$poll_count" -le 0 ] && break
+    poll_count=$((poll_count - 1))
+    sleep 0.2
+done
+[ -n "$alive" ] && kill -KILL $alive 2>/dev/null && sleep 0.2
+declare -A final
+for pid in "${!target[@]}"; do final[$pid]="$sig"; done
+for pid in $alive; do final[$pid]=KILL; is_alive "$pid" && final[$pid]=-; done
+for pid in "${!target[@]}"; do printf '%s\t%s\t%s\n' "$pid" "${final[$pid]}" "${args[$pid]}"; done
 """
-class ExecCommandThread(Thread):
-    def __init__(
-        self, 
-        ssh_client: SSHClient, 
-        command_str_arr: list
-    ) -> None:
-        """Create a thread to execute a command in remote node and wait for its completion."""
-        Thread.__init__(self)
-        self.ssh_client = ssh_client
-        self.command_str_arr = command_str_arr
-        self.exit_code = -1 
-        self.stdout = ''
-        self.stderr = ''
-
-
-    def run(self):
-        """Run a command in remote node and wait for it to return."""
-        _, stdout, stderr = self.ssh_client.exec_command(" ".join(self.command_str_arr))
-        self.stdout = stdout.read().decode("utf-8")
-        self.stderr = stderr.read().decode("utf-8")
-        self.exit_code = stdout.channel.recv_exit_status()
 
 
 class Node:
@@ -45,21 +86,67 @@ class Node:
         name: Name of the node, not necessarily unique for remote nodes.  
         host: Host name of the node, identifies a unique remote node. 
         machine_name: Name of the type of machine used as node. 
+        connect_latency_sec: Seconds taken to connect to the remote node and setup its mounts. 
 
         _cred_dict: Dictionary of credentials.
         _mount_list: List of valid mounts 
         _port: Port used to connect to the remote node. 
+        _connect_timeout: Seconds to wait for the TCP connection, SSH banner and authentication. 
         _home: String path of home directoy. 
         _ssh: SSHClient to connect to remote node. 
         _ssh_exception: Exception raised when connectign to remote node. 
+        _sftp_pool: Pool of SFTP sessions reused across file transfers. 
+        _executor: Executor that runs commands on a bounded number of channels. 
+        _submit_pool: Thread pool running commands submitted without blocking, created on first use. 
+        _facts: Cache of facts such as block devices that expire after a TTL. 
+        _facts_store: Local store of facts persisted across invocations, None if facts are not persisted. 
+        _boot_id: Boot ID of the remote node under which facts are stored, None if facts are not persisted. 
+        _connect_attempted: Boolean indicating if a connection to the remote node has been attempted. 
+        _connect_lock: Lock ensuring that only one thread connects or reconnects the node. 
+        _connecting: Boolean indicating if a connection is being setup. 
+        _keepalive_sec: Seconds between keepalive packets on an idle connection. 
+        _max_reconnect_attempts: Number of attempts to reconnect a dropped connection before failing fast. 
+        _reconnect_backoff_sec: Seconds to wait after the first failed reconnect, doubled after every failure. 
+        _circuit_cooldown_sec: Seconds for which calls fail fast after reconnecting failed. 
+        _circuit_open_until: Time until which calls to this node fail fast. 
+        _link_throughput_mb_per_sec: Estimated bandwidth of the link to this node from previous transfers. 
+        _codec_level: Tuple (codec, level) last picked for a compressed transfer with codec 'auto'. 
+        _transfer_manifest: Local manifest of the digests of files transferred to and from this node. 
     """
     def __init__(
             self,
             node_name: str,
             host_name: str,
             cred_dict: dict,
-            mount_list: list 
+            mount_list: list,
+            max_channels: int = 8,
+            connect_timeout: float = 30,
+            facts_ttl_sec: float = 60,
+            facts_store: FactsStore = None,
+            lazy: bool = False,
+            keepalive_sec: int = 30,
+            max_reconnect_attempts: int = 3,
+            reconnect_backoff_sec: float = 1.0,
+            circuit_cooldown_sec: float = 60,
+            manifest_path: str = DEFAULT_MANIFEST_PATH
     ) -> None:
+        """Create a node and connect to it. 
+
+        Args:
+            node_name: Name of the node. 
+            host_name: Host name of the node. 
+            cred_dict: Dictionary of credentials. 
+            mount_list: List of mounts to setup in the node. 
+            max_channels: Maximum number of channels running commands at the same time. 
+            connect_timeout: Seconds to wait for the TCP connection, SSH banner and authentication. 
+            facts_store: Local store to persist facts of the node across invocations. 
+            lazy: If True, connect on the first use of the node instead of when it is created. 
+            keepalive_sec: Seconds between keepalive packets, used to keep the connection open and detect dead peers. 
+            max_reconnect_attempts: Number of attempts to reconnect a dropped connection before failing fast. 
+            reconnect_backoff_sec: Seconds to wait after the first failed reconnect, doubled after every failure. 
+            circuit_cooldown_sec: Seconds for which calls fail fast after the node could not be reconnected. 
+            manifest_path: Path of the local manifest of digests of transferred files. 
+        """
         self.name = node_name 
         self.host = host_name 
         self.machine_name = self.host.split("-")[0]
@@ -67,35 +154,201 @@ class Node:
         self._cred_dict = cred_dict 
         self._mount_list = mount_list 
         self._port = 22 if "port" not in self._cred_dict else self._cred_dict["port"]
+        self._connect_timeout = connect_timeout
+        self.connect_latency_sec = None 
 
         self._home = None
         self._ssh = None # SSH client to connect to remote host. 
         self._ssh_exception = None # Any exception raised when trying to connect to remote host. 
-        self._connect()
+        self._sftp_pool = None # SFTP sessions are opened lazily on the first transfer. 
+        self._executor = CommandExecutor(self.host, None, max_channels=max_channels)
+        self._submit_pool = None 
+        self._submit_pool_lock = Lock()
+        self._facts = FactsCache(ttl_sec=facts_ttl_sec)
+        self._facts_store = facts_store 
+        self._boot_id = None 
+        self._connect_attempted = False 
+        self._connect_lock = RLock()
+        self._connecting = False 
+        self._keepalive_sec = keepalive_sec
+        self._max_reconnect_attempts = max_reconnect_attempts
+        self._reconnect_backoff_sec = reconnect_backoff_sec
+        self._circuit_cooldown_sec = circuit_cooldown_sec
+        self._circuit_open_until = 0 
+        self._link_throughput_mb_per_sec = None 
+        self._codec_level = None 
+        self._transfer_manifest = TransferManifest(manifest_path)
+        if not lazy:
+            self._ensure_connected()
+
+
+    def _transport_active(self) -> bool:
+        """Check if the SSH transport to the remote node is active without trying to connect."""
+        transport = None if self._ssh is None else self._ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+
+    def _ensure_connected(
+            self,
+            reconnect: bool = True 
+    ) -> None:
+        """Connect to the remote host if no connection has been attempted yet, and reconnect if the connection 
+        has dropped. 
+
+        Args:
+            reconnect: If False, only connect if no connection has been attempted yet. 
+        """
+        with self._connect_lock:
+            if self._connecting:
+                return 
+            
+            if not self._connect_attempted:
+                self._connect()
+                if not self._transport_active():
+                    self._open_circuit()
+            elif reconnect and not self._transport_active():
+                self._reconnect()
+
+
+    def _reconnect(self) -> None:
+        """Reconnect to the remote host with exponential backoff. If all attempts fail, the circuit is opened so 
+        that calls to this node fail fast until the cooldown ends. Caller must hold the connect lock. 
+        """
+        if time() < self._circuit_open_until:
+            return 
+
+        for attempt_index in range(self._max_reconnect_attempts):
+            if attempt_index:
+                sleep(min(self._reconnect_backoff_sec * (2 ** (attempt_index - 1)), MAX_RECONNECT_BACKOFF_SEC))
+            
+            print("{}: Reconnecting, attempt {}/{}".format(self.host, attempt_index + 1, self._max_reconnect_attempts))
+            if self._ssh is not None:
+                self._ssh.close()
+            self._ssh_exception = None 
+            self._connect()
+            if self._transport_active():
+                self._circuit_open_until = 0 
+                return 
+        self._open_circuit()
+
+
+    def _open_circuit(self) -> None:
+        """Make calls to this node fail fast until the cooldown ends."""
+        self._circuit_open_until = time() + self._circuit_cooldown_sec
+        print("{}: Node unavailable, failing fast for {} seconds.".format(self.host, self._circuit_cooldown_sec))
+
+
+    def _check_available(self) -> None:
+        """Make sure that the node is connected, reconnecting if needed. 
+
+        Raises:
+            NodeUnavailable: If the node is not connected and could not be reconnected. 
+        """
+        self._ensure_connected()
+        if not self._transport_active():
+            raise NodeUnavailable(self.host, self._ssh_exception, self._circuit_open_until - time())
+
+
+    def _set_keepalive(self) -> None:
+        """Send keepalive packets on the transport and enable TCP keepalive on its socket so that a dead peer 
+        causes the transport to close instead of hanging."""
+        transport = self._ssh.get_transport()
+        transport.set_keepalive(self._keepalive_sec)
+        sock = transport.sock
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # The tuning options are not available on every platform. 
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self._keepalive_sec)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self._keepalive_sec)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+        except OSError:
+            pass 
 
 
     def _connect(self) -> None:
         """Connect to the remote host and setup all the mounts."""
+        self._connect_attempted = True 
+        self._connecting = True 
+        start_time = time()
         try:
             self._ssh = SSHClient()
             self._ssh.set_missing_host_key_policy(AutoAddPolicy())
+            if self._sftp_pool is None:
+                self._sftp_pool = SFTPPool(self._ssh)
+            else:
+                self._sftp_pool.set_client(self._ssh)
+            self._executor.set_client(self._ssh)
             if self._cred_dict["type"] == "env":
                 self._ssh.connect(
                     self.host, 
                     self._port, 
                     username=self._cred_dict["user"], 
-                    password=getenv(self._cred_dict["val"]))
+                    password=getenv(self._cred_dict["val"]),
+                    timeout=self._connect_timeout,
+                    banner_timeout=self._connect_timeout,
+                    auth_timeout=self._connect_timeout)
             else:
                 if "~" in self._cred_dict["val"]:
                     key_path = str(Path.home().joinpath(self._cred_dict["val"].replace("~/", "")))
                 else:
                     key_path = str(Path(self._cred_dict["val"]))
-                self._ssh.connect(self.host, username=self._cred_dict["user"], key_filename=key_path)
-            self._home = self._get_home_dir()
-            self._mount()
+                self._ssh.connect(
+                    self.host, 
+                    self._port, 
+                    username=self._cred_dict["user"], 
+                    key_filename=key_path,
+                    timeout=self._connect_timeout,
+                    banner_timeout=self._connect_timeout,
+                    auth_timeout=self._connect_timeout)
+            self._set_keepalive()
+            self._setup()
         except Exception as e:
             self._ssh_exception = e
             print("Exception in connecting to node: {}, {}".format(self.host, e))
+        finally:
+            self._connecting = False 
+        self.connect_latency_sec = time() - start_time
+
+
+    def _setup(self) -> None:
+        """Get the home directory and setup all the mounts. If a facts store is used and it has facts from the 
+        current boot of the remote node for the same user and mounts, the facts are reused and the mounts are not 
+        setup again, which takes a single round trip. Commands that query the node time out after the connect 
+        timeout, so a node that accepts the connection but hangs does not hang connecting. 
+        """
+        if self._facts_store is None:
+            self._home = self._get_home_dir(timeout=self._connect_timeout)
+            self._mount(timeout=self._connect_timeout)
+            return 
+
+        self._boot_id, self._home = self._get_boot_id_and_home_dir(timeout=self._connect_timeout)
+        facts = self._facts_store.get(self.host, self._boot_id)
+        if facts is not None and facts["user"] == self._cred_dict["user"] and facts["mount_list"] == self._mount_list:
+            self._home = facts["home"]
+            # The stored block devices are dropped when they change, the next lookup queries the node. 
+            if facts.get("lsblk") is not None:
+                self._facts.set("lsblk", facts["lsblk"])
+            return 
+        
+        self._mount(timeout=self._connect_timeout)
+        self._facts_store.put(self.host, {
+            "boot_id": self._boot_id,
+            "user": self._cred_dict["user"],
+            "home": self._home,
+            "mount_list": self._mount_list,
+            "lsblk": self.get_block_devices(timeout=self._connect_timeout)
+        })
+
+
+    def close(self) -> None:
+        """Close all SFTP sessions and the SSH connection to the remote node."""
+        if self._submit_pool is not None:
+            self._submit_pool.shutdown(wait=False)
+        if self._sftp_pool is not None:
+            self._sftp_pool.close()
+        if self._ssh is not None:
+            self._ssh.close()
 
 
     def set_perm_for_power_tracking(self):
@@ -107,7 +360,9 @@ class Node:
     
 
     def is_live(self):
-        return not self._ssh_exception
+        """Check if the node connected without errors and is not known to be down. This does not reconnect. """
+        self._ensure_connected(reconnect=False)
+        return not self._ssh_exception and time() >= self._circuit_open_until
 
     
     def format_path(
@@ -123,7 +378,10 @@ class Node:
         Returns:
             new_path_str: The path with '~' replaced by the home directory. 
         """
-        return path_str if '~' not in path_str else path_str.replace('~', self._home)
+        if '~' not in path_str:
+            return path_str 
+        self._ensure_connected(reconnect=False)
+        return path_str.replace('~', self._home)
     
 
     def clone_git_repo(
@@ -155,16 +413,66 @@ class Node:
         Returns:
             size_byte: Size of file in bytes. 
         """
-        if not self.file_exists(self.format_path(path)):
-            return 0
-        else:
-            get_file_size_cmd = ["stat", "-c", "%s", self.format_path(path)]
-            stdout, stderr, exit_code = self.exec_command(get_file_size_cmd)
-            if exit_code:
-                raise RemoteRuntimeError(get_file_size_cmd, self.host, exit_code, stdout, stderr)
-            return int(stdout)
+        path_info = self.stat_paths([path])[path]
+        return path_info["size"] if path_info["type"] == "file" else 0
     
 
+    def stat_paths(
+        self,
+        path_list: list 
+    ) -> dict:
+        """Get existence, type, size and modification time of many paths with a single remote 'stat' command. 
+
+        Args:
+            path_list: List of paths in remote node. 
+        
+        Returns:
+            path_info_dict: Dictionary mapping each path in the list to a dictionary with keys 'exists', 'type' 
+                            ('file', 'dir', 'other' or None if the path does not exist), 'size' in bytes and 'mtime' 
+                            as seconds since epoch (None if the path does not exist). 
+        
+        Raises:
+            RemoteRuntimeError: If the stat command fails for a reason other than a missing path. 
+        """
+        path_info_dict = {}
+        remote_path_map = {}
+        for path in path_list:
+            path_info_dict[path] = {"exists": False, "type": None, "size": 0, "mtime": None}
+            remote_path_map.setdefault(self.format_path(path), []).append(path)
+        
+        if not remote_path_map:
+            return path_info_dict
+
+        # The name is the last field so that a '|' in a path does not break parsing. 
+        stat_cmd = ["stat", "-L", "-c", "'%F|%s|%Y|%n'"] + [quote(remote_path) for remote_path in remote_path_map]
+        stdout, stderr, exit_code = self.exec_command(stat_cmd)
+        # stat returns 1 when any of the paths could not be found. 
+        if exit_code and exit_code != 1:
+            raise RemoteRuntimeError(stat_cmd, self.host, exit_code, stdout, stderr)
+
+        for stat_row in stdout.splitlines():
+            split_row = stat_row.split("|", 3)
+            if len(split_row) != 4 or split_row[3] not in remote_path_map:
+                continue 
+
+            file_type_str, size_str, mtime_str, remote_path = split_row
+            if file_type_str in ["regular file", "regular empty file"]:
+                path_type = "file"
+            elif file_type_str == "directory":
+                path_type = "dir"
+            else:
+                path_type = "other"
+
+            for path in remote_path_map[remote_path]:
+                path_info_dict[path] = {
+                    "exists": True,
+                    "type": path_type,
+                    "size": int(size_str),
+                    "mtime": int(mtime_str)
+                }
+        return path_info_dict
+
+
     def nonblock_exec_cmd(
         self,
         cmd: str 
@@ -174,6 +482,7 @@ class Node:
         Args:
             cmd: The command to run in remote node. 
         """
+        self._check_available()
         _, stdout, stderr = self._ssh.exec_command(' '.join(cmd))
     
 
@@ -188,36 +497,334 @@ class Node:
             raise RemoteRuntimeError(find_cmd, self.host, exit_code, stdout, stderr)
 
 
+    def _run_transfer(
+        self,
+        transfer_fn,
+        num_retry: int 
+    ) -> dict:
+        """Run a transfer, reconnecting and running it again if the connection dropped during the transfer. A 
+        resumable transfer continues from the chunks completed before the connection dropped. 
+
+        Args:
+            transfer_fn: Function that runs the transfer and returns its report. 
+            num_retry: Number of times to try the transfer. 
+        
+        Return:
+            report: Report returned by the transfer. 
+        """
+        for cur_num_retry in range(num_retry):
+            self._check_available()
+            try:
+                return transfer_fn()
+            except Exception as e:
+                if self._transport_active() or cur_num_retry == num_retry - 1:
+                    raise 
+                print("{}: Connection dropped during transfer, retry remaining {}, {}".format(self.host, num_retry - 1 - cur_num_retry, e))
+
+
+    def _record_throughput(
+        self,
+        report: dict 
+    ) -> None:
+        """Update the estimate of the bandwidth of the link to this node from the report of a transfer. Small 
+        transfers are dominated by latency and are ignored. 
+
+        Args:
+            report: Report of an uncompressed transfer. 
+        """
+        sent_byte = report["size_byte"] - report.get("resumed_byte", 0)
+        if sent_byte < 4*1024*1024 or report["throughput_mb_per_sec"] <= 0:
+            return 
+        if self._link_throughput_mb_per_sec is None:
+            self._link_throughput_mb_per_sec = report["throughput_mb_per_sec"]
+        else:
+            self._link_throughput_mb_per_sec = 0.5*self._link_throughput_mb_per_sec + 0.5*report["throughput_mb_per_sec"]
+
+
+    def get_remote_digest(
+        self,
+        remote_path: str,
+        chunk_size_byte: int = 16*1024*1024
+    ) -> str:
+        """Compute the digest of a file in remote node as computed by transfers with the same chunk size. 
+
+        Args:
+            remote_path: Path of file in remote node. 
+            chunk_size_byte: Chunk size of the digest. 
+        
+        Return:
+            digest: Hex digest of the file. 
+        
+        Raises:
+            RemoteRuntimeError: If the digest could not be computed in the remote node. 
+        """
+        digest_cmd = ["python3", "-c", quote(REMOTE_DIGEST_SCRIPT), quote(self.format_path(str(remote_path))), str(chunk_size_byte)]
+        stdout, stderr, exit_code = self.exec_command(digest_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(digest_cmd, self.host, exit_code, stdout, stderr)
+        return stdout.strip()
+
+
+    def _finish_transfer(
+        self,
+        direction: str,
+        local_path: str,
+        remote_path: str,
+        report: dict,
+        verify: bool 
+    ) -> dict:
+        """Verify a completed transfer if asked and record its digest in the manifest. 
+
+        Args:
+            direction: Direction of the transfer, 'upload' or 'download'. 
+            local_path: Path of the local file. 
+            remote_path: Path of the file in remote node. 
+            report: Report of the transfer with the digest computed while it streamed. 
+            verify: If True, compute the digest of the remote file and check that it matches. 
+        
+        Return:
+            report: Report of the transfer with key 'remote_verified' added. 
+        
+        Raises:
+            RemoteRuntimeError: If the digest of the remote file does not match. 
+        """
+        if verify:
+            remote_digest = self.get_remote_digest(remote_path, report["chunk_size_byte"])
+            if remote_digest != report["digest"]:
+                self._transfer_manifest.remove(self.host, remote_path)
+                raise RemoteRuntimeError(
+                        ["python3", "-c", "REMOTE_DIGEST_SCRIPT", remote_path], 
+                        self.host, 
+                        1, 
+                        remote_digest, 
+                        "Digest of {} does not match {} transferred.".format(remote_path, report["digest"]))
+        # Transfers report the modification time of the remote file when they know it without another command. 
+        remote_mtime = report.get("remote_mtime")
+        if remote_mtime is None:
+            remote_mtime = self.stat_paths([remote_path])[remote_path]["mtime"]
+        self._transfer_manifest.record(
+            self.host, 
+            remote_path, 
+            local_path, 
+            direction, 
+            remote_mtime, 
+            report["digest"], 
+            report["chunk_size_byte"], 
+            verify)
+        report["remote_verified"] = verify 
+        return report 
+
+
+    def is_transferred(
+        self,
+        local_path: str,
+        remote_path: str,
+        check_remote: bool = True
+    ) -> bool:
+        """Check if a remote file is a current copy of a local file, or the reverse, from the manifest of 
+        completed transfers instead of hashing either file. 
+
+        Args:
+            local_path: Path of the local file. 
+            remote_path: Path of the file in remote node. 
+            check_remote: If True, also check that the remote file still has the size and modification time it 
+                            had after the transfer, which catches files removed or replaced in the remote node. 
+        
+        Return:
+            transferred: Boolean indicating if the last transfer of the remote path was of the local file as it 
+                            is now. 
+        """
+        remote_path = self.format_path(str(remote_path))
+        if not self._transfer_manifest.is_current(self.host, remote_path, local_path):
+            return False 
+        if not check_remote:
+            return True 
+        entry = self._transfer_manifest.lookup(self.host, remote_path)
+        remote_info = self.stat_paths([remote_path])[remote_path]
+        return remote_info["type"] == "file" and remote_info["size"] == entry["size_byte"] and remote_info["mtime"] == entry["remote_mtime"]
+
+
+    def _get_codec_level(
+        self,
+        compress: str,
+        compress_level: int,
+        choose_fn
+    ) -> tuple:
+        """Get the codec and level of a compressed transfer. 
+
+        Args:
+            compress: Name of the codec or 'auto'. 
+            compress_level: Compression level, None for the default level of the codec. 
+            choose_fn: Function that takes the bandwidth of the link and picks the codec and level. 
+        
+        Return:
+            codec_level: Tuple (codec, level), None if the file should be transferred uncompressed. 
+        """
+        if compress != "auto":
+            return compress, CODEC_DICT[compress]["default_level"] if compress_level is None else compress_level
+        
+        bandwidth_mb_per_sec = self._link_throughput_mb_per_sec or DEFAULT_BANDWIDTH_MB_PER_SEC
+        codec_level = choose_fn(bandwidth_mb_per_sec)
+        if codec_level != self._codec_level:
+            # Only a change of codec is printed, as it is picked again for every file of a transfer. 
+            print("{}: Picked codec {} for bandwidth {:.1f}MB/s".format(self.host, codec_level, bandwidth_mb_per_sec))
+            self._codec_level = codec_level 
+        return codec_level
+
+
     def scp(
         self,
         local_path: str, 
-        remote_path: str
-    ) -> None:
-        """Transfer local file to remote node.
+        remote_path: str,
+        parallelism: int = 4,
+        chunk_size_byte: int = 16*1024*1024,
+        resume: bool = True,
+        num_retry: int = 3,
+        compress: str = None,
+        compress_level: int = None,
+        progress_callback = None,
+        verify: bool = False 
+    ) -> dict:
+        """Transfer local file to remote node. Large files are split into chunks that are written concurrently 
+        over multiple SFTP sessions. With compression, the file is instead streamed through a local compressor 
+        and decompressed in the remote node. 
 
         Args:
             local_path: Local path of file to upload. 
             remote_path: Target path in remote node. 
+            parallelism: Number of SFTP sessions used at the same time. 
+            chunk_size_byte: Size of the byte range written by a session at a time. 
+            resume: If True, completed chunks are checkpointed so an interrupted upload resumes from them. 
+            num_retry: Number of times to try the upload if the connection drops. 
+            compress: Codec ('gzip', 'xz' or 'zstd') to compress the file with, 'auto' to pick the codec and 
+                        level from a sample of the file and the measured bandwidth, None to not compress. 
+            compress_level: Compression level of the codec, None for its default level. 
+            progress_callback: Function called with the number of bytes sent over the network as the transfer 
+                                progresses, for instance to track or throttle bandwidth. 
+            verify: If True, check the digest of the remote file against the digest computed during the transfer. 
+        
+        Return:
+            report: Dictionary with the size, number of chunks, resumed bytes, duration, throughput and digest of 
+                        the transfer. The digest is recorded in the local manifest. 
+        
+        Raises:
+            RemoteRuntimeError: If verify is True and the digests do not match. 
         """
-        sftp = self._ssh.open_sftp()
-        sftp.put(local_path, remote_path)
-        sftp.close()
+        transfer = ChunkedTransfer(
+                    self._sftp_pool, 
+                    parallelism=parallelism, 
+                    chunk_size_byte=chunk_size_byte,
+                    host_name=self.host,
+                    checkpoint_dir=DEFAULT_CHECKPOINT_DIR if resume else None,
+                    exec_command=self.exec_command,
+                    progress_callback=progress_callback)
+        remote_path = self.format_path(str(remote_path))
+        if compress:
+            self._check_available()
+            compressed_transfer = CompressedTransfer(self.host, self.exec_command, chunk_size_byte=chunk_size_byte)
+            codec_level = self._get_codec_level(
+                            compress, 
+                            compress_level, 
+                            lambda bandwidth: compressed_transfer.choose_upload_codec(str(local_path), bandwidth))
+            if codec_level is not None:
+                report = self._run_transfer(lambda: compressed_transfer.upload(str(local_path), remote_path, *codec_level, progress_callback), num_retry)
+                return self._finish_transfer("upload", local_path, remote_path, report, verify)
+        
+        report = self._run_transfer(lambda: transfer.upload(str(local_path), remote_path), num_retry)
+        self._record_throughput(report)
+        return self._finish_transfer("upload", local_path, remote_path, report, verify)
 
 
     def download(
         self,
         remote_path: str,
-        local_path: str
-    ) -> None:
-        """Transfer local file to remote node.
+        local_path: str,
+        parallelism: int = 4,
+        chunk_size_byte: int = 16*1024*1024,
+        resume: bool = True,
+        num_retry: int = 3,
+        compress: str = None,
+        compress_level: int = None,
+        progress_callback = None,
+        verify: bool = False 
+    ) -> dict:
+        """Transfer file in remote node to local path. Large files are split into chunks that are read 
+        concurrently over multiple SFTP sessions. With compression, the file is instead streamed through a 
+        compressor in the remote node and decompressed locally. 
 
         Args:
-            local_path: Local path of file to upload. 
-            remote_path: Target path in remote node. 
+            remote_path: Path of file in remote node. 
+            local_path: Target local path. 
+            parallelism: Number of SFTP sessions used at the same time. 
+            chunk_size_byte: Size of the byte range read by a session at a time. 
+            resume: If True, completed chunks are checkpointed so an interrupted download resumes from them. 
+            num_retry: Number of times to try the download if the connection drops. 
+            compress: Codec ('gzip', 'xz' or 'zstd') to compress the file with, 'auto' to pick the codec and 
+                        level from a sample of the file and the measured bandwidth, None to not compress. 
+            compress_level: Compression level of the codec, None for its default level. 
+            progress_callback: Function called with the number of bytes sent over the network as the transfer 
+                                progresses, for instance to track or throttle bandwidth. 
+            verify: If True, check the digest of the remote file against the digest computed during the transfer. 
+        
+        Return:
+            report: Dictionary with the size, number of chunks, resumed bytes, duration, throughput and digest of 
+                        the transfer. The digest is recorded in the local manifest. 
+        
+        Raises:
+            RemoteRuntimeError: If verify is True and the digests do not match. 
         """
-        sftp = self._ssh.open_sftp()
-        sftp.get(remote_path, local_path)
-        sftp.close()
+        transfer = ChunkedTransfer(
+                    self._sftp_pool, 
+                    parallelism=parallelism, 
+                    chunk_size_byte=chunk_size_byte,
+                    host_name=self.host,
+                    checkpoint_dir=DEFAULT_CHECKPOINT_DIR if resume else None,
+                    progress_callback=progress_callback)
+        remote_path = self.format_path(str(remote_path))
+        if compress:
+            self._check_available()
+            compressed_transfer = CompressedTransfer(self.host, self.exec_command, chunk_size_byte=chunk_size_byte)
+            codec_level = self._get_codec_level(
+                            compress, 
+                            compress_level, 
+                            lambda bandwidth: compressed_transfer.choose_download_codec(remote_path, bandwidth))
+            if codec_level is not None:
+                report = self._run_transfer(lambda: compressed_transfer.download(remote_path, str(local_path), *codec_level, progress_callback), num_retry)
+                return self._finish_transfer("download", local_path, remote_path, report, verify)
+        
+        report = self._run_transfer(lambda: transfer.download(remote_path, str(local_path)), num_retry)
+        self._record_throughput(report)
+        return self._finish_transfer("download", local_path, remote_path, report, verify)
+
+
+    def delta_download(
+        self,
+        remote_path: str,
+        local_path: str,
+        block_size_byte: int = 1024*1024
+    ) -> dict:
+        """Update a local copy of a file in remote node by downloading only the blocks that changed. If the 
+        local copy does not exist, the whole file is downloaded. 
+
+        Args:
+            remote_path: Path of file in remote node. 
+            local_path: Local path of the copy to update. 
+            block_size_byte: Size of the blocks whose hashes are compared. 
+        
+        Return:
+            report: Dictionary with the size, number of blocks and changed blocks and bytes fetched. 
+        """
+        if not Path(local_path).exists():
+            return self.download(remote_path, local_path)
+        
+        self._check_available()
+        delta_sync = DeltaSync(self.host, self.exec_command, self._sftp_pool, block_size_byte=block_size_byte)
+        report = delta_sync.sync_file(self.format_path(str(remote_path)), str(local_path))
+        if not report["verified"]:
+            # The remote file changed while it was synced. 
+            print("{}: Delta sync of {} could not be verified, downloading the whole file.".format(self.host, remote_path))
+            return self.download(remote_path, local_path)
+        return report 
 
 
     def file_exists(
@@ -229,12 +836,7 @@ class Node:
         Args:
             node_path: Path in the remote node.
         """
-        check_path_cmd = ["test", "-f", self.format_path(node_path)]
-        _, _, exit_code = self.exec_command(check_path_cmd)
-        if exit_code == 1:
-            return False 
-        else:
-            return True 
+        return self.stat_paths([node_path])[node_path]["type"] == "file"
     
 
     def touch(
@@ -261,12 +863,7 @@ class Node:
         Args:
             node_path: Path in the remote node.
         """
-        check_path_cmd = ["test", "-d", self.format_path(node_path)]
-        _, _, exit_code = self.exec_command(check_path_cmd)
-        if exit_code == 1:
-            return False 
-        else:
-            return True 
+        return self.stat_paths([node_path])[node_path]["type"] == "dir"
     
 
     def create_random_file_nonblock(
@@ -287,6 +884,7 @@ class Node:
                                     "bs=1M",
                                     "count={}".format(file_size_mb),
                                     "oflag=direct"]
+        self._check_available()
         _, stdout, stderr = self._ssh.exec_command(" ".join(create_random_file_cmd))
 
 
@@ -327,6 +925,57 @@ class Node:
         return stdout.rstrip()
 
 
+    def tail(
+        self,
+        path: str,
+        from_offset: int = 0,
+        max_bytes: int = None,
+        whole_lines: bool = False 
+    ) -> tuple:
+        """Read the bytes of a file in Node starting from an offset, so that polling a growing file only 
+        transfers what was appended since the last read. 
+
+        Args:
+            path: The path to read. 
+            from_offset: Byte offset to start reading from, usually the offset returned by the previous call. 
+            max_bytes: Maximum number of bytes to read, None to read to the end of the file. 
+            whole_lines: If True, only read up to the last newline so that a partially written line is read 
+                            in full by the next call. A line longer than max bytes is still read in parts. 
+        
+        Return:
+            The tuple (text, new offset) where new offset is the offset to pass to the next call. If the file is 
+            smaller than the offset it was truncated and is read again from the start. 
+        
+        Raises:
+            FileNotFoundError: If the file does not exist in remote node. 
+        """
+        self._check_available()
+        with self._sftp_pool.session() as sftp:
+            with sftp.open(self.format_path(path), "rb") as handle:
+                file_size = handle.stat().st_size
+                if file_size < from_offset:
+                    from_offset = 0 
+                
+                read_size = file_size - from_offset
+                if max_bytes is not None:
+                    read_size = min(read_size, max_bytes)
+                if read_size <= 0:
+                    return "", from_offset
+                
+                handle.seek(from_offset)
+                handle.prefetch(read_size)
+                data = handle.read(read_size)
+        
+        if whole_lines:
+            last_newline_index = data.rfind(b"\n")
+            if last_newline_index >= 0:
+                data = data[:last_newline_index + 1]
+            elif max_bytes is None or len(data) < max_bytes:
+                data = b""
+            # A line longer than max bytes is returned in parts so that the reader does not stall on it. 
+        return data.decode("utf-8", errors="replace"), from_offset + len(data)
+
+
     def mkfs(
         self,
         fs_type: str,
@@ -343,6 +992,7 @@ class Node:
         """
         mkfs_cmd = ["yes", "|", "sudo", "mkfs", "-t", fs_type, device_path]
         stdout, stderr, exit_code = self.exec_command(mkfs_cmd)
+        self.invalidate_facts()
         if exit_code:
             raise RemoteRuntimeError(mkfs_cmd, self.host, exit_code, stdout, stderr)
 
@@ -375,24 +1025,27 @@ class Node:
         """
         mount_cmd = ["sudo", "mount", block_device_path, mount_path]
         stdout, stderr, exit_code = self.exec_command(mount_cmd)
+        self.invalidate_facts()
         if exit_code:
             raise RemoteRuntimeError(mount_cmd, self.host, exit_code, stdout, stderr)
 
 
     def _get_block_device(
         self,
-        device_name: str
+        device_name: str,
+        timeout: float = None
     ) -> dict:
         """Get the information of a block device in remote node. 
 
         Args:
             device_name: Device name to get information from in remote node. 
+            timeout: Seconds to wait for 'lsblk' if the output is not cached, None to wait forever. 
         
         Raises:
             BlockDeviceNotFound: If there is no block device with specified name in this remote node. 
         """
         block_device_info = {}
-        block_device_list = self.get_block_devices()
+        block_device_list = self.get_block_devices(timeout=timeout)
         for cur_block_device_info in block_device_list["blockdevices"]:
             if cur_block_device_info["name"] == device_name:
                 block_device_info = cur_block_device_info
@@ -491,9 +1144,16 @@ class Node:
         return size_gb
 
 
-    def _mount(self) -> None:
+    def _mount(
+        self,
+        timeout: float = None
+    ) -> None:
         """Create FS in devices and mount them to mountpoints.  
 
+        Args:
+            timeout: Seconds to wait for 'lsblk', None to wait forever. Creating a FS is not bounded as it can 
+                        take long on a large device. 
+
         Raises:
             BlockDeviceNotFound: If no block device with the specified name exists in the remote node. 
             NoValidPartitionFound: If no partition found to satify the requirement. 
@@ -502,7 +1162,7 @@ class Node:
             device_name = mount_info["device"]
             mount_size_gb = mount_info["size_gb"]
             mount_path = self.format_path(mount_info["mountpoint"])
-            block_device_info = self._get_block_device(device_name)
+            block_device_info = self._get_block_device(device_name, timeout=timeout)
             
             self.mkdir(mount_path)
             self.chown(mount_path)
@@ -550,6 +1210,7 @@ class Node:
         """
         rm_cmd = ["sudo", "rm", "-rf", path]
         stdout, stderr, exit_code = self.exec_command(rm_cmd)
+        self.invalidate_facts()
         if exit_code:
             raise RemoteRuntimeError(rm_cmd, self.host, exit_code, stdout, stderr)
 
@@ -558,50 +1219,250 @@ class Node:
             self, 
             command_str_arr: list,
             timeout: float = None,
-            num_retry: int = 5
+            num_retry: int = 5,
+            stdin_str: str = None,
+            stdin_file = None,
+            stdout_file = None
     ) -> tuple:
         """Run a command in the node with a given name. 
 
         Args:
-            host_name: host_name of the node where command will be executed. 
             command_str_arr: Array of str representing the command ['ls', '-lh'].
             timeout: Seconds to wait before before a remote command times out. 
+            num_retry: Number of times to try opening a channel to run the command. 
+            stdin_str: String written to the stdin of the command. 
+            stdin_file: Readable binary file whose contents are streamed to the stdin of the command. 
+            stdout_file: Writable binary file that stdout is streamed to instead of being returned. 
         
         Return:
             The result of running the command on remote node represented by a tuple of (stdout, stderr, exit code). 
 
         Raises:
-            SSHException: if the sever fails to execute the command
-            ValueError: if no node with specified name is connected 
+            RemoteCommandTimeout: If the command does not complete before the timeout. The command is not retried 
+                                    as it could have already made changes in the remote node. 
+            RemoteRuntimeError: If a channel to run the command could not be opened after all retries. 
+            NodeUnavailable: If the connection dropped and could not be reconnected, raised immediately while this 
+                                node is known to be down. 
         """
         exit_code, stdout, stderr = None, "", ""
+        command_str = " ".join(command_str_arr)
+        stdin_bytes = None if stdin_str is None else stdin_str.encode("utf-8")
         for cur_num_retry in range(num_retry):
-            thread = ExecCommandThread(self._ssh, command_str_arr)
-            thread.start()
-            thread.join(timeout)
-            if not thread.is_alive():
-                exit_code = thread.exit_code
-                stdout = thread.stdout
-                stderr = thread.stderr
+            # Reconnects a dropped connection or fails fast if this node is known to be down. 
+            self._check_available()
+            try:
+                stdout, stderr, exit_code = self._executor.run(
+                                                command_str, 
+                                                timeout=timeout, 
+                                                stdin_bytes=stdin_bytes,
+                                                stdin_file=stdin_file,
+                                                stdout_file=stdout_file)
                 break 
-            else:
-                print("Thread timed out for command {}, retry remaining {}".format(command_str_arr, num_retry - 1 - cur_num_retry))
+            except ChannelOpenError as e:
+                print("Channel failed for command {}, retry remaining {}, {}".format(command_str_arr, num_retry - 1 - cur_num_retry, e))
         else:
             raise RemoteRuntimeError(command_str_arr, self.host, exit_code, stdout, stderr)
         return stdout, stderr, exit_code
 
 
-    def get_block_devices(self) -> dict:
-        """Get a dictionary output of 'lsblk' command in remote node. 
+    def stream_command(
+            self,
+            command_str_arr: list,
+            timeout: float = None,
+            combine_stderr: bool = False,
+            num_retry: int = 5
+    ):
+        """Run a command in the node and yield lines of its output as they arrive instead of waiting for the 
+        command to complete. Output is read from the node only as fast as the lines are consumed. 
+
+        Args:
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            timeout: Seconds to wait before before a remote command times out. 
+            combine_stderr: If True, lines of stderr are yielded interleaved with lines of stdout. 
+            num_retry: Number of times to try opening a channel to run the command. 
+        
+        Yields:
+            line: Decoded line of output without the trailing newline. 
+
+        Raises:
+            RemoteRuntimeError: If the command exits with a nonzero exit code or a channel could not be opened. 
+            RemoteCommandTimeout: If the command does not complete before the timeout. 
+            NodeUnavailable: If the connection dropped and could not be reconnected. 
+        """
+        exit_code, stderr = None, ""
+        command_str = " ".join(command_str_arr)
+        for cur_num_retry in range(num_retry):
+            self._check_available()
+            try:
+                # Channels fail to open before any line is yielded, so a retry does not repeat output. 
+                stderr, exit_code = yield from self._executor.stream(command_str, timeout=timeout, combine_stderr=combine_stderr)
+                break 
+            except ChannelOpenError as e:
+                print("Channel failed for command {}, retry remaining {}, {}".format(command_str_arr, num_retry - 1 - cur_num_retry, e))
+        else:
+            raise RemoteRuntimeError(command_str_arr, self.host, exit_code, "", stderr)
+        
+        if exit_code:
+            raise RemoteRuntimeError(command_str_arr, self.host, exit_code, "", stderr)
+
+
+    def run_script(
+            self,
+            script: str,
+            env: dict = None,
+            timeout: float = None,
+            stop_on_error: bool = True
+    ) -> dict:
+        """Run a script in a single remote shell. The script is piped to the stdin of bash on one channel so it 
+        takes a single round trip and state such as the working directory carries over between steps. 
+
+        Args:
+            script: Script where each non-empty line is a step, or a list of steps that can span multiple lines. 
+            env: Dictionary of environment variables exported before running the script. 
+            timeout: Seconds to wait for the whole script to complete. 
+            stop_on_error: If True, stop running the script at the first step with a nonzero exit code. 
+        
+        Return:
+            script_result: Dictionary with keys 'exit_code', 'stdout', 'stderr', 'steps', a list with the 'cmd', 
+                            'exit_code' and 'duration_sec' of each step that was started, and 'failed_step', the index 
+                            in 'steps' of the first step that failed or None. A step that ended the shell, with exit or 
+                            set -e, has the exit code of the script and a duration of None. 
+        """
+        if isinstance(script, str):
+            step_list = [line.strip() for line in script.split("\n") if line.strip()]
+        else:
+            step_list = list(script)
+
+        # Each step prints a marker line when it starts and one with its exit code and timestamps when it ends, 
+        # which are removed from stdout. A step with no end marker ended the shell. 
+        marker = "__expK8_step_{}".format(uuid4().hex)
+        script_line_list = ["__expK8_rc=0"]
+        if env:
+            for env_key, env_val in env.items():
+                script_line_list.append("export {}={}".format(env_key, quote(str(env_val))))
+        for step_index, step_cmd in enumerate(step_list):
+            # Stdin of each step is /dev/null so that a step does not read the rest of the script. 
+            script_line_list += [
+                "printf '\\n{} {} start\\n'".format(marker, step_index),
+                "__expK8_start=$(date +%s.%N)",
+                "{{\n{}\n}} < /dev/null".format(step_cmd),
+                "__expK8_step_rc=$?",
+                "printf '\\n{} {} %d %s %s\\n' $__expK8_step_rc $__expK8_start $(date +%s.%N)".format(marker, step_index),
+                "if [ $__expK8_step_rc -ne 0 ] && [ $__expK8_rc -eq 0 ]; then __expK8_rc=$__expK8_step_rc; fi"
+            ]
+            if stop_on_error:
+                script_line_list.append("if [ $__expK8_rc -ne 0 ]; then exit $__expK8_rc; fi")
+        script_line_list.append("exit $__expK8_rc")
+
+        stdout, stderr, exit_code = self.exec_command(
+                                        ["bash", "-s"], 
+                                        timeout=timeout, 
+                                        stdin_str="\n".join(script_line_list) + "\n")
+        
+        step_result_list, failed_step = [], None
+        marker_regex = re.compile(r"\n{} (\d+) (?:start|(-?\d+) ([\d.]+) ([\d.]+))\n".format(marker))
+        for match in marker_regex.finditer(stdout):
+            step_index, step_exit_code, start_time, end_time = match.groups()
+            if step_exit_code is None:
+                step_result_list.append({
+                    "cmd": step_list[int(step_index)],
+                    "exit_code": exit_code,
+                    "duration_sec": None
+                })
+            else:
+                step_result_list[-1]["exit_code"] = int(step_exit_code)
+                step_result_list[-1]["duration_sec"] = float(end_time) - float(start_time)
+        for step_index, step_result in enumerate(step_result_list):
+            if step_result["exit_code"]:
+                failed_step = step_index
+                break
+        return {
+            "exit_code": exit_code,
+            "stdout": marker_regex.sub("", stdout),
+            "stderr": stderr,
+            "steps": step_result_list,
+            "failed_step": failed_step
+        }
+
+
+    def get_submit_pool(self) -> ThreadPoolExecutor:
+        """Get the thread pool used to run operations on this node without blocking the caller. It has as 
+        many workers as the number of channels allowed, so submitted commands do not queue on the channels. 
+
+        Return:
+            submit_pool: Thread pool of this node. 
+        """
+        with self._submit_pool_lock:
+            if self._submit_pool is None:
+                self._submit_pool = ThreadPoolExecutor(
+                                        max_workers=self._executor.max_channels, 
+                                        thread_name_prefix=self.host)
+            return self._submit_pool
+
+
+    def submit(
+            self,
+            command_str_arr: list,
+            timeout: float = None
+    ) -> Future:
+        """Run a command in the node without waiting for it to complete. 
+
+        Args:
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            timeout: Seconds to wait before before a remote command times out. 
+        
+        Return:
+            future: Future that resolves to the tuple (stdout, stderr, exit code) returned by exec_command. 
+        """
+        return self.get_submit_pool().submit(self.exec_command, command_str_arr, timeout=timeout)
+
+
+    def get_channel_stats(self) -> dict:
+        """Get the number of channels running commands, channels closed due to timeouts and timed out commands 
+        that may still be running in the node. 
+
+        Return:
+            stats: Dictionary with keys 'in_flight', 'timed_out', 'leaked' and 'max_channels'. 
+        """
+        return self._executor.get_stats()
+
+
+    def get_block_devices(
+        self,
+        timeout: float = None
+    ) -> dict:
+        """Get a dictionary output of 'lsblk' command in remote node. The output is cached until the TTL of 
+        the facts cache expires or a command that changes block devices (mkfs, mount, rm) runs in this node. 
+        If facts are persisted, a fresh output is also written to the facts store. 
+
+        Args:
+            timeout: Seconds to wait for 'lsblk' if the output is not cached, None to wait forever. 
 
         Return:
             lsblk_dict: Dictionary output of 'lsblk' command in remote node. 
         """
+        lsblk_dict = self._facts.get("lsblk")
+        if lsblk_dict is not None:
+            return lsblk_dict
+
         lsblk_cmd = ["lsblk", "-b", "--json"]
-        stdout, stderr, exit_code = self.exec_command(lsblk_cmd)
+        stdout, stderr, exit_code = self.exec_command(lsblk_cmd, timeout=timeout)
         if exit_code:
             raise RemoteRuntimeError(lsblk_cmd, self.host, exit_code, stdout, stderr)
-        return loads(stdout)
+        lsblk_dict = loads(stdout)
+        self._facts.set("lsblk", lsblk_dict)
+        if self._facts_store is not None and self._boot_id is not None:
+            self._facts_store.update(self.host, self._boot_id, {"lsblk": lsblk_dict})
+        return lsblk_dict
+
+
+    def invalidate_facts(self) -> None:
+        """Drop all cached facts of this node so that the next lookup queries the remote node. The block devices 
+        stored in the facts store are dropped as well, so a later invocation does not reuse a stale layout. 
+        """
+        self._facts.invalidate()
+        if self._facts_store is not None and self._boot_id is not None:
+            self._facts_store.update(self.host, self._boot_id, {"lsblk": None})
     
 
     def check_connection(self) -> None:
@@ -610,6 +1471,7 @@ class Node:
         Return:
             stats: Boolean to indicate if the SSH connection is active. 
         """
+        self._ensure_connected()
         try:
             transport = self._ssh.get_transport() 
             return transport and transport.is_active()
@@ -617,9 +1479,15 @@ class Node:
             return False 
     
 
-    def _get_home_dir(self) -> None:
+    def _get_home_dir(
+        self,
+        timeout: float = None
+    ) -> None:
         """Get the home directory of this remote node. 
 
+        Args:
+            timeout: Seconds to wait for the command, None to wait forever. 
+
         Return:
             home_dir: Path of the home directory in this remote node. 
         
@@ -627,12 +1495,35 @@ class Node:
             RemoteRuntimeError: When a command fails in remote node. 
         """
         home_cmd = ["echo", "$HOME"]
-        stdout, stderr, exit_code = self.exec_command(home_cmd)
+        stdout, stderr, exit_code = self.exec_command(home_cmd, timeout=timeout)
         if exit_code:
             raise RemoteRuntimeError(home_cmd, self.host, exit_code, stdout, stderr)
         return stdout.rstrip()
     
 
+    def _get_boot_id_and_home_dir(
+        self,
+        timeout: float = None
+    ) -> tuple:
+        """Get the boot ID and the home directory of this remote node in a single command. 
+
+        Args:
+            timeout: Seconds to wait for the command, None to wait forever. 
+
+        Return:
+            The tuple (boot ID, path of home directory) of this remote node. 
+        
+        Raise:
+            RemoteRuntimeError: When a command fails in remote node. 
+        """
+        boot_home_cmd = ["cat", "/proc/sys/kernel/random/boot_id;", "echo", "$HOME"]
+        stdout, stderr, exit_code = self.exec_command(boot_home_cmd, timeout=timeout)
+        if exit_code:
+            raise RemoteRuntimeError(boot_home_cmd, self.host, exit_code, stdout, stderr)
+        boot_id, home_dir = stdout.rstrip().split("\n")
+        return boot_id.strip(), home_dir.strip()
+    
+
     def ps(
         self
     ) -> str:
@@ -649,6 +1540,44 @@ class Node:
         return stdout.rstrip()
 
 
+    def processes(
+        self,
+        max_age_sec: float = 5,
+        all_users: bool = False
+    ) -> ProcessSnapshot:
+        """Get a snapshot of the processes in the node. A snapshot taken less than the given age ago is reused, 
+        so checks for different processes in the same pass share a single 'ps' command. Snapshots are not 
+        modified once taken, so the cached snapshot is returned without a copy and lookups memoized in it 
+        carry over to later calls. 
+
+        Args:
+            max_age_sec: Maximum age in seconds of a cached snapshot, 0 to always list processes again. 
+            all_users: If True, list processes of all users instead of only those of the user logged in, 
+                        which is what 'ps' lists. 
+        
+        Return:
+            snapshot: ProcessSnapshot of the processes in the node. 
+        """
+        facts_key = "processes_all" if all_users else "processes"
+        snapshot = self._facts.get(facts_key, copy=False)
+        if snapshot is not None and time() - snapshot.time <= max_age_sec:
+            return snapshot 
+
+        ps_cmd = ["ps", "-e" if all_users else "-u {}".format(self._cred_dict["user"]), "-o", PS_FORMAT]
+        stdout, stderr, exit_code = self.exec_command(ps_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(ps_cmd, self.host, exit_code, stdout, stderr)
+        snapshot = ProcessSnapshot.from_ps_output(stdout, exclude_cmdline=" ".join(ps_cmd))
+        self._facts.set(facts_key, snapshot, copy=False)
+        return snapshot 
+
+
+    def _invalidate_processes(self) -> None:
+        """Drop cached process snapshots after processes were killed."""
+        self._facts.invalidate("processes")
+        self._facts.invalidate("processes_all")
+
+
     def kill(
         self,
         pid: int
@@ -660,22 +1589,72 @@ class Node:
         """
         kill_cmd = ["sudo", "kill", "-9", str(pid)]
         stdout, stderr, exit_code = self.exec_command(kill_cmd)
+        self._invalidate_processes()
         if exit_code:
             raise RemoteRuntimeError(kill_cmd, self.host, exit_code, stdout, stderr)
     
 
-    def match_kill(
+    def kill_matching(
         self,
-        match_substr: str 
+        pattern: str,
+        tree: bool = True,
+        signal: str = "TERM",
+        grace_sec: float = 5,
+        user: str = None,
+        all_users: bool = False
     ) -> list:
+        """Kill every process whose command line matches a pattern, and their descendants, with a single remote 
+        command. Processes still alive after the grace period are killed with SIGKILL. 
+
+        Args:
+            pattern: Extended regular expression matched against the full command line, as used by 'pgrep -f'. 
+            tree: If True, also kill all descendants of the matching processes. 
+            signal: Name of the signal sent first, such as 'TERM', 'INT' or 'KILL'. 
+            grace_sec: Seconds to wait for processes to exit before sending SIGKILL, checked every 0.2 seconds. 
+            user: Name of the user whose processes are matched, None for the user logged in. Descendants of 
+                    matching processes are killed whoever owns them. 
+            all_users: If True, match processes of all users. 
+        
+        Return:
+            kill_list: List of dictionaries with keys 'pid', 'cmdline' and 'signal', the name of the signal that 
+                        ended the process or None if it was still alive after SIGKILL. 
+        
+        Raises:
+            RemoteRuntimeError: If the kill script failed in the remote node. 
+        """
+        signal = signal.upper()
+        signal = signal[3:] if signal.startswith("SIG") else signal 
+        match_user = "" if all_users else (self._cred_dict["user"] if user is None else user)
+        kill_cmd = ["sudo", "bash", "-s", "--", quote(pattern), "1" if tree else "0", quote(signal), 
+                        str(max(0, int(round(grace_sec * 1000)))), quote(match_user)]
+        stdout, stderr, exit_code = self.exec_command(kill_cmd, stdin_str=KILL_MATCHING_SCRIPT)
+        self._invalidate_processes()
+        if exit_code:
+            raise RemoteRuntimeError(kill_cmd, self.host, exit_code, stdout, stderr)
+
         kill_list = []
-        ps_output = self.ps()
-        for ps_row in ps_output.split("\n"):
-            if match_substr in ps_row:
-                pid = int(ps_row.strip().split(' ')[0])
-                self.kill(pid)
-                ps_output.append(ps_row)
+        for kill_row in stdout.splitlines():
+            split_row = kill_row.split("\t", 2)
+            if len(split_row) != 3 or not split_row[0].isdigit():
+                continue 
+            pid, kill_signal, cmdline = split_row
+            kill_list.append({"pid": int(pid), "cmdline": cmdline, "signal": None if kill_signal == "-" else kill_signal})
         return kill_list
+
+
+    def match_kill(
+        self,
+        match_substr: str 
+    ) -> list:
+        """Kill processes of the user logged in whose command line contains a substring with SIGKILL. 
+
+        Args:
+            match_substr: Substring of the command line of processes to kill. 
+        
+        Return:
+            kill_list: List of dictionaries of the processes killed, as returned by kill_matching. 
+        """
+        return self.kill_matching(re.escape(match_substr), tree=False, signal="KILL", grace_sec=0)
     
 
     def find_all_files_in_dir(
@@ -690,14 +1669,31 @@ class Node:
         Returns:
             Array of absolute paths of files in the directory and its subdirectories. 
 
+        Raises:
+            RemoteRuntimeError: Raised if remote command failed. 
+        """
+        return list(self.iter_files_in_dir(remote_dir_path))
+
+
+    def iter_files_in_dir(
+            self,
+            remote_dir_path: str 
+    ):
+        """Yield the files in this directory and all its subdirectories as they are found. 
+
+        Args:
+            remote_dir_path: Path of the remote directory to search. 
+        
+        Yields:
+            Absolute path of a file in the directory or its subdirectories. 
+
         Raises:
             RemoteRuntimeError: Raised if remote command failed. 
         """
         find_files_cmd = ["find", remote_dir_path, "-type", "f"]
-        stdout, stderr, exit_code = self.exec_command(find_files_cmd)
-        if exit_code:
-            raise RemoteRuntimeError(find_files_cmd, self.host, exit_code, stdout, stderr)
-        return stdout.rstrip().split("\n")
+        for file_path in self.stream_command(find_files_cmd):
+            if file_path:
+                yield file_path
 
 
     def local_path_map(
@@ -738,21 +1734,134 @@ class Node:
         return local_data_dir_path.joinpath(remote_file_path_subdir_str)
     
 
+    def list_dir_tree(
+            self,
+            remote_dir_path: str 
+    ) -> dict:
+        """List all the files in this directory and its subdirectories with their size and modification time 
+        using a single remote command. 
+
+        Args:
+            remote_dir_path: Path of the remote directory to list. 
+        
+        Returns:
+            file_dict: Dictionary of absolute path of each file to a dictionary with keys 'size' and 'mtime'. 
+
+        Raises:
+            RemoteRuntimeError: Raised if remote command failed. 
+        """
+        list_cmd = ["find", quote(self.format_path(remote_dir_path)), "-type", "f", "-printf", quote("%s\t%T@\t%p\n")]
+        file_dict = {}
+        for file_line in self.stream_command(list_cmd):
+            if not file_line:
+                continue 
+            size, mtime, file_path = file_line.split("\t", 2)
+            file_dict[file_path] = {"size": int(size), "mtime": float(mtime)}
+        return file_dict
+
+
     def sync_dir(
             self,
             remote_dir_path: str, 
-            local_dir_path: str 
-    ) -> None:
-        remote_file_list = self.find_all_files_in_dir(remote_dir_path)
-        for remote_file_path in remote_file_list:
-            remote_data_path = Path(remote_file_path)
-            local_path = self.local_path_map(remote_data_path, Path(self.format_path(remote_dir_path)), local_data_dir_path=Path(local_dir_path))
-            
-            remote_file_size = self.get_file_size(remote_file_path)
-            local_file_size = local_path.stat().st_size if local_path.exists() else 0 
-            if remote_file_size != local_file_size:
-                print("Downloading {} to {} as file sizes are different {} vs {}.".format(remote_file_path, local_path, remote_file_size, local_file_size))
-                local_path.parent.mkdir(exist_ok=True, parents=True)
-                self.download(remote_file_path, local_path)
+            local_dir_path: str,
+            resume: bool = True,
+            delta: bool = False,
+            max_parallel: int = 4,
+            transfer_scheduler = None,
+            priority: int = 5
+    ) -> dict:
+        """Download files in a remote directory whose size differs from the local copy. The directory is listed 
+        with a single command and files are downloaded concurrently by a bounded pool of workers. 
+
+        Args:
+            remote_dir_path: Path of the remote directory. 
+            local_dir_path: Path of the local directory. 
+            resume: If True, a download interrupted in an earlier sync resumes from its checkpoint. 
+            delta: If True, compare block hashes of every file instead of sizes and only download blocks that 
+                    changed, which also finds changes that kept the size of the file. 
+            max_parallel: Maximum number of files downloaded at the same time. 
+            transfer_scheduler: TransferScheduler to queue downloads in, so they share its concurrency and 
+                                    bandwidth limits with other transfers, None to use a pool of this sync. 
+                                    Delta syncs are not queued. 
+            priority: Priority of the downloads in the transfer scheduler, lower values start first. 
+        
+        Return:
+            sync_report: Dictionary with keys 'downloaded' and 'skipped', the lists of remote paths downloaded and 
+                            already up to date, and 'failed', a dictionary of remote path to the exception raised. 
+        """
+        # The digests of all files downloaded by this sync are written to the manifest once at the end of the sync. 
+        with self._transfer_manifest.batch() as manifest_batch:
+            return self._sync_dir(remote_dir_path, local_dir_path, resume, delta, max_parallel, transfer_scheduler, priority, manifest_batch)
+
+
+    def _sync_dir(
+            self,
+            remote_dir_path: str, 
+            local_dir_path: str,
+            resume: bool,
+            delta: bool,
+            max_parallel: int,
+            transfer_scheduler,
+            priority: int,
+            manifest_batch: dict 
+    ) -> dict:
+        """Download files in a remote directory whose size differs from the local copy. See sync_dir. Downloads 
+        run by this sync record their digests in the manifest batch of the sync, while downloads queued in the 
+        transfer scheduler run in its worker threads and record them as they complete. 
+        """
+        remote_dir_path = self.format_path(remote_dir_path)
+        sync_report = {"downloaded": [], "skipped": [], "failed": {}}
+        download_list = []
+        for remote_file_path, remote_file_info in self.list_dir_tree(remote_dir_path).items():
+            local_path = self.local_path_map(Path(remote_file_path), Path(remote_dir_path), local_data_dir_path=Path(local_dir_path))
+            local_file_size = local_path.stat().st_size if local_path.exists() else None 
+            if delta or remote_file_info["size"] != local_file_size:
+                download_list.append((remote_file_path, local_path))
             else:
-                print("File aready good {}, {}.".format(remote_file_path, local_path))
\ No newline at end of file
+                print("File aready good {}, {}.".format(remote_file_path, local_path))
+                sync_report["skipped"].append(remote_file_path)
+
+        def sync_file(remote_file_path, local_path):
+            # The downloads of this sync run in its manifest batch even though they run in other threads. 
+            with self._transfer_manifest.batch(manifest_batch):
+                local_path.parent.mkdir(exist_ok=True, parents=True)
+                if delta:
+                    report = self.delta_download(remote_file_path, local_path)
+                    print("Synced {} to {}, fetched {} bytes.".format(remote_file_path, local_path, report.get("fetched_byte", report["size_byte"])))
+                else:
+                    print("Downloading {} to {}.".format(remote_file_path, local_path))
+                    # Files are already downloaded concurrently, so each uses a single SFTP session. 
+                    self.download(remote_file_path, local_path, parallelism=1, resume=resume)
+
+        if download_list and transfer_scheduler is not None and not delta:
+            future_dict = {}
+            for remote_file_path, local_path in download_list:
+                print("Queueing download of {} to {}.".format(remote_file_path, local_path))
+                local_path.parent.mkdir(exist_ok=True, parents=True)
+                future_dict[remote_file_path] = transfer_scheduler.submit(
+                                                    self, 
+                                                    "download", 
+                                                    remote_file_path, 
+                                                    local_path, 
+                                                    priority=priority, 
+                                                    parallelism=1, 
+                                                    resume=resume)
+            for remote_file_path, future in future_dict.items():
+                try:
+                    future.result()
+                    sync_report["downloaded"].append(remote_file_path)
+                except Exception as e:
+                    print("Failed to sync {}, {}".format(remote_file_path, e))
+                    sync_report["failed"][remote_file_path] = e 
+        elif download_list:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(download_list)))) as executor:
+                future_dict = {remote_file_path: executor.submit(sync_file, remote_file_path, local_path) 
+                                for remote_file_path, local_path in download_list}
+                for remote_file_path, future in future_dict.items():
+                    try:
+                        future.result()
+                        sync_report["downloaded"].append(remote_file_path)
+                    except Exception as e:
+                        print("Failed to sync {}, {}".format(remote_file_path, e))
+                        sync_report["failed"][remote_file_path] = e 
+        return sync_report 
@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from expK8.remoteFS.Node import Node
+from expK8.remoteFS.FactsStore import FactsStore
+
+
+class NodeConnector:
+    """NodeConnector creates Node objects concurrently so that the time to connect to a set of remote nodes
+    does not grow linearly with the number of nodes. 
+
+    Attributes:
+        max_parallel: Maximum number of nodes to connect to at the same time. 
+        connect_timeout: Seconds to wait for a node before giving up on it. 
+        facts_store: Local store of node facts shared by all nodes, None if facts are not persisted. 
+        report: Dictionary of host name to the connection report of the host from the last call to connect. 
+    """
+    def __init__(
+            self,
+            max_parallel: int = 16,
+            connect_timeout: float = 30,
+            facts_store: FactsStore = None
+    ) -> None:
+        self.max_parallel = max_parallel
+        self.connect_timeout = connect_timeout
+        self.facts_store = facts_store
+        self.report = {}
+
+
+    def create_node(
+            self,
+            node_spec: dict,
+            lazy: bool = False 
+    ) -> Node:
+        """Create a Node from its specification. 
+
+        Args:
+            node_spec: Dictionary with keys 'name', 'host', 'cred' and 'mount_list'. 
+            lazy: If True, the node connects on its first use instead of when it is created. 
+        
+        Returns:
+            node: Node created from the specification. 
+        """
+        return Node(
+                node_spec["name"], 
+                node_spec["host"], 
+                node_spec["cred"], 
+                node_spec["mount_list"], 
+                connect_timeout=self.connect_timeout,
+                facts_store=self.facts_store,
+                lazy=lazy)
+
+
+    @staticmethod
+    def get_node_report(node: Node) -> dict:
+        """Get the connection report of a node that has attempted to connect. 
+
+        Args:
+            node: The node whose report is returned. 
+        
+        Returns:
+            node_report: Dictionary with keys 'name', 'live', 'latency_sec' and 'error'. 
+        """
+        return {
+            "name": node.name,
+            "live": node.is_live(),
+            "latency_sec": node.connect_latency_sec,
+            "error": None if node.is_live() else str(node._ssh_exception)
+        }
+
+
+    def connect(
+            self,
+            node_spec_list: list 
+    ) -> list:
+        """Connect to all nodes in the list concurrently. A slow or dead host only occupies one of the workers 
+        until its connection times out and does not block the other hosts. 
+
+        Args:
+            node_spec_list: List of dictionaries with keys 'name', 'host', 'cred' and 'mount_list'. 
+        
+        Returns:
+            node_list: List of Node objects in the same order as the list of specifications. 
+        """
+        self.report = {}
+        if not node_spec_list:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel, len(node_spec_list)))) as executor:
+            node_list = list(executor.map(self.create_node, node_spec_list))
+        
+        for node in node_list:
+            self.report[node.host] = self.get_node_report(node)
+        return node_list
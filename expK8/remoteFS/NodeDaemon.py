@@ -0,0 +1,398 @@
+"""NodeDaemon is a long-lived local process that owns the SSH connections to all nodes of a RemoteFS. CLI scripts 
+use NodeDaemonClient to send requests over a Unix socket, so the connections stay warm across invocations and 
+repeated commands do not pay the latency of reconnecting. 
+
+Start the daemon:
+    python3 -m expK8.remoteFS.NodeDaemon --c config.json
+
+Use it from a script:
+    client = NodeDaemonClient()
+    stdout, stderr, exit_code = client.exec_command(host_name, ["ps", "aux"])
+
+Or get a stand-in for a Node whose methods are called through the daemon:
+    node = client.get_node(host_name)
+    running = node.processes().is_running("bin/cachebench")
+"""
+
+from os import umask
+from json import load, loads, dumps
+from pathlib import Path 
+from threading import Thread
+from argparse import ArgumentParser
+from socket import socket, AF_UNIX, SOCK_STREAM
+from socketserver import ThreadingUnixStreamServer, StreamRequestHandler
+
+from expK8.remoteFS.RemoteFS import RemoteFS
+from expK8.remoteFS.ProcessSnapshot import ProcessSnapshot
+from expK8.remoteFS.NodeException import NodeDaemonError
+
+
+DEFAULT_SOCKET_PATH = "~/.expK8/daemon.sock"
+
+
+class NodeDaemonHandler(StreamRequestHandler):
+    """Handles a connection from a client. Each line sent by the client is a JSON request and each line sent back 
+    is the JSON response to it."""
+    def handle(self) -> None:
+        for request_line in self.rfile:
+            if not request_line.strip():
+                continue 
+            try:
+                request = loads(request_line)
+                response = {"ok": True, "result": self.server.node_daemon.serve(request)}
+            except Exception as e:
+                response = {"ok": False, "error_type": type(e).__name__, "error": str(e)}
+            self.wfile.write((dumps(response, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class NodeDaemon:
+    """NodeDaemon serves requests to run operations on the nodes of a RemoteFS over a Unix socket. 
+
+    Attributes:
+        remote_fs: RemoteFS that owns the connections to the nodes. Nodes are connected on first use. 
+        socket_path: Path of the Unix socket the daemon listens on. 
+        _server: Server accepting connections on the socket. 
+    """
+    def __init__(
+            self,
+            config: dict,
+            socket_path: str = DEFAULT_SOCKET_PATH
+    ) -> None:
+        self.remote_fs = RemoteFS(config, lazy=True)
+        self.socket_path = Path(socket_path).expanduser()
+        self._server = None 
+
+
+    def _get_node(
+            self,
+            host_name: str 
+    ):
+        """Get a node of the RemoteFS. 
+
+        Args:
+            host_name: Host name of the node. 
+        
+        Returns:
+            node: The Node with the host name. 
+        
+        Raises:
+            ValueError: If no node in the configuration has the host name. 
+        """
+        node = self.remote_fs.get_node(host_name)
+        if node is None:
+            raise ValueError("No node with host name {}.".format(host_name))
+        return node 
+
+
+    def serve(
+            self,
+            request: dict 
+    ):
+        """Serve a request from a client. 
+
+        Args:
+            request: Dictionary with key 'op' and the arguments of the operation. The operations are 
+                        'ping', 'hosts', 'exec', 'call', 'broadcast', 'channel_stats' and 'shutdown'. 
+        
+        Returns:
+            result: JSON serializable result of the operation. 
+        
+        Raises:
+            ValueError: If the operation is not known. 
+        """
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        elif op == "hosts":
+            if request.get("live", False):
+                return self.remote_fs.get_all_live_host_names()
+            return self.remote_fs.get_all_host_names()
+        elif op == "exec":
+            return self._get_node(request["host"]).exec_command(request["cmd"], timeout=request.get("timeout"))
+        elif op == "call":
+            method_name = request["method"]
+            if method_name.startswith("_"):
+                raise ValueError("Private method {} cannot be called.".format(method_name))
+            method = getattr(self._get_node(request["host"]), method_name)
+            result = method(*request.get("args", []), **request.get("kwargs", {}))
+            # Snapshots are sent as their list of processes and rebuilt by the client. 
+            return list(result) if isinstance(result, ProcessSnapshot) else result
+        elif op == "broadcast":
+            return self.remote_fs.broadcast(
+                        request["cmd"], 
+                        max_parallel=request.get("max_parallel", 64),
+                        deadline=request.get("deadline"),
+                        host_name_list=request.get("hosts"))
+        elif op == "channel_stats":
+            return self._get_node(request["host"]).get_channel_stats()
+        elif op == "shutdown":
+            Thread(target=self._server.shutdown, daemon=True).start()
+            return "shutting down"
+        else:
+            raise ValueError("Unknown op {}.".format(op))
+
+
+    def serve_forever(self) -> None:
+        """Listen on the Unix socket and serve requests until a shutdown request is received."""
+        self.socket_path.parent.mkdir(mode=0o700, exist_ok=True, parents=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        
+        # Anyone who can connect can run commands in the nodes, so the socket is created readable and writable 
+        # only by the user. Changing its mode after bind would leave a window where others can connect. 
+        old_umask = umask(0o177)
+        try:
+            self._server = ThreadingUnixStreamServer(str(self.socket_path), NodeDaemonHandler)
+        finally:
+            umask(old_umask)
+        self._server.daemon_threads = True 
+        self._server.node_daemon = self 
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+class NodeDaemonClient:
+    """NodeDaemonClient sends requests to a running NodeDaemon. 
+
+    Attributes:
+        socket_path: Path of the Unix socket the daemon listens on. 
+        timeout: Seconds to wait for a response from the daemon, None to wait forever. 
+    """
+    def __init__(
+            self,
+            socket_path: str = DEFAULT_SOCKET_PATH,
+            timeout: float = None
+    ) -> None:
+        self.socket_path = Path(socket_path).expanduser()
+        self.timeout = timeout 
+        self._socket = None 
+        self._reader = None 
+
+
+    def _connect(self) -> None:
+        """Connect to the socket of the daemon if not already connected."""
+        if self._socket is None:
+            client_socket = socket(AF_UNIX, SOCK_STREAM)
+            client_socket.settimeout(self.timeout)
+            try:
+                client_socket.connect(str(self.socket_path))
+            except OSError:
+                client_socket.close()
+                raise
+            self._socket = client_socket
+            self._reader = client_socket.makefile("rb")
+
+
+    def close(self) -> None:
+        """Close the connection to the daemon."""
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None 
+            self._reader = None 
+
+
+    def is_running(self) -> bool:
+        """Check if a daemon is serving requests on the socket. 
+
+        Returns:
+            running: Boolean indicating if the daemon responded. 
+        """
+        try:
+            return self.request("ping") == "pong"
+        except (OSError, ValueError):
+            self.close()
+            return False 
+
+
+    def request(
+            self,
+            op: str,
+            **kwargs
+    ):
+        """Send a request to the daemon and wait for the response. 
+
+        Args:
+            op: The operation to request. 
+            kwargs: Arguments of the operation. 
+        
+        Returns:
+            result: The result of the operation. 
+        
+        Raises:
+            NodeDaemonError: If the daemon failed to serve the request. 
+        """
+        self._connect()
+        request = dict(kwargs, op=op)
+        self._socket.sendall((dumps(request) + "\n").encode("utf-8"))
+        response_line = self._reader.readline()
+        if not response_line:
+            self.close()
+            raise ConnectionError("Daemon closed the connection.")
+        
+        response = loads(response_line)
+        if not response["ok"]:
+            raise NodeDaemonError(op, response["error_type"], response["error"])
+        return response["result"]
+
+
+    def exec_command(
+            self,
+            host_name: str,
+            command_str_arr: list,
+            timeout: float = None
+    ) -> tuple:
+        """Run a command in a node through the daemon. 
+
+        Args:
+            host_name: Host name of the node. 
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            timeout: Seconds to wait before before a remote command times out. 
+        
+        Return:
+            The tuple (stdout, stderr, exit code) of the command. 
+        """
+        return tuple(self.request("exec", host=host_name, cmd=command_str_arr, timeout=timeout))
+
+
+    def call(
+            self,
+            host_name: str,
+            method_name: str,
+            *args,
+            **kwargs
+    ):
+        """Call a public method of a node through the daemon. Arguments and return value must be JSON serializable. 
+
+        Args:
+            host_name: Host name of the node. 
+            method_name: Name of the method of Node, e.g. 'get_file_size'. 
+        
+        Returns:
+            result: Value returned by the method. 
+        """
+        return self.request("call", host=host_name, method=method_name, args=list(args), kwargs=kwargs)
+
+
+    def broadcast(
+            self,
+            command_str_arr: list,
+            max_parallel: int = 64,
+            deadline: float = None,
+            host_name_list: list = None
+    ) -> dict:
+        """Run a command on many nodes through the daemon. See RemoteFS.broadcast.
+
+        Args:
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            max_parallel: Maximum number of nodes the command runs on at the same time. 
+            deadline: Seconds after which hosts that have not completed are marked as stragglers. 
+            host_name_list: List of host names to run the command on. Defaults to all live hosts. 
+        
+        Returns:
+            result_dict: Dictionary of host name to the result of the command in the host. 
+        """
+        return self.request("broadcast", cmd=command_str_arr, max_parallel=max_parallel, deadline=deadline, hosts=host_name_list)
+
+
+    def processes(
+            self,
+            host_name: str,
+            max_age_sec: float = 5,
+            all_users: bool = False
+    ) -> ProcessSnapshot:
+        """Get a snapshot of the processes running in a node through the daemon. See Node.processes. 
+
+        Args:
+            host_name: Host name of the node. 
+            max_age_sec: Maximum age in seconds of a snapshot cached by the daemon. 
+            all_users: If True, list the processes of all users. 
+        
+        Returns:
+            snapshot: ProcessSnapshot of the processes running in the node. 
+        """
+        process_list = self.call(host_name, "processes", max_age_sec=max_age_sec, all_users=all_users)
+        return ProcessSnapshot(process_list)
+
+
+    def get_node(
+            self,
+            host_name: str 
+    ):
+        """Get a stand-in for a node whose methods are called through the daemon, so that functions written 
+        for a Node can run unchanged. 
+
+        Args:
+            host_name: Host name of the node. 
+        
+        Returns:
+            node: DaemonNode of the host. 
+        """
+        return DaemonNode(self, host_name)
+
+
+class DaemonNode:
+    """DaemonNode stands in for a Node in scripts that use a NodeDaemon. Public methods of Node are called in the 
+    daemon, so arguments and return values must be JSON serializable, except for processes which returns a 
+    ProcessSnapshot. 
+
+    Attributes:
+        name: Name of the node, which is its host name as the daemon only knows nodes by host. 
+        host: Host name of the node. 
+        _client: NodeDaemonClient used to call the daemon. 
+    """
+    def __init__(
+            self,
+            client: NodeDaemonClient,
+            host_name: str 
+    ) -> None:
+        self.name = host_name 
+        self.host = host_name 
+        self._client = client 
+
+
+    def __getattr__(
+            self,
+            method_name: str 
+    ):
+        if method_name.startswith("_"):
+            raise AttributeError(method_name)
+        return lambda *args, **kwargs: self._client.call(self.host, method_name, *args, **kwargs)
+
+
+    def exec_command(
+            self,
+            command_str_arr: list,
+            timeout: float = None
+    ) -> tuple:
+        return self._client.exec_command(self.host, command_str_arr, timeout=timeout)
+
+
+    def processes(
+            self,
+            max_age_sec: float = 5,
+            all_users: bool = False
+    ) -> ProcessSnapshot:
+        return self._client.processes(self.host, max_age_sec=max_age_sec, all_users=all_users)
+
+
+def main(args):
+    with args.c.open("r") as config_file_handle:
+        fs_config = load(config_file_handle)
+    
+    node_daemon = NodeDaemon(fs_config, socket_path=args.s)
+    print("Serving nodes in {} on {}".format(args.c, node_daemon.socket_path))
+    node_daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run a local daemon that keeps SSH connections to remote nodes warm.")
+    parser.add_argument("--c", default=Path("config.json"), type=Path, help="Path to remote FS configuration.")
+    parser.add_argument("--s", default=DEFAULT_SOCKET_PATH, type=str, help="Path of Unix socket to listen on. (Default: {})".format(DEFAULT_SOCKET_PATH))
+    args = parser.parse_args()
+    main(args)
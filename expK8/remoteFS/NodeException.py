@@ -45,4 +45,78 @@ class RemoteRuntimeError(Exception):
             stderr: str
     ) -> None:
         super().__init__("cmd: {} failed in host{} with exit code {} () \n stdout \n {} \n \
-            stderr \n {}".format(" ".join(remote_cmd), host_name, exit_code, stdout, stderr))
\ No newline at end of file
+            stderr \n {}".format(" ".join(remote_cmd), host_name, exit_code, stdout, stderr))
+
+class RemoteCommandTimeout(RemoteRuntimeError):
+    """Exception raised when a remote command does not complete before its timeout. The channel running the 
+    command is closed when this is raised, so the command is not retried as it might not be idempotent. 
+    
+    Args:
+        remote_cmd: The command that timed out. 
+        host_name: Host name of the node. 
+        timeout: Seconds waited before the command timed out. 
+        stdout: The stdout received before the timeout. 
+        stderr: The stderr received before the timeout. 
+    """
+    def __init__(
+            self, 
+            remote_cmd: list,
+            host_name: str, 
+            timeout: float, 
+            stdout: str,
+            stderr: str
+    ) -> None:
+        Exception.__init__(self, "cmd: {} timed out after {} seconds in host {} \n stdout \n {} \n \
+            stderr \n {}".format(" ".join(remote_cmd), timeout, host_name, stdout, stderr))
+
+
+class ChannelOpenError(Exception):
+    """Exception raised when a channel to run a command could not be opened in the remote node. The command 
+    was never sent to the remote node so it is safe to retry. 
+
+    Args:
+        host_name: Host name of the node. 
+        reason: Exception raised when opening the channel. 
+    """
+    def __init__(
+            self,
+            host_name: str,
+            reason: Exception
+    ) -> None:
+        super().__init__("Could not open a channel to host {}: {}".format(host_name, reason))
+
+
+class NodeDaemonError(Exception):
+    """Exception raised by a NodeDaemonClient when the daemon fails to serve a request. 
+
+    Args:
+        op: The operation requested from the daemon. 
+        error_type: Name of the type of exception raised in the daemon. 
+        error_msg: Message of the exception raised in the daemon. 
+    """
+    def __init__(
+            self,
+            op: str,
+            error_type: str,
+            error_msg: str 
+    ) -> None:
+        super().__init__("Daemon failed op {} with {}: {}".format(op, error_type, error_msg))
+        self.error_type = error_type
+
+
+class NodeUnavailable(RemoteRuntimeError):
+    """Exception raised when a node cannot be reached. After reconnecting fails, calls to the node fail with this 
+    exception immediately until the cooldown ends instead of waiting on a dead connection. 
+
+    Args:
+        host_name: Host name of the node. 
+        reason: Exception raised when last connecting to the node. 
+        retry_in_sec: Seconds after which the node will be tried again. 
+    """
+    def __init__(
+            self,
+            host_name: str,
+            reason: Exception,
+            retry_in_sec: float 
+    ) -> None:
+        Exception.__init__(self, "Host {} is unavailable, retry in {:.1f} seconds: {}".format(host_name, max(0.0, retry_in_sec), reason))
@@ -1,7 +1,8 @@
 from json import load 
 from pathlib import Path 
 
-from expK8.remoteFS.Node import Node
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.NodeConnector import NodeConnector
 
 
 class NodeFactory:
@@ -23,15 +24,22 @@ class NodeFactory:
         
     
     def _load_nodes(self) -> None: 
-        self.nodes = []
+        node_spec_list = []
         for node_name in self.config["nodes"]:
             node_info = self.config["nodes"][node_name]
-            node = Node(
-                    node_info["host"], 
-                    node_info["host"], 
-                    self.config["creds"][node_info["cred"]], 
-                    self.config["mounts"][node_info["mount"]])
-            self.nodes.append(node)
+            node_spec_list.append({
+                "name": node_info["host"], 
+                "host": node_info["host"], 
+                "cred": self.config["creds"][node_info["cred"]], 
+                "mount_list": self.config["mounts"][node_info["mount"]]
+            })
+        
+        connector = NodeConnector(
+                        max_parallel=self.config.get("max_parallel_connect", 16),
+                        connect_timeout=self.config.get("connect_timeout", 30),
+                        facts_store=FactsStore.from_config(self.config))
+        self.nodes = connector.connect(node_spec_list)
+        self.connect_report = connector.report
     
 
     def get_node_list(self) -> list:
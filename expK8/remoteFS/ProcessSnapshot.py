@@ -0,0 +1,177 @@
+from time import time
+
+
+"""Columns requested from 'ps'. The trailing '=' removes the header and args is last as it can contain spaces."""
+PS_FORMAT = "pid=,ppid=,pgid=,user=,etimes=,args="
+
+
+class ProcessSnapshot:
+    """ProcessSnapshot is a parsed listing of the processes running in a node at a point in time. Processes are
+    indexed by PID and by parent so that process trees are walked without another listing, and lookups by
+    command substrings are memoized so a scheduling pass can ask many questions of a single 'ps'.
+
+    Each process is a dictionary with keys 'pid', 'ppid', 'pgid', 'user', 'elapsed_sec' and 'cmdline'.
+
+    Attributes:
+        time: Time when the listing was taken.
+        _process_dict: Dictionary of PID to process.
+        _children_dict: Dictionary of PID to the list of PIDs of its children.
+        _match_dict: Dictionary of a tuple of substrings to the list of PIDs whose command line contains them.
+    """
+    def __init__(
+            self,
+            process_list: list,
+            snapshot_time: float = None
+    ) -> None:
+        self.time = time() if snapshot_time is None else snapshot_time
+        self._process_dict = {process["pid"]: process for process in process_list}
+        self._children_dict = {}
+        for process in process_list:
+            self._children_dict.setdefault(process["ppid"], []).append(process["pid"])
+        self._match_dict = {}
+
+
+    @staticmethod
+    def from_ps_output(
+            ps_output: str,
+            exclude_cmdline: str = None
+    ):
+        """Parse the output of 'ps -o' with PS_FORMAT.
+
+        Args:
+            ps_output: Output of the 'ps' command.
+            exclude_cmdline: Command line of processes to leave out, such as the 'ps' command itself.
+
+        Returns:
+            snapshot: ProcessSnapshot of the processes in the output.
+        """
+        process_list = []
+        for ps_row in ps_output.splitlines():
+            split_row = ps_row.split(None, 5)
+            if len(split_row) < 5 or not split_row[0].isdigit():
+                continue
+            pid, ppid, pgid, user, elapsed_sec = split_row[:5]
+            cmdline = split_row[5] if len(split_row) == 6 else ""
+            if cmdline == exclude_cmdline:
+                continue
+            process_list.append({
+                "pid": int(pid),
+                "ppid": int(ppid),
+                "pgid": int(pgid),
+                "user": user,
+                "elapsed_sec": int(elapsed_sec),
+                "cmdline": cmdline
+            })
+        return ProcessSnapshot(process_list)
+
+
+    def __len__(self) -> int:
+        return len(self._process_dict)
+
+
+    def __iter__(self):
+        return iter(self._process_dict.values())
+
+
+    def get(
+            self,
+            pid: int
+    ) -> dict:
+        """Get a process by PID.
+
+        Args:
+            pid: PID of the process.
+
+        Returns:
+            process: Dictionary of the process, None if no process has the PID.
+        """
+        return self._process_dict.get(pid)
+
+
+    def find(
+            self,
+            *substr_list: str,
+            user: str = None
+    ) -> list:
+        """Find processes whose command line contains every given substring.
+
+        Args:
+            substr_list: Substrings that must all be in the command line.
+            user: Name of the user that must own the process, None for any user.
+
+        Returns:
+            process_list: List of matching processes in order of PID.
+        """
+        if substr_list not in self._match_dict:
+            self._match_dict[substr_list] = sorted(pid for pid, process in self._process_dict.items()
+                                                    if all(substr in process["cmdline"] for substr in substr_list))
+        return [self._process_dict[pid] for pid in self._match_dict[substr_list]
+                    if user is None or self._process_dict[pid]["user"] == user]
+
+
+    def is_running(
+            self,
+            *substr_list: str,
+            user: str = None
+    ) -> bool:
+        """Check if any process has a command line that contains every given substring.
+
+        Args:
+            substr_list: Substrings that must all be in the command line.
+            user: Name of the user that must own the process, None for any user.
+
+        Returns:
+            running: Boolean indicating if a matching process is running.
+        """
+        return len(self.find(*substr_list, user=user)) > 0
+
+
+    def children(
+            self,
+            pid: int
+    ) -> list:
+        """Get the direct children of a process.
+
+        Args:
+            pid: PID of the parent process.
+
+        Returns:
+            process_list: List of child processes.
+        """
+        return [self._process_dict[child_pid] for child_pid in self._children_dict.get(pid, [])]
+
+
+    def descendants(
+            self,
+            pid: int
+    ) -> list:
+        """Get all processes in the tree below a process, parents before their children.
+
+        Args:
+            pid: PID of the root process.
+
+        Returns:
+            process_list: List of descendant processes, not including the root.
+        """
+        process_list = []
+        pending_pid_list = list(self._children_dict.get(pid, []))
+        while pending_pid_list:
+            child_pid = pending_pid_list.pop(0)
+            process_list.append(self._process_dict[child_pid])
+            pending_pid_list += self._children_dict.get(child_pid, [])
+        return process_list
+
+
+    def group(
+            self,
+            pgid: int
+    ) -> list:
+        """Get the processes in a process group.
+
+        Args:
+            pgid: ID of the process group.
+
+        Returns:
+            process_list: List of processes in the group.
+        """
+        return [process for process in self._process_dict.values() if process["pgid"] == pgid]
@@ -1,7 +1,16 @@
+from time import time 
+from uuid import uuid4
+from shlex import quote
+from hashlib import sha256
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
 from paramiko.channel import Channel
 from paramiko import SSHClient, AutoAddPolicy
 
 from expK8.remoteFS.Node import Node 
+from expK8.remoteFS.NodeException import RemoteRuntimeError
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.NodeConnector import NodeConnector
 
 
 class RemoteFS:
@@ -10,13 +19,28 @@ class RemoteFS:
     Attributes:
         _config: The dictionary with configuration parameters for RemoteFS.
         _nodes: List of objects of Node class representing a remote node that RemoteFS is connected to.  
+        _node_spec_list: List of specifications of all nodes in the configuration. 
+        _connector: NodeConnector used to create the nodes. 
+        _lazy: Boolean indicating if nodes are only created and connected when they are accessed. 
+        _nodes_lock: Lock to allow multiple threads to create nodes. 
     """
     def __init__(
             self,
-            config: dict
+            config: dict,
+            lazy: bool = False 
     ) -> None:
+        """Create a RemoteFS from a configuration. 
+
+        Args:
+            config: The dictionary with configuration parameters for RemoteFS. 
+            lazy: If True, a node is only connected when it is first used instead of connecting all nodes. 
+        """
         self._config = config 
         self._nodes = []
+        self._node_spec_list = []
+        self._connector = None 
+        self._lazy = lazy 
+        self._nodes_lock = Lock()
         self._init_nodes()
 
 
@@ -24,7 +48,7 @@ class RemoteFS:
         """Terminate connection with all the nodes. 
         """
         for node in self._nodes:
-            node._ssh.close()
+            node.close()
     
 
     def chown(
@@ -47,7 +71,9 @@ class RemoteFS:
         Return:
             channel: A channel to communicate to a shell in remote host. 
         """
-        return self.get_node(host_name)._ssh.invoke_shell()
+        node = self.get_node(host_name)
+        node._ensure_connected()
+        return node._ssh.invoke_shell()
     
 
     def get_file_size(
@@ -67,6 +93,23 @@ class RemoteFS:
         return self.get_node(host_name).get_file_size(file_path)
 
 
+    def stat_paths(
+        self, 
+        host_name: str, 
+        path_list: list 
+    ) -> dict:
+        """Get existence, type, size and modification time of a list of paths in remote node. 
+
+        Args:
+            host_name: Host name of remote node. 
+            path_list: List of paths in remote node. 
+
+        Returns:
+            path_info_dict: Dictionary of information of each path. See Node.stat_paths. 
+        """
+        return self.get_node(host_name).stat_paths(path_list)
+
+
     def create_random_file_nonblock(
         self,
         host_name: str,
@@ -96,25 +139,48 @@ class RemoteFS:
             node: The node object with matching host name, None if no matching host name found. 
         """
         node = None 
-        for fs_node in self._nodes:
-            if fs_node.host == host_name:
-                node = fs_node 
-                break 
+        with self._nodes_lock:
+            for fs_node in self._nodes:
+                if fs_node.host == host_name:
+                    node = fs_node 
+                    break 
+            else:
+                for node_spec in self._node_spec_list:
+                    if node_spec["host"] == host_name:
+                        # Only lazy FS has nodes that are not created, they connect on first use. 
+                        node = self._connector.create_node(node_spec, lazy=True)
+                        self._nodes.append(node)
+                        break 
         return node 
     
 
+    def _connect_all(self) -> None:
+        """Create and connect all nodes in the configuration that are not connected yet."""
+        with self._nodes_lock:
+            created_host_set = set([node.host for node in self._nodes])
+            missing_spec_list = [spec for spec in self._node_spec_list if spec["host"] not in created_host_set]
+            self._nodes += self._connector.connect(missing_spec_list)
+            node_list = list(self._nodes)
+        
+        # Nodes created lazily by get_node might not have connected yet. 
+        if node_list:
+            with ThreadPoolExecutor(max_workers=max(1, min(self._connector.max_parallel, len(node_list)))) as executor:
+                list(executor.map(lambda node: node.is_live(), node_list))
+
+
     def all_up(self) -> bool:
         """ Check if all the nodes are connected. """
+        self._connect_all()
         return all([node.check_connection() for node in self._nodes]) if len(self._nodes) else False
     
 
     def get_all_host_names(self) -> list:
-        """Get the host name of all nodes in the FS.
+        """Get the host name of all nodes in the FS. This does not connect to any node. 
         
         Returns:
             host_name_arr: Array of host names of remote nodes in the configuration of the FS. 
         """
-        return [n.host for n in self._nodes]
+        return [node_spec["host"] for node_spec in self._node_spec_list]
 
 
     def get_all_live_host_names(self) -> list:
@@ -123,10 +189,11 @@ class RemoteFS:
         Returns:
             host_name_arr: Array of host names of remote nodes in the configuration of the FS. 
         """
+        self._connect_all()
         live_host_names = []
-        for n in self._nodes:
-            if n._ssh_exception is None:
-                live_host_names.append(n.host)
+        for host_name in self.get_all_host_names():
+            if self.get_node(host_name)._ssh_exception is None:
+                live_host_names.append(host_name)
         return live_host_names
     
 
@@ -164,9 +231,294 @@ class RemoteFS:
         return self.get_node(host_name).dir_exists(file_path)
 
 
+    def gather(
+        self,
+        fn,
+        host_name_list: list = None,
+        max_parallel: int = 64
+    ) -> dict:
+        """Run a function on many nodes concurrently and collect the results. 
+
+        Args:
+            fn: Function that takes a Node as its only argument, e.g. lambda node: node.file_exists(path).
+            host_name_list: List of host names to run the function on. Defaults to all live hosts. 
+            max_parallel: Maximum number of nodes the function runs on at the same time. 
+        
+        Returns:
+            result_dict: Dictionary of host name to the value returned by the function for the host, or the 
+                            exception raised by it. 
+        """
+        if host_name_list is None:
+            host_name_list = self.get_all_live_host_names()
+        
+        result_dict = {}
+        if not host_name_list:
+            return result_dict
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(host_name_list)))) as executor:
+            future_dict = {host_name: executor.submit(fn, self.get_node(host_name)) for host_name in host_name_list}
+            for host_name in future_dict:
+                try:
+                    result_dict[host_name] = future_dict[host_name].result()
+                except Exception as e:
+                    result_dict[host_name] = e 
+        return result_dict
+
+
+    def broadcast(
+        self,
+        command_str_arr: list,
+        max_parallel: int = 64,
+        deadline: float = None,
+        host_name_list: list = None,
+        host_filter = None
+    ) -> dict:
+        """Run a command on many nodes at the same time. Hosts that do not complete before the deadline are marked 
+        as stragglers and are not waited for, their channels are closed once the deadline passes. 
+
+        Args:
+            command_str_arr: Array of str representing the command ['ls', '-lh'].
+            max_parallel: Maximum number of nodes the command runs on at the same time. 
+            deadline: Seconds after which hosts that have not completed are marked as stragglers. 
+            host_name_list: List of host names to run the command on. Defaults to all live hosts. 
+            host_filter: Function that takes a Node and returns True if the command should run on it. 
+        
+        Returns:
+            result_dict: Dictionary of host name to a dictionary with keys 'status' ('ok', 'failed' for a nonzero 
+                            exit code, 'error' if the command could not run and 'straggler'), 'exit_code', 'stdout', 
+                            'stderr', 'latency_sec' and 'error'. 
+        """
+        if host_name_list is None:
+            host_name_list = self.get_all_live_host_names()
+        if host_filter is not None:
+            host_name_list = [host_name for host_name in host_name_list if host_filter(self.get_node(host_name))]
+
+        start_time = time()
+        def run_on_host(node):
+            host_start_time = time()
+            timeout = None if deadline is None else max(0.0, deadline - (host_start_time - start_time))
+            host_result = {"status": "ok", "exit_code": None, "stdout": "", "stderr": "", "latency_sec": None, "error": None}
+            try:
+                stdout, stderr, exit_code = node.exec_command(command_str_arr, timeout=timeout, num_retry=1)
+                host_result.update({"exit_code": exit_code, "stdout": stdout, "stderr": stderr})
+                if exit_code:
+                    host_result["status"] = "failed"
+            except Exception as e:
+                host_result.update({"status": "error", "error": str(e)})
+            host_result["latency_sec"] = time() - host_start_time
+            return host_result
+        
+        result_dict = {}
+        if not host_name_list:
+            return result_dict
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(host_name_list))))
+        future_dict = {host_name: executor.submit(run_on_host, self.get_node(host_name)) for host_name in host_name_list}
+        wait(future_dict.values(), timeout=deadline)
+        for host_name in future_dict:
+            future = future_dict[host_name]
+            if future.done() and not future.cancelled():
+                result_dict[host_name] = future.result()
+            else:
+                result_dict[host_name] = {
+                    "status": "straggler", 
+                    "exit_code": None, 
+                    "stdout": "", 
+                    "stderr": "", 
+                    "latency_sec": time() - start_time,
+                    "error": "Did not complete within deadline of {} seconds.".format(deadline)
+                }
+        executor.shutdown(wait=False, cancel_futures=True)
+        return result_dict
+
+
+    def _get_peer_address(
+        self,
+        host_name: str 
+    ) -> str:
+        """Get the address other nodes use to copy files to a node over SSH. 
+
+        Args:
+            host_name: Host name of the node. 
+        
+        Returns:
+            peer_address: Address of the form user@host, where host is the optional 'peer_host' of the node in 
+                            the configuration, such as its address on the experiment network, or its host name. 
+        """
+        for node_spec in self._node_spec_list:
+            if node_spec["host"] == host_name:
+                return "{}@{}".format(node_spec["cred"]["user"], node_spec.get("peer_host") or host_name)
+        raise ValueError("Host {} is not in the configuration.".format(host_name))
+
+
+    def _forward_file(
+        self,
+        source_host_name: str,
+        target_host_name: str,
+        local_path: str,
+        remote_path: str,
+        file_sha256: str 
+    ) -> None:
+        """Copy a file to a node, either from the local machine or from another node that already has the file. 
+        The file is copied to a temporary path and only moved to the remote path once its SHA256 is verified. 
+
+        Args:
+            source_host_name: Host name of the node sending the file, None to upload it from the local machine. 
+            target_host_name: Host name of the node receiving the file. 
+            local_path: Path of the local file. 
+            remote_path: Path of the file in the nodes. 
+            file_sha256: SHA256 of the local file. 
+
+        Raises:
+            RemoteRuntimeError: If the copy or verification failed. 
+        """
+        target_node = self.get_node(target_host_name)
+        target_path = target_node.format_path(remote_path)
+        # The temporary path is unique so that broadcasts of the same path from other processes do not collide. 
+        target_temp_path = "{}.{}.broadcast".format(target_path, uuid4().hex)
+        try:
+            if source_host_name is None:
+                target_node.scp(local_path, target_temp_path)
+            else:
+                source_node = self.get_node(source_host_name)
+                # BatchMode fails the copy instead of waiting on a password prompt if the nodes do not trust each other. 
+                copy_cmd = ["scp", "-q", "-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=accept-new", "-o", "ConnectTimeout=10",
+                            quote(source_node.format_path(remote_path)), 
+                            quote("{}:{}".format(self._get_peer_address(target_host_name), target_temp_path))]
+                stdout, stderr, exit_code = source_node.exec_command(copy_cmd)
+                if exit_code:
+                    raise RemoteRuntimeError(copy_cmd, source_host_name, exit_code, stdout, stderr)
+            
+            verify_cmd = ["echo", quote("{}  {}".format(file_sha256, target_temp_path)), "|", "sha256sum", "-c", "--status", 
+                            "&&", "mv", quote(target_temp_path), quote(target_path)]
+            stdout, stderr, exit_code = target_node.exec_command(verify_cmd)
+            if exit_code:
+                raise RemoteRuntimeError(verify_cmd, target_host_name, exit_code, stdout, stderr)
+        except Exception:
+            try:
+                target_node.exec_command(["rm", "-f", quote(target_temp_path)])
+            except Exception:
+                pass 
+            raise 
+        
+        if source_host_name is None:
+            # The upload recorded the temporary path in the manifest, the file is now at the remote path. 
+            target_node._transfer_manifest.rename(target_host_name, target_temp_path, target_path)
+
+
+    def broadcast_file(
+        self,
+        local_path: str,
+        remote_path: str,
+        host_name_list: list = None,
+        max_parallel: int = 64
+    ) -> dict:
+        """Copy a local file to many nodes by uploading it once and letting nodes that have the file forward it 
+        to the others. In every round each node with the file, and the local machine, sends it to one node 
+        without it, so the number of rounds grows with the log of the number of nodes instead of the uplink of 
+        the local machine carrying a copy for every node. A node that fails to receive the file from another 
+        node gets it from the local machine in the next round, and a node that fails to send is not used to 
+        send again. 
+
+        Args:
+            local_path: Path of the local file. 
+            remote_path: Path of the file in the nodes. 
+            host_name_list: List of host names to copy the file to. Defaults to all live hosts. 
+            max_parallel: Maximum number of copies running at the same time. 
+        
+        Returns:
+            report_dict: Dictionary of host name to a dictionary with keys 'status' ('ok', 'skipped' if the node 
+                            already had the file or 'failed'), 'source' (host name of the sender or 'local'), 
+                            'round', 'latency_sec' and 'error'. 
+        """
+        if host_name_list is None:
+            host_name_list = self.get_all_live_host_names()
+        
+        file_hash = sha256()
+        with open(local_path, "rb") as local_handle:
+            for block in iter(lambda: local_handle.read(4*1024*1024), b""):
+                file_hash.update(block)
+        file_sha256 = file_hash.hexdigest()
+
+        start_time = time()
+        report_dict = {}
+        has_file_dict = self.gather(
+                            lambda node: not node.exec_command(
+                                            ["echo", quote("{}  {}".format(file_sha256, node.format_path(remote_path))), 
+                                                "|", "sha256sum", "-c", "--status"])[2], 
+                            host_name_list=host_name_list, 
+                            max_parallel=max_parallel)
+        sender_list, pending_list = [], []
+        for host_name in host_name_list:
+            if has_file_dict[host_name] is True:
+                sender_list.append(host_name)
+                report_dict[host_name] = {"status": "skipped", "source": None, "round": None, "latency_sec": 0.0, "error": ""}
+            else:
+                pending_list.append(host_name)
+        
+        failed_count_dict = {}
+        round_index = 0 
+        while pending_list:
+            # The local machine sends to the first pending node, which is where failed nodes are put back. 
+            send_list = [(None, pending_list.pop(0))]
+            for sender_host_name in sender_list[:max(0, max_parallel - 1)]:
+                if not pending_list:
+                    break 
+                send_list.append((sender_host_name, pending_list.pop(0)))
+            
+            with ThreadPoolExecutor(max_workers=len(send_list)) as executor:
+                future_list = [executor.submit(self._forward_file, source, target, local_path, remote_path, file_sha256) 
+                                for source, target in send_list]
+            
+            for (source_host_name, target_host_name), future in zip(send_list, future_list):
+                try:
+                    future.result()
+                    sender_list.append(target_host_name)
+                    report_dict[target_host_name] = {
+                        "status": "ok", 
+                        "source": source_host_name or "local", 
+                        "round": round_index, 
+                        "latency_sec": time() - start_time, 
+                        "error": ""
+                    }
+                except Exception as e:
+                    print("Failed to send {} from {} to {}, {}".format(local_path, source_host_name or "local", target_host_name, e))
+                    failed_count_dict[target_host_name] = failed_count_dict.get(target_host_name, 0) + 1
+                    if source_host_name is not None:
+                        sender_list.remove(source_host_name)
+                    
+                    if source_host_name is None or failed_count_dict[target_host_name] > 1:
+                        report_dict[target_host_name] = {
+                            "status": "failed", 
+                            "source": source_host_name or "local", 
+                            "round": round_index, 
+                            "latency_sec": time() - start_time, 
+                            "error": str(e)
+                        }
+                    else:
+                        pending_list.insert(0, target_host_name)
+            round_index += 1
+        return report_dict
+
+
+    def get_connect_report(self) -> dict:
+        """Get the report of connecting to the nodes. 
+
+        Returns:
+            connect_report: Dictionary of host name to a dictionary with keys 'name', 'live', 'latency_sec' 
+                            and 'error'. 
+        """
+        with self._nodes_lock:
+            node_list = list(self._nodes)
+        return {node.host: NodeConnector.get_node_report(node) for node in node_list if node._connect_attempted}
+
+
     def _init_nodes(self) -> None:
-        """Initiate SSH connection with all nodes in the configuration.
+        """Initiate SSH connection with all nodes in the configuration concurrently. The number of nodes 
+        connected at the same time is set by 'max_parallel_connect' in the configuration. If the FS is lazy, 
+        no node is connected until it is accessed. 
         """
+        node_spec_list = []
         for node_name in self._config["nodes"]:
             node_dict = self._config["nodes"][node_name]
             host_name = node_dict["host"]
@@ -180,4 +532,18 @@ class RemoteFS:
 
             cred_obj = self._config["creds"][cred_name]
             
-            self._nodes.append(Node(node_name, host_name, cred_obj, mount_list))
\ No newline at end of file
+            node_spec_list.append({
+                "name": node_name, 
+                "host": host_name, 
+                "cred": cred_obj, 
+                "mount_list": mount_list,
+                "peer_host": node_dict.get("peer_host")
+            })
+        
+        self._node_spec_list = node_spec_list
+        self._connector = NodeConnector(
+                            max_parallel=self._config.get("max_parallel_connect", 16),
+                            connect_timeout=self._config.get("connect_timeout", 30),
+                            facts_store=FactsStore.from_config(self._config))
+        if not self._lazy:
+            self._connect_all()
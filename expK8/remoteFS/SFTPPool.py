@@ -0,0 +1,145 @@
+from threading import Lock
+from contextlib import contextmanager
+
+from paramiko import SSHClient, SFTPClient
+
+
+class SFTPPool:
+    """SFTPPool keeps SFTP sessions to a remote node open so that they can be reused across transfers.
+
+    Attributes:
+        _ssh: SSHClient whose transport is used to open SFTP sessions.
+        _max_idle: Maximum number of idle SFTP sessions kept open.
+        _idle: List of idle SFTP sessions ready to be reused.
+        _transport: Transport on which the idle SFTP sessions were opened.
+        _lock: Lock to allow multiple threads to use the pool.
+    """
+    def __init__(
+            self,
+            ssh_client: SSHClient,
+            max_idle: int = 4
+    ) -> None:
+        self._ssh = ssh_client
+        self._max_idle = max_idle
+        self._idle = []
+        self._transport = None
+        self._lock = Lock()
+
+
+    def set_client(
+            self,
+            ssh_client: SSHClient
+    ) -> None:
+        """Replace the SSHClient used to open SFTP sessions and drop all sessions of the old client.
+
+        Args:
+            ssh_client: New SSHClient to open SFTP sessions with.
+        """
+        with self._lock:
+            self._ssh = ssh_client
+            self._close_idle()
+
+
+    def _is_healthy(
+            self,
+            sftp: SFTPClient
+    ) -> bool:
+        """Check if a SFTP session can still be used.
+
+        Args:
+            sftp: The SFTP session to check.
+
+        Returns:
+            healthy: Boolean indicating if the session and its transport are still open.
+        """
+        channel = sftp.get_channel()
+        if channel is None or channel.closed:
+            return False
+        transport = channel.get_transport()
+        return transport is not None and transport.is_active() and transport is self._transport
+
+
+    def _close_idle(self) -> None:
+        """Close all idle SFTP sessions. Caller must hold the lock."""
+        for sftp in self._idle:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        self._idle = []
+        self._transport = None
+
+
+    def acquire(self) -> SFTPClient:
+        """Get a healthy SFTP session, opening a new one if none is idle.
+
+        Returns:
+            sftp: SFTP session that is not being used by any other caller.
+        """
+        with self._lock:
+            transport = self._ssh.get_transport()
+            if transport is not self._transport:
+                # The transport was dropped or replaced, sessions on the old one are useless.
+                self._close_idle()
+                self._transport = transport
+
+            while self._idle:
+                sftp = self._idle.pop()
+                if self._is_healthy(sftp):
+                    return sftp
+                try:
+                    sftp.close()
+                except Exception:
+                    pass
+        return self._ssh.open_sftp()
+
+
+    def release(
+            self,
+            sftp: SFTPClient
+    ) -> None:
+        """Return a SFTP session to the pool.
+
+        Args:
+            sftp: The SFTP session acquired from this pool.
+        """
+        with self._lock:
+            if len(self._idle) < self._max_idle and self._is_healthy(sftp):
+                self._idle.append(sftp)
+                return
+        sftp.close()
+
+
+    def discard(
+            self,
+            sftp: SFTPClient
+    ) -> None:
+        """Close a SFTP session that failed instead of returning it to the pool.
+
+        Args:
+            sftp: The SFTP session acquired from this pool.
+        """
+        try:
+            sftp.close()
+        except Exception:
+            pass
+
+
+    @contextmanager
+    def session(self):
+        """Context manager that acquires a SFTP session and releases it on exit. A session that raised
+        an exception is discarded since its state is unknown."""
+        sftp = self.acquire()
+        try:
+            yield sftp
+        except Exception:
+            self.discard(sftp)
+            raise
+        else:
+            self.release(sftp)
+
+
+    def close(self) -> None:
+        """Close all idle SFTP sessions."""
+        with self._lock:
+            self._close_idle()
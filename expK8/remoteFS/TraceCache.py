@@ -0,0 +1,373 @@
+import hashlib
+from time import time
+from shlex import quote
+from pathlib import Path
+from threading import Lock
+
+from expK8.remoteFS.JsonFile import load_json, save_json
+from expK8.remoteFS.Node import Node
+from expK8.remoteFS.NodeException import RemoteRuntimeError
+from expK8.remoteFS.TransferManifest import ChunkedDigest
+from expK8.remoteFS.TransferScheduler import TransferScheduler, PRIORITY_STAGING
+
+
+DEFAULT_INDEX_PATH = "~/.expK8/trace_cache.json"
+UPLOAD_CHUNK_SIZE_BYTE = 16*1024*1024
+UPLOAD_SUFFIX = ".upload"
+
+
+class TraceCache:
+    """TraceCache stages files such as block traces in a content-addressed directory of each remote node, where a
+    file is stored under the SHA256 of its contents. A file is uploaded once per node no matter how many names it
+    is used under, and a file with the same size but different contents is never mistaken for a staged one. The
+    named path scripts expect is a symlink to the staged file.
+
+    A local index stores the SHA256 of local files, keyed by their size and modification time so that a file is
+    only hashed again when it changes, and the hashes each node holds with the time they were last staged. A hash
+    in the index is verified with a single stat of the staged file as staged files are only renamed into place
+    after the digest of the uploaded file, computed in the node, matched the local file. The stat also catches
+    staged files lost when a node reboots and clears its tmpfs.
+
+    The remote directory has no default as its file system decides where staged files live. A directory in
+    /dev/shm keeps them in memory, which is fast to replay from but takes memory from the node, so a size cap
+    should be set for it. Past the cap, files least recently staged are removed before uploading a new one,
+    along with uploads left behind by stages that failed.
+
+    Attributes:
+        remote_dir: Directory in remote nodes where files are staged.
+        index_path: Path of the local JSON index.
+        max_size_byte: Maximum total size of files staged in the remote directory of a node, None for no cap.
+        transfer_scheduler: TransferScheduler that uploads are queued in with staging priority, None to upload
+                                directly.
+        _uploading_set: Set of tuples (host name, SHA256) of files being uploaded by this TraceCache.
+        _lock: Lock to allow multiple threads to update the index.
+    """
+    def __init__(
+            self,
+            remote_dir: str,
+            index_path: str = DEFAULT_INDEX_PATH,
+            max_size_byte: int = None,
+            transfer_scheduler: TransferScheduler = None
+    ) -> None:
+        self.remote_dir = remote_dir
+        self.index_path = Path(index_path).expanduser()
+        self.max_size_byte = max_size_byte
+        self.transfer_scheduler = transfer_scheduler
+        self._uploading_set = set()
+        self._lock = Lock()
+
+
+    def _load(self) -> dict:
+        """Load the index from the file. Caller must hold the lock.
+
+        Returns:
+            index_dict: Dictionary with keys 'local', path of local file to its size, mtime, SHA256 and upload
+                            digest, and 'hosts', host name to a dictionary of hashes staged in the host to the time
+                            they were last staged.
+        """
+        index_dict = load_json(self.index_path)
+        if index_dict is None:
+            # A missing or corrupt index only costs hashing and verifying again, start over.
+            return {"local": {}, "hosts": {}}
+        # Older indexes stored a list of hashes per host without the time they were staged.
+        for host_name, host_entry in index_dict["hosts"].items():
+            if isinstance(host_entry, list):
+                index_dict["hosts"][host_name] = {sha256: 0 for sha256 in host_entry}
+        return index_dict
+
+
+    def _save(
+            self,
+            index_dict: dict
+    ) -> None:
+        """Write the index to the file atomically. Caller must hold the lock.
+
+        Args:
+            index_dict: Dictionary of the index.
+        """
+        save_json(self.index_path, index_dict)
+
+
+    def _get_local_entry(
+            self,
+            local_path: str
+    ) -> dict:
+        """Get the hashes of a local file, hashing it only if it changed since it was last hashed. The SHA256 that
+        names the staged file and the digest an upload computes are both taken in a single read of the file.
+
+        Args:
+            local_path: Path of the local file.
+
+        Returns:
+            local_entry: Dictionary with keys 'size', 'mtime', 'sha256' and 'digest', the digest of the file with
+                            the chunk size of uploads.
+        """
+        local_path = Path(local_path).expanduser().absolute()
+        local_stat = local_path.stat()
+        with self._lock:
+            local_entry = self._load()["local"].get(str(local_path))
+        if local_entry and "digest" in local_entry and local_entry["size"] == local_stat.st_size \
+                and local_entry["mtime"] == local_stat.st_mtime:
+            return local_entry
+
+        file_hash, chunked_digest = hashlib.sha256(), ChunkedDigest(UPLOAD_CHUNK_SIZE_BYTE)
+        with local_path.open("rb") as local_handle:
+            for block in iter(lambda: local_handle.read(4*1024*1024), b""):
+                file_hash.update(block)
+                chunked_digest.update(block)
+
+        local_entry = {
+            "size": local_stat.st_size,
+            "mtime": local_stat.st_mtime,
+            "sha256": file_hash.hexdigest(),
+            "digest": chunked_digest.hexdigest()
+        }
+        with self._lock:
+            index_dict = self._load()
+            index_dict["local"][str(local_path)] = local_entry
+            self._save(index_dict)
+        return local_entry
+
+
+    def get_local_hash(
+            self,
+            local_path: str
+    ) -> str:
+        """Get the SHA256 of a local file, hashing it only if it changed since it was last hashed.
+
+        Args:
+            local_path: Path of the local file.
+
+        Returns:
+            sha256: Hex digest of the SHA256 of the file.
+        """
+        return self._get_local_entry(local_path)["sha256"]
+
+
+    def get_host_hashes(
+            self,
+            host_name: str
+    ) -> list:
+        """Get the hashes of files the index records as staged in a host.
+
+        Args:
+            host_name: Host name of the remote node.
+
+        Returns:
+            hash_list: List of SHA256 of files staged in the host.
+        """
+        with self._lock:
+            return list(self._load()["hosts"].get(host_name, {}))
+
+
+    def _set_host_hash(
+            self,
+            host_name: str,
+            sha256: str,
+            staged: bool
+    ) -> None:
+        """Record whether a file is staged in a host.
+
+        Args:
+            host_name: Host name of the remote node.
+            sha256: SHA256 of the file.
+            staged: Boolean indicating if the file is staged in the host.
+        """
+        with self._lock:
+            index_dict = self._load()
+            host_entry = index_dict["hosts"].setdefault(host_name, {})
+            if staged:
+                host_entry[sha256] = time()
+            else:
+                host_entry.pop(sha256, None)
+            self._save(index_dict)
+
+
+    def _evict(
+            self,
+            node: Node,
+            remote_dir: str,
+            sha256: str,
+            size_byte: int
+    ) -> None:
+        """Remove uploads left behind by stages that failed and the files least recently staged in a node until a
+        file of the given size fits under the cap. Files not staged through this index are ordered by their
+        modification time.
+
+        Args:
+            node: Node where files are staged.
+            remote_dir: Remote directory of staged files, with '~' replaced.
+            sha256: SHA256 of the file about to be staged, which is never removed.
+            size_byte: Size of the file about to be staged.
+        """
+        blob_dict, upload_dict = {}, {}
+        for file_path, file_info in node.list_dir_tree(remote_dir).items():
+            file_name = Path(file_path).name
+            if len(file_name) == 64:
+                blob_dict[file_name] = file_info
+            elif len(file_name) == 64 + len(UPLOAD_SUFFIX) and file_name.endswith(UPLOAD_SUFFIX):
+                upload_dict[file_name[:64]] = file_info
+
+        # Uploads running in this process are left alone, the others were interrupted before being renamed.
+        with self._lock:
+            uploading_list = [blob_name for host_name, blob_name in self._uploading_set if host_name == node.host]
+        evict_list = [blob_name + UPLOAD_SUFFIX for blob_name in upload_dict if blob_name not in uploading_list]
+        total_byte = sum(blob_info["size"] for blob_name, blob_info in blob_dict.items() if blob_name != sha256) + size_byte
+        total_byte += sum(upload_info["size"] for blob_name, upload_info in upload_dict.items()
+                            if blob_name in uploading_list and blob_name != sha256)
+
+        evict_blob_list = []
+        if total_byte > self.max_size_byte:
+            with self._lock:
+                staged_time_dict = self._load()["hosts"].get(node.host, {})
+            for blob_name in sorted(blob_dict, key=lambda blob_name: staged_time_dict.get(blob_name, blob_dict[blob_name]["mtime"])):
+                if total_byte <= self.max_size_byte:
+                    break
+                if blob_name == sha256:
+                    continue
+                evict_blob_list.append(blob_name)
+                total_byte -= blob_dict[blob_name]["size"]
+        evict_list += evict_blob_list
+        if not evict_list:
+            return
+
+        rm_cmd = ["rm", "-f"] + [quote("{}/{}".format(remote_dir, file_name)) for file_name in evict_list]
+        stdout, stderr, exit_code = node.exec_command(rm_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(rm_cmd, node.host, exit_code, stdout, stderr)
+        for blob_name in evict_blob_list:
+            self._set_host_hash(node.host, blob_name, False)
+        print("{}: Evicted {} staged files and {} failed uploads from {} to stay under {} bytes.".format(
+                node.host, len(evict_blob_list), len(evict_list) - len(evict_blob_list), remote_dir, self.max_size_byte))
+
+
+    def _get_remote_hash(
+            self,
+            node: Node,
+            remote_path: str
+    ) -> str:
+        """Compute the SHA256 of a file in a remote node.
+
+        Args:
+            node: Node where the file is.
+            remote_path: Path of the file in remote node.
+
+        Returns:
+            sha256: Hex digest of the SHA256 of the file, None if it could not be computed.
+        """
+        stdout, stderr, exit_code = node.exec_command(["sha256sum", quote(remote_path)])
+        if exit_code or not stdout.strip():
+            return None
+        return stdout.split()[0]
+
+
+    def _upload(
+            self,
+            node: Node,
+            local_path: str,
+            local_entry: dict,
+            remote_dir: str,
+            remote_blob_path: str
+    ) -> None:
+        """Upload a local file to its staged path in a remote node.
+
+        Args:
+            node: Node where the file is staged.
+            local_path: Path of the local file.
+            local_entry: Dictionary of the size and hashes of the local file.
+            remote_dir: Remote directory of staged files, with '~' replaced.
+            remote_blob_path: Staged path of the file.
+
+        Raises:
+            RemoteRuntimeError: If the uploaded file does not match the local file or a remote command failed.
+        """
+        mkdir_cmd = ["mkdir", "-p", quote(remote_dir)]
+        stdout, stderr, exit_code = node.exec_command(mkdir_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(mkdir_cmd, node.host, exit_code, stdout, stderr)
+        if self.max_size_byte is not None:
+            self._evict(node, remote_dir, local_entry["sha256"], local_entry["size"])
+
+        # The upload goes through a temporary path so a file is only at the staged path once the digest of the
+        # file in the node matches the local file, which also catches the local file changing after it was hashed.
+        remote_temp_path = remote_blob_path + UPLOAD_SUFFIX
+        if self.transfer_scheduler is not None:
+            self.transfer_scheduler.submit(
+                node, 
+                "upload", 
+                local_path, 
+                remote_temp_path, 
+                priority=PRIORITY_STAGING, 
+                chunk_size_byte=UPLOAD_CHUNK_SIZE_BYTE).result()
+        else:
+            node.scp(local_path, remote_temp_path, chunk_size_byte=UPLOAD_CHUNK_SIZE_BYTE)
+        remote_digest = node.get_remote_digest(remote_temp_path, UPLOAD_CHUNK_SIZE_BYTE)
+        if remote_digest != local_entry["digest"]:
+            node.rm(remote_temp_path)
+            self._set_host_hash(node.host, local_entry["sha256"], False)
+            raise RemoteRuntimeError(
+                    ["scp", local_path, remote_temp_path], 
+                    node.host, 
+                    1, 
+                    remote_digest, 
+                    "Digest does not match {}".format(local_path))
+
+        mv_cmd = ["mv", quote(remote_temp_path), quote(remote_blob_path)]
+        stdout, stderr, exit_code = node.exec_command(mv_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(mv_cmd, node.host, exit_code, stdout, stderr)
+
+
+    def stage(
+            self,
+            node: Node,
+            local_path: str,
+            remote_link_path: str = None
+    ) -> str:
+        """Make sure that a local file is staged in a remote node, uploading it only if the node does not
+        already hold a file with the same contents.
+
+        Args:
+            node: Node where the file is staged.
+            local_path: Path of the local file.
+            remote_link_path: Path in remote node that is made a symlink to the staged file, such as the path of
+                                the trace that scripts expect.
+
+        Returns:
+            remote_path: The remote link path if one was given, else the path of the staged file.
+
+        Raises:
+            RemoteRuntimeError: If the uploaded file does not match the local file or the symlink failed.
+        """
+        local_entry = self._get_local_entry(local_path)
+        sha256, local_size = local_entry["sha256"], local_entry["size"]
+        remote_dir = node.format_path(self.remote_dir)
+        remote_blob_path = "{}/{}".format(remote_dir, sha256)
+
+        blob_info = node.stat_paths([remote_blob_path])[remote_blob_path]
+        staged = blob_info["type"] == "file" and blob_info["size"] == local_size
+        if staged and sha256 not in self.get_host_hashes(node.host):
+            # Not staged by this index, so it is verified once before it is trusted.
+            staged = self._get_remote_hash(node, remote_blob_path) == sha256
+
+        if staged:
+            print("{}: {} already staged as {}.".format(node.host, local_path, remote_blob_path))
+        else:
+            with self._lock:
+                self._uploading_set.add((node.host, sha256))
+            try:
+                self._upload(node, local_path, local_entry, remote_dir, remote_blob_path)
+            finally:
+                with self._lock:
+                    self._uploading_set.discard((node.host, sha256))
+            print("{}: Staged {} as {}.".format(node.host, local_path, remote_blob_path))
+        self._set_host_hash(node.host, sha256, True)
+
+        if remote_link_path is None:
+            return remote_blob_path
+
+        link_cmd = ["ln", "-sfn", quote(remote_blob_path), quote(remote_link_path)]
+        stdout, stderr, exit_code = node.exec_command(link_cmd)
+        if exit_code:
+            raise RemoteRuntimeError(link_cmd, node.host, exit_code, stdout, stderr)
+        return remote_link_path
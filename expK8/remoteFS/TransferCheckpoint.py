@@ -0,0 +1,122 @@
+from hashlib import sha1
+from pathlib import Path
+from threading import Lock
+
+from expK8.remoteFS.JsonFile import load_json, save_json
+
+
+DEFAULT_CHECKPOINT_DIR = "~/.expK8/transfer_checkpoints"
+
+
+class TransferCheckpoint:
+    """TransferCheckpoint records the chunks of a file transfer that have completed in a local JSON file along
+    with the CRC32 of each chunk, so that an interrupted transfer resumes from the chunks that were verified
+    instead of from byte 0. The checkpoint is only valid while the source file has the same size and modification
+    time and the transfer uses the same chunk size.
+
+    Attributes:
+        path: Path of the local JSON file storing the checkpoint.
+        _done_dict: Dictionary of offset of each completed chunk to its CRC32.
+        _source_dict: Dictionary with the size and modification time of the source file.
+        _lock: Lock to allow multiple transfer threads to update the checkpoint.
+    """
+    def __init__(
+            self,
+            path: str
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self._done_dict = {}
+        self._source_dict = {}
+        self._lock = Lock()
+
+
+    @staticmethod
+    def for_transfer(
+            checkpoint_dir: str,
+            direction: str,
+            host_name: str,
+            remote_path: str,
+            local_path: str
+    ):
+        """Create the checkpoint of a transfer between a local and remote path.
+
+        Args:
+            checkpoint_dir: Directory where checkpoints are stored.
+            direction: Direction of the transfer, 'upload' or 'download'.
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in the remote node.
+            local_path: Path of the local file.
+
+        Returns:
+            checkpoint: TransferCheckpoint of the transfer.
+        """
+        transfer_key = "|".join([direction, host_name, str(remote_path), str(Path(local_path).absolute())])
+        return TransferCheckpoint(Path(checkpoint_dir).expanduser().joinpath("{}.json".format(sha1(transfer_key.encode("utf-8")).hexdigest())))
+
+
+    def load(
+            self,
+            source_size_byte: int,
+            source_mtime: float,
+            chunk_size_byte: int
+    ) -> dict:
+        """Load the completed chunks if the checkpoint matches the current source file and chunk size.
+
+        Args:
+            source_size_byte: Current size of the source file.
+            source_mtime: Current modification time of the source file.
+            chunk_size_byte: Chunk size of the transfer.
+
+        Returns:
+            done_dict: Dictionary of offset of each completed chunk to its CRC32, empty if there is no valid checkpoint.
+        """
+        with self._lock:
+            self._source_dict = {"size": source_size_byte, "mtime": source_mtime, "chunk_size": chunk_size_byte}
+            self._done_dict = {}
+            checkpoint_dict = load_json(self.path)
+            if checkpoint_dict is None or checkpoint_dict.get("source") != self._source_dict:
+                return {}
+            self._done_dict = {int(offset): crc for offset, crc in checkpoint_dict["done"].items()}
+            return dict(self._done_dict)
+
+
+    def _save(self) -> None:
+        """Write the checkpoint to the file. Caller must hold the lock."""
+        save_json(self.path, {"source": self._source_dict, "done": self._done_dict}, indent=None)
+
+
+    def reset(
+            self,
+            done_dict: dict = None
+    ) -> None:
+        """Replace the completed chunks, for instance with the ones that passed verification.
+
+        Args:
+            done_dict: Dictionary of offset of each completed chunk to its CRC32.
+        """
+        with self._lock:
+            self._done_dict = dict(done_dict or {})
+            self._save()
+
+
+    def mark_done(
+            self,
+            offset: int,
+            crc: int
+    ) -> None:
+        """Record that a chunk has been transferred.
+
+        Args:
+            offset: Offset of the chunk.
+            crc: CRC32 of the data of the chunk.
+        """
+        with self._lock:
+            self._done_dict[offset] = crc
+            self._save()
+
+
+    def remove(self) -> None:
+        """Remove the checkpoint once the transfer is complete."""
+        with self._lock:
+            self._done_dict = {}
+            self.path.unlink(missing_ok=True)
@@ -0,0 +1,443 @@
+import os
+import hashlib
+from json import dumps, loads
+from time import time
+from pathlib import Path
+from threading import Lock, local, get_ident
+from contextlib import contextmanager
+
+from expK8.remoteFS.JsonFile import load_json, save_json
+
+
+DEFAULT_MANIFEST_PATH = "~/.expK8/transfer_manifest.json"
+JOURNAL_SUFFIX = ".journal"
+COMPACT_SUFFIX = ".compact"
+
+"""Chunks of a file are transferred concurrently and out of order, so a single SHA256 of the file cannot be
+computed while it streams. Instead, the digest of a file is the SHA256 of the concatenated SHA256 of each chunk,
+which each transfer thread computes on the data it already holds. The digest depends on the chunk size, which is
+stored along with it.
+"""
+# Prints the digest of the file given as the first argument with the chunk size given as the second argument.
+REMOTE_DIGEST_SCRIPT = """import sys, hashlib
+chunk_size, file_hash = int(sys.argv[2]), hashlib.sha256()
+with open(sys.argv[1], "rb") as handle:
+    for chunk in iter(lambda: handle.read(chunk_size), b""):
+        file_hash.update(hashlib.sha256(chunk).digest())
+print(file_hash.hexdigest())
+"""
+
+# Manifests of the same path in a process share a lock so that concurrent updates are not lost.
+_manifest_lock = Lock()
+
+
+def combine_chunk_digests(chunk_digest_list: list) -> str:
+    """Combine the SHA256 of each chunk of a file into the digest of the file.
+
+    Args:
+        chunk_digest_list: List of SHA256 digests, as bytes, of the chunks in order of offset.
+
+    Returns:
+        digest: Hex digest of the file.
+    """
+    file_hash = hashlib.sha256()
+    for chunk_digest in chunk_digest_list:
+        file_hash.update(chunk_digest)
+    return file_hash.hexdigest()
+
+
+class ChunkedDigest:
+    """ChunkedDigest computes the digest of a file from data that is streamed in order.
+
+    Attributes:
+        chunk_size_byte: Size of the chunks the digest is computed over.
+        _chunk_digest_list: List of SHA256 of completed chunks.
+        _chunk_hash: SHA256 of the current chunk.
+        _chunk_byte: Number of bytes in the current chunk.
+    """
+    def __init__(
+            self,
+            chunk_size_byte: int
+    ) -> None:
+        self.chunk_size_byte = chunk_size_byte
+        self._chunk_digest_list = []
+        self._chunk_hash = hashlib.sha256()
+        self._chunk_byte = 0
+
+
+    def update(
+            self,
+            data: bytes
+    ) -> None:
+        while data:
+            data_size = min(len(data), self.chunk_size_byte - self._chunk_byte)
+            self._chunk_hash.update(data[:data_size])
+            self._chunk_byte += data_size
+            data = data[data_size:]
+            if self._chunk_byte == self.chunk_size_byte:
+                self._chunk_digest_list.append(self._chunk_hash.digest())
+                self._chunk_hash = hashlib.sha256()
+                self._chunk_byte = 0
+
+
+    def hexdigest(self) -> str:
+        chunk_digest_list = list(self._chunk_digest_list)
+        if self._chunk_byte:
+            chunk_digest_list.append(self._chunk_hash.digest())
+        return combine_chunk_digests(chunk_digest_list)
+
+
+class TransferManifest:
+    """TransferManifest records in local files the digest of each file transferred to or from a remote node along
+    with the size and modification time of the local file and the modification time of the remote file. Checking
+    if a remote copy is still current is then a lookup and a stat of each file, with no hashing.
+
+    The manifest is a JSON snapshot and a journal next to it with one JSON line per change. A change appends a line
+    to the journal instead of rewriting the snapshot, and the journal is folded into the snapshot once it has more
+    lines than the snapshot has entries. Changes made inside batch() are appended together when the batch ends.
+    A batch only holds back changes of the threads that run in it, so transfers of other threads are recorded
+    as they complete.
+
+    Attributes:
+        path: Path of the local JSON file storing the snapshot of the manifest.
+        journal_path: Path of the local file storing the changes made after the snapshot.
+        max_journal_entries: Number of lines the journal can have before it is folded into the snapshot, if the
+                                snapshot has fewer entries.
+        _entry_dict: Dictionary of transfer key to its entry, as last read from the files.
+        _file_id: Tuple (inode, modification time) of the snapshot when it was last read.
+        _journal_id: Inode of the journal when it was last read.
+        _journal_offset: Offset up to which the journal has been read.
+        _journal_entries: Number of lines in the journal up to its offset.
+        _thread_state: Thread local state with the batch, if any, the thread runs in.
+        _batch_list: List of open batches, each a dictionary with the keys 'depth', the number of times it was
+                        entered, and 'pending', a dictionary of transfer key to its entry, or None if it was
+                        removed, of changes not yet written.
+    """
+    def __init__(
+            self,
+            path: str = DEFAULT_MANIFEST_PATH,
+            max_journal_entries: int = 1000
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.journal_path = self.path.with_name("{}{}".format(self.path.name, JOURNAL_SUFFIX))
+        self.max_journal_entries = max_journal_entries
+        self._entry_dict = {}
+        self._file_id = None
+        self._journal_id = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._thread_state = local()
+        self._batch_list = []
+
+
+    @staticmethod
+    def _get_key(
+            host_name: str,
+            remote_path: str
+    ) -> str:
+        return "{}:{}".format(host_name, remote_path)
+
+
+    @staticmethod
+    def _get_file_id(path: Path) -> tuple:
+        try:
+            path_stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return path_stat.st_ino, path_stat.st_mtime_ns
+
+
+    def _read_journal(
+            self,
+            journal_path: Path
+    ) -> bool:
+        """Apply the lines of a journal after the offset read so far. Caller must hold the lock.
+
+        Args:
+            journal_path: Path of the journal.
+
+        Returns:
+            changed: Boolean indicating if any line was read.
+        """
+        try:
+            with journal_path.open("rb") as journal_handle:
+                journal_handle.seek(self._journal_offset)
+                data = journal_handle.read()
+        except FileNotFoundError:
+            return False
+        # A line that is still being appended is read once it is complete.
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            try:
+                key, entry = loads(line)
+            except ValueError:
+                # A corrupt line only costs transferring a file again.
+                continue
+            if entry is None:
+                self._entry_dict.pop(key, None)
+            else:
+                self._entry_dict[key] = entry
+            self._journal_entries += 1
+        self._journal_offset += len(data)
+        return len(data) > 0
+
+
+    def _load(self) -> dict:
+        """Load the manifest, reading the snapshot only if it changed since it was last read and the lines appended
+        to the journal since. Caller must hold the lock.
+
+        Returns:
+            entry_dict: Dictionary of transfer key to its entry.
+        """
+        file_id = self._get_file_id(self.path)
+        journal_id = self._get_file_id(self.journal_path)
+        journal_id = journal_id[0] if journal_id is not None else None
+        changed = False
+        if file_id != self._file_id or journal_id != self._journal_id:
+            # A corrupt or missing snapshot only costs transferring files again.
+            self._entry_dict = load_json(self.path) or {}
+            self._file_id = file_id
+            self._journal_id = journal_id
+            self._journal_offset = 0
+            self._journal_entries = 0
+            changed = True
+        if self._read_journal(self.journal_path) or changed:
+            # Changes made in a batch are kept over what was written in the meantime.
+            for batch in self._batch_list:
+                for key, entry in batch["pending"].items():
+                    if entry is None:
+                        self._entry_dict.pop(key, None)
+                    else:
+                        self._entry_dict[key] = entry
+        return self._entry_dict
+
+
+    def _append(
+            self,
+            change_dict: dict
+    ) -> None:
+        """Append changes to the journal in a single write and fold the journal into the snapshot if it grew too
+        long. Caller must hold the lock.
+
+        Args:
+            change_dict: Dictionary of transfer key to its entry, or None if it was removed.
+        """
+        self.journal_path.parent.mkdir(exist_ok=True, parents=True)
+        data = "".join(dumps([key, entry]) + "\n" for key, entry in change_dict.items()).encode("utf-8")
+        journal_fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # A line left incomplete by a process that died while appending is ended so that it does not corrupt
+            # the lines appended after it.
+            journal_size = os.fstat(journal_fd).st_size
+            if journal_size and os.pread(journal_fd, 1, journal_size - 1) != b"\n":
+                data = b"\n" + data
+            os.write(journal_fd, data)
+        finally:
+            os.close(journal_fd)
+        self._load()
+        if self._journal_entries > max(self.max_journal_entries, len(self._entry_dict)):
+            self._compact()
+
+
+    def _compact(self) -> None:
+        """Fold the journal into the snapshot. The journal is first moved aside, so that lines other processes
+        append meanwhile go to a new journal instead of being lost. Caller must hold the lock.
+        """
+        compact_path = self.journal_path.with_name("{}.{}.{}{}".format(self.journal_path.name, os.getpid(), get_ident(), COMPACT_SUFFIX))
+        try:
+            os.replace(self.journal_path, compact_path)
+        except FileNotFoundError:
+            # Another process compacted the journal.
+            return
+        if self._get_file_id(compact_path)[0] != self._journal_id:
+            # The journal was replaced since it was last read, read it whole over the snapshot.
+            self._entry_dict = load_json(self.path) or {}
+            self._journal_offset = 0
+        self._read_journal(compact_path)
+        save_json(self.path, self._entry_dict)
+        os.remove(compact_path)
+        self._file_id = self._get_file_id(self.path)
+        self._journal_id = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+
+    def _update(
+            self,
+            key: str,
+            entry: dict
+    ) -> None:
+        """Set or, if the entry is None, remove the entry of a key and write the change unless the calling thread
+        runs in a batch. Caller must hold the lock.
+
+        Args:
+            key: Transfer key.
+            entry: New entry of the key, None to remove it.
+        """
+        entry_dict = self._load()
+        batch = getattr(self._thread_state, "batch", None)
+        if entry is None:
+            if entry_dict.pop(key, None) is None and (batch is None or key not in batch["pending"]):
+                return
+        else:
+            entry_dict[key] = entry
+        if batch is not None:
+            batch["pending"][key] = entry
+        else:
+            self._append({key: entry})
+
+
+    @contextmanager
+    def batch(
+            self,
+            shared_batch: dict = None
+    ):
+        """Context in which changes to the manifest made by the calling thread are written once when the batch
+        ends. Threads that work for the thread that opened a batch can run in the same batch by passing it, then
+        the changes are written when the last thread leaves the batch.
+
+        Args:
+            shared_batch: Batch yielded by batch() in another thread to run in, None to run in the batch the
+                            calling thread already runs in or in a new batch.
+
+        Yields:
+            batch: The batch the calling thread runs in.
+        """
+        with _manifest_lock:
+            previous_batch = getattr(self._thread_state, "batch", None)
+            batch = shared_batch or previous_batch
+            if batch is None:
+                batch = {"depth": 0, "pending": {}}
+                self._batch_list.append(batch)
+            batch["depth"] += 1
+            self._thread_state.batch = batch
+        try:
+            yield batch
+        finally:
+            with _manifest_lock:
+                self._thread_state.batch = previous_batch
+                batch["depth"] -= 1
+                if not batch["depth"]:
+                    self._batch_list.remove(batch)
+                    if batch["pending"]:
+                        self._append(batch["pending"])
+
+
+    def lookup(
+            self,
+            host_name: str,
+            remote_path: str
+    ) -> dict:
+        """Get the entry of the last transfer of a remote path.
+
+        Args:
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in remote node.
+
+        Returns:
+            entry: Dictionary with keys 'direction', 'local_path', 'size_byte', 'local_mtime', 'remote_mtime',
+                    'digest', 'chunk_size_byte', 'remote_verified' and 'time', None if there is no entry.
+        """
+        with _manifest_lock:
+            entry = self._load().get(self._get_key(host_name, remote_path))
+            return dict(entry) if entry else None
+
+
+    def record(
+            self,
+            host_name: str,
+            remote_path: str,
+            local_path: str,
+            direction: str,
+            remote_mtime: int,
+            digest: str,
+            chunk_size_byte: int,
+            remote_verified: bool
+    ) -> None:
+        """Record a completed transfer.
+
+        Args:
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in remote node.
+            local_path: Path of the local file.
+            direction: Direction of the transfer, 'upload' or 'download'.
+            remote_mtime: Modification time of the remote file after the transfer.
+            digest: Digest of the file computed during the transfer.
+            chunk_size_byte: Chunk size the digest was computed with.
+            remote_verified: Boolean indicating if the digest of the remote file was checked to match.
+        """
+        local_path = Path(local_path).expanduser().absolute()
+        local_stat = local_path.stat()
+        with _manifest_lock:
+            self._update(self._get_key(host_name, remote_path), {
+                "direction": direction,
+                "local_path": str(local_path),
+                "size_byte": local_stat.st_size,
+                "local_mtime": local_stat.st_mtime,
+                "remote_mtime": remote_mtime,
+                "digest": digest,
+                "chunk_size_byte": chunk_size_byte,
+                "remote_verified": remote_verified,
+                "time": time()
+            })
+
+
+    def remove(
+            self,
+            host_name: str,
+            remote_path: str
+    ) -> None:
+        """Remove the entry of a remote path.
+
+        Args:
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in remote node.
+        """
+        with _manifest_lock:
+            self._update(self._get_key(host_name, remote_path), None)
+
+
+    def rename(
+            self,
+            host_name: str,
+            remote_path: str,
+            new_remote_path: str
+    ) -> None:
+        """Move the entry of a remote path to the path the file was renamed to in the remote node.
+
+        Args:
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in remote node when it was transferred.
+            new_remote_path: Path the file was renamed to.
+        """
+        with _manifest_lock:
+            entry = self._load().get(self._get_key(host_name, remote_path))
+            if entry is None:
+                return
+            self._update(self._get_key(host_name, new_remote_path), entry)
+            self._update(self._get_key(host_name, remote_path), None)
+
+
+    def is_current(
+            self,
+            host_name: str,
+            remote_path: str,
+            local_path: str
+    ) -> bool:
+        """Check if the last transfer of a remote path was of the local file as it is now.
+
+        Args:
+            host_name: Host name of the remote node.
+            remote_path: Path of the file in remote node.
+            local_path: Path of the local file.
+
+        Returns:
+            current: Boolean indicating if the manifest has an entry of the local file with its current size and
+                        modification time.
+        """
+        entry = self.lookup(host_name, remote_path)
+        local_path = Path(local_path).expanduser().absolute()
+        if entry is None or entry["local_path"] != str(local_path) or not local_path.exists():
+            return False
+        local_stat = local_path.stat()
+        return entry["size_byte"] == local_stat.st_size and entry["local_mtime"] == local_stat.st_mtime
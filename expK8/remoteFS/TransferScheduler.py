@@ -0,0 +1,275 @@
+from time import time, sleep
+from collections import deque
+from threading import Lock, local
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from expK8.remoteFS.Node import Node
+
+
+PRIORITY_STAGING = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_ARCHIVE = 10
+THROUGHPUT_WINDOW_SEC = 10
+
+
+class _TokenBucket:
+    """Token bucket limiting the rate at which bytes are transferred. A transfer that takes more tokens than
+    are available goes into debt and sleeps until the debt is paid, so the long run rate never exceeds the limit
+    while a single large piece is never blocked forever.
+    """
+    def __init__(
+            self,
+            rate_byte_per_sec: float
+    ) -> None:
+        self.rate_byte_per_sec = rate_byte_per_sec
+        self._tokens = rate_byte_per_sec
+        self._last_time = time()
+        self._lock = Lock()
+
+
+    def consume(
+            self,
+            num_bytes: int
+    ) -> None:
+        with self._lock:
+            cur_time = time()
+            self._tokens = min(self.rate_byte_per_sec, self._tokens + (cur_time - self._last_time) * self.rate_byte_per_sec)
+            self._last_time = cur_time
+            self._tokens -= num_bytes
+            wait_sec = -self._tokens/self.rate_byte_per_sec if self._tokens < 0 else 0
+        # Sleep outside the lock so other transfers can take their share of the debt.
+        if wait_sec > 0:
+            sleep(wait_sec)
+
+
+class TransferScheduler:
+    """TransferScheduler queues file transfers between the local machine and remote nodes and runs them within a
+    global limit on concurrent transfers, a limit per host and an optional cap on the total bandwidth. Queued
+    transfers start in order of priority, lower values first, and in order of submission within a priority, so
+    staging a trace for an idle node goes ahead of archiving outputs. A transfer whose host is at its limit does
+    not hold back transfers to other hosts.
+
+    A transfer submitted from a thread running a transfer of the same scheduler, for instance by a progress
+    callback that stages a file with TraceCache.stage, runs inline in that thread and its future is already done
+    when submit returns. Queuing it could deadlock, as the job waiting on it holds a worker the queued transfer
+    needs. It counts towards the stats and the bandwidth cap but not the concurrency limits, as it uses the slot
+    of the job that submitted it.
+
+    Attributes:
+        max_concurrent: Maximum number of transfers running at the same time.
+        max_per_host: Maximum number of transfers running at the same time with a single host.
+        bandwidth_limit_mb_per_sec: Cap on the total bandwidth of all transfers, None for no cap.
+        _queue: List of queued jobs sorted by priority and submission.
+        _running_dict: Dictionary of host name to number of running transfers.
+        _stat_dict: Dictionary of counters of completed and failed transfers and bytes transferred.
+        _sample_deque: Deque of (time, bytes) of recent progress used to compute throughput.
+        _bucket: Token bucket enforcing the bandwidth cap, None for no cap.
+        _executor: Pool of threads running the transfers.
+        _lock: Lock protecting the queue and counters.
+        _worker_state: Thread local state whose 'in_job' is True in threads running a transfer of this scheduler
+                        or its progress callback.
+    """
+    def __init__(
+            self,
+            max_concurrent: int = 8,
+            max_per_host: int = 2,
+            bandwidth_limit_mb_per_sec: float = None
+    ) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_host = max(1, max_per_host)
+        self.bandwidth_limit_mb_per_sec = bandwidth_limit_mb_per_sec
+        self._queue = []
+        self._seq = 0
+        self._running_dict = {}
+        self._stat_dict = {"completed": 0, "failed": 0, "transferred_byte": 0}
+        self._sample_deque = deque()
+        self._start_time = time()
+        self._bucket = _TokenBucket(bandwidth_limit_mb_per_sec * 1024**2) if bandwidth_limit_mb_per_sec else None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        self._lock = Lock()
+        self._worker_state = local()
+
+
+    def submit(
+            self,
+            node: Node,
+            direction: str,
+            source_path: str,
+            target_path: str,
+            priority: int = PRIORITY_DEFAULT,
+            **transfer_kwargs
+    ) -> Future:
+        """Queue a transfer.
+
+        Args:
+            node: Node to transfer the file to or from.
+            direction: 'upload' to transfer a local file with Node.scp or 'download' to transfer a remote file
+                        with Node.download.
+            source_path: Local path of file to upload or path of file in remote node to download.
+            target_path: Target path in remote node or local target path.
+            priority: Priority of the transfer, lower values start first.
+            transfer_kwargs: Keyword arguments passed to Node.scp or Node.download.
+
+        Returns:
+            future: Future that resolves to the report of the transfer or raises its exception.
+
+        Raises:
+            ValueError: If the direction is not 'upload' or 'download'.
+        """
+        if direction == "upload":
+            transfer_fn = node.scp
+        elif direction == "download":
+            transfer_fn = node.download
+        else:
+            raise ValueError("Unknown transfer direction {}.".format(direction))
+
+        future = Future()
+        if getattr(self._worker_state, "in_job", False):
+            future.set_running_or_notify_cancel()
+            self._transfer(transfer_fn, source_path, target_path, transfer_kwargs, future)
+            return future
+
+        with self._lock:
+            self._queue.append((priority, self._seq, node.host, transfer_fn, source_path, target_path, transfer_kwargs, future))
+            self._seq += 1
+            self._queue.sort(key=lambda job: job[:2])
+            self._dispatch()
+        return future
+
+
+    def _dispatch(self) -> None:
+        """Start queued jobs in order while there is capacity. Caller must hold the lock."""
+        job_index = 0
+        while job_index < len(self._queue) and sum(self._running_dict.values()) < self.max_concurrent:
+            host_name = self._queue[job_index][2]
+            if self._running_dict.get(host_name, 0) >= self.max_per_host:
+                job_index += 1
+                continue
+            job = self._queue.pop(job_index)
+            self._running_dict[host_name] = self._running_dict.get(host_name, 0) + 1
+            self._executor.submit(self._run_job, job)
+
+
+    def _on_progress(
+            self,
+            num_bytes: int
+    ) -> None:
+        """Count bytes transferred and throttle the transfer if there is a bandwidth cap.
+
+        Args:
+            num_bytes: Number of bytes transferred.
+        """
+        with self._lock:
+            cur_time = time()
+            self._stat_dict["transferred_byte"] += num_bytes
+            self._sample_deque.append((cur_time, num_bytes))
+            while self._sample_deque and self._sample_deque[0][0] < cur_time - THROUGHPUT_WINDOW_SEC:
+                self._sample_deque.popleft()
+        if self._bucket is not None:
+            self._bucket.consume(num_bytes)
+
+
+    def _transfer(
+            self,
+            transfer_fn,
+            source_path: str,
+            target_path: str,
+            transfer_kwargs: dict,
+            future: Future
+    ) -> None:
+        """Run a transfer, counting its progress and outcome, and resolve its future.
+
+        Args:
+            transfer_fn: Node.scp or Node.download of the node.
+            source_path: Source path of the transfer.
+            target_path: Target path of the transfer.
+            transfer_kwargs: Keyword arguments of the transfer function.
+            future: Future of the transfer, already marked as running.
+        """
+        user_callback = transfer_kwargs.pop("progress_callback", None)
+        def progress_callback(num_bytes):
+            self._on_progress(num_bytes)
+            if user_callback is not None:
+                # The callback runs in threads of the transfer, which are part of the job as well.
+                in_job = getattr(self._worker_state, "in_job", False)
+                self._worker_state.in_job = True
+                try:
+                    user_callback(num_bytes)
+                finally:
+                    self._worker_state.in_job = in_job
+
+        report, error = None, None
+        try:
+            report = transfer_fn(source_path, target_path, progress_callback=progress_callback, **transfer_kwargs)
+        except Exception as e:
+            error = e
+        with self._lock:
+            self._stat_dict["failed" if error else "completed"] += 1
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(report)
+
+
+    def _run_job(
+            self,
+            job: tuple
+    ) -> None:
+        """Run a transfer and start the next queued job once it is done.
+
+        Args:
+            job: Tuple of priority, sequence number, host name, transfer function, source and target path,
+                    keyword arguments and future of the transfer.
+        """
+        _, _, host_name, transfer_fn, source_path, target_path, transfer_kwargs, future = job
+        if future.set_running_or_notify_cancel():
+            self._worker_state.in_job = True
+            try:
+                self._transfer(transfer_fn, source_path, target_path, transfer_kwargs, future)
+            finally:
+                self._worker_state.in_job = False
+
+        with self._lock:
+            self._running_dict[host_name] -= 1
+            if not self._running_dict[host_name]:
+                self._running_dict.pop(host_name)
+            self._dispatch()
+
+
+    def get_stats(self) -> dict:
+        """Get the state of the queue and the throughput achieved.
+
+        Returns:
+            stat_dict: Dictionary with keys 'queued', 'running', 'running_per_host', 'completed', 'failed',
+                        'transferred_byte' and 'throughput_mb_per_sec', the throughput over the last seconds.
+        """
+        with self._lock:
+            cur_time = time()
+            window_byte = sum(num_bytes for sample_time, num_bytes in self._sample_deque
+                                if sample_time >= cur_time - THROUGHPUT_WINDOW_SEC)
+            window_sec = max(1.0, min(THROUGHPUT_WINDOW_SEC, cur_time - self._start_time))
+            return {
+                "queued": len(self._queue),
+                "running": sum(self._running_dict.values()),
+                "running_per_host": dict(self._running_dict),
+                "completed": self._stat_dict["completed"],
+                "failed": self._stat_dict["failed"],
+                "transferred_byte": self._stat_dict["transferred_byte"],
+                "throughput_mb_per_sec": window_byte/(1024**2)/window_sec
+            }
+
+
+    def shutdown(
+            self,
+            wait: bool = True
+    ) -> None:
+        """Stop the scheduler. Queued transfers that have not started are cancelled.
+
+        Args:
+            wait: If True, wait for running transfers to complete.
+        """
+        with self._lock:
+            queue, self._queue = self._queue, []
+        for job in queue:
+            job[-1].cancel()
+        self._executor.shutdown(wait=wait)
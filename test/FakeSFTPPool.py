@@ -0,0 +1,79 @@
+"""FakeSFTPPool serves reads of local files in place of SFTP sessions of a remote node, so that transfers can be
+tested without a node. The "remote" paths are local paths and every byte range read is recorded.
+"""
+
+import os
+from threading import Lock
+from contextlib import contextmanager
+
+
+class FakeRemoteHandle:
+    def __init__(
+            self,
+            path: str,
+            read_list: list,
+            lock: Lock
+    ) -> None:
+        self._handle = open(path, "rb")
+        self._read_list = read_list
+        self._lock = lock
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self._handle.close()
+
+
+    def readv(
+            self,
+            chunk_list: list,
+            max_concurrent_prefetch_requests: int = None
+    ):
+        for offset, size in chunk_list:
+            with self._lock:
+                self._read_list.append((offset, size))
+            self._handle.seek(offset)
+            yield self._handle.read(size)
+
+
+class FakeSFTP:
+    def __init__(
+            self,
+            pool
+    ) -> None:
+        self._pool = pool
+
+
+    def stat(
+            self,
+            path: str
+    ):
+        return os.stat(path)
+
+
+    def open(
+            self,
+            path: str,
+            mode: str = "rb"
+    ) -> FakeRemoteHandle:
+        return FakeRemoteHandle(path, self._pool.read_list, self._pool.lock)
+
+
+class FakeSFTPPool:
+    """Pool of fake SFTP sessions.
+
+    Attributes:
+        read_list: List of tuples (offset, size) of every byte range read.
+        lock: Lock protecting the list of reads.
+    """
+    def __init__(self) -> None:
+        self.read_list = []
+        self.lock = Lock()
+
+
+    @contextmanager
+    def session(self):
+        yield FakeSFTP(self)
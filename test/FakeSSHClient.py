@@ -0,0 +1,187 @@
+"""FakeSSHClient stands in for a paramiko SSHClient connected to a remote node, so that code opening channels and
+SFTP sessions can be tested without a node. Commands run on a FakeTransport complete after a set duration with a
+set output, and the transport records how many channels are open at the same time.
+"""
+
+from time import time
+from socket import socketpair
+from threading import Event, Lock
+
+
+class FakeChannel:
+    def __init__(
+            self,
+            transport
+    ) -> None:
+        self.closed = False
+        self.eof_received = False
+        self.status_event = Event()
+        self._transport = transport
+        self._start_time = None
+        self._stdout_bytes = b""
+        self._stderr_bytes = b""
+        self._exit_code = None
+        self._duration_sec = 0
+        self._socket_pair = None
+
+
+    def fileno(self) -> int:
+        # Select waits on a socket that never becomes readable, so the executor falls back to polling.
+        if self._socket_pair is None:
+            self._socket_pair = socketpair()
+        return self._socket_pair[0].fileno()
+
+
+    def get_transport(self):
+        return self._transport
+
+
+    def settimeout(self, timeout) -> None:
+        pass
+
+
+    def set_combine_stderr(self, combine_stderr) -> None:
+        pass
+
+
+    def exec_command(
+            self,
+            command_str: str
+    ) -> None:
+        stdout_bytes, stderr_bytes, exit_code, duration_sec = self._transport.command_dict[command_str]
+        self._stdout_bytes, self._stderr_bytes = stdout_bytes, stderr_bytes
+        self._exit_code, self._duration_sec = exit_code, duration_sec
+        self._start_time = time()
+
+
+    def _is_done(self) -> bool:
+        return self._start_time is not None and time() - self._start_time >= self._duration_sec
+
+
+    def send_ready(self) -> bool:
+        return False
+
+
+    def recv_ready(self) -> bool:
+        return not self.closed and self._is_done() and len(self._stdout_bytes) > 0
+
+
+    def recv_stderr_ready(self) -> bool:
+        return not self.closed and self._is_done() and len(self._stderr_bytes) > 0
+
+
+    def exit_status_ready(self) -> bool:
+        # Like paramiko, a closed channel reports its exit status as ready.
+        return self.closed or self._is_done()
+
+
+    def recv(self, size: int) -> bytes:
+        data, self._stdout_bytes = self._stdout_bytes[:size], self._stdout_bytes[size:]
+        return data
+
+
+    def recv_stderr(self, size: int) -> bytes:
+        data, self._stderr_bytes = self._stderr_bytes[:size], self._stderr_bytes[size:]
+        return data
+
+
+    def recv_exit_status(self) -> int:
+        return self._exit_code
+
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._transport.channel_closed(self, self.exit_status_ready())
+        self.closed = True
+        if self._socket_pair is not None:
+            for pair_socket in self._socket_pair:
+                pair_socket.close()
+
+
+class FakeTransport:
+    """Transport whose channels run commands from a dictionary.
+
+    Attributes:
+        command_dict: Dictionary of command to the tuple (stdout bytes, stderr bytes, exit code, duration in seconds).
+        active: Boolean indicating if the transport is connected.
+        open_count: Number of channels currently open.
+        max_open_count: Maximum number of channels that were open at the same time.
+        killed_list: List of channels closed before their command exited.
+    """
+    def __init__(
+            self,
+            command_dict: dict = None
+    ) -> None:
+        self.command_dict = command_dict if command_dict is not None else {}
+        self.active = True
+        self.open_count = 0
+        self.max_open_count = 0
+        self.killed_list = []
+        self._lock = Lock()
+
+
+    def is_active(self) -> bool:
+        return self.active
+
+
+    def open_session(self, timeout=None) -> FakeChannel:
+        if not self.active:
+            raise EOFError("Transport is closed.")
+        with self._lock:
+            self.open_count += 1
+            self.max_open_count = max(self.max_open_count, self.open_count)
+        return FakeChannel(self)
+
+
+    def channel_closed(
+            self,
+            channel: FakeChannel,
+            exited: bool
+    ) -> None:
+        with self._lock:
+            self.open_count -= 1
+            if not exited:
+                self.killed_list.append(channel)
+
+
+class FakeSFTPClient:
+    def __init__(
+            self,
+            transport: FakeTransport
+    ) -> None:
+        self.closed = False
+        self._channel = FakeChannel(transport)
+
+
+    def get_channel(self) -> FakeChannel:
+        return None if self.closed else self._channel
+
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeSSHClient:
+    """SSHClient connected through a FakeTransport.
+
+    Attributes:
+        transport: The transport of the client, None if the client is not connected.
+        sftp_list: List of every SFTP session opened.
+    """
+    def __init__(
+            self,
+            transport: FakeTransport = None
+    ) -> None:
+        self.transport = transport if transport is not None else FakeTransport()
+        self.sftp_list = []
+
+
+    def get_transport(self) -> FakeTransport:
+        return self.transport
+
+
+    def open_sftp(self) -> FakeSFTPClient:
+        sftp = FakeSFTPClient(self.transport)
+        self.sftp_list.append(sftp)
+        return sftp
@@ -0,0 +1,141 @@
+"""These tests check that RemoteFS.broadcast_file uploads a file once and lets nodes that have it forward it to the
+others. The nodes are replaced by objects whose file system is a local directory per node, and a copy between nodes
+is a copy between those directories, so no node is needed.
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import unittest
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.RemoteFS import RemoteFS
+from expK8.remoteFS.TransferManifest import TransferManifest
+
+
+class FakeNode:
+    """Node whose remote file system is a local directory. """
+    def __init__(
+            self,
+            host_name: str,
+            root_dir: str,
+            node_dict: dict,
+            manifest_path: str
+    ) -> None:
+        self.host = host_name
+        self.root_dir = root_dir
+        self.fail_send = False
+        self.fail_receive = False
+        self._node_dict = node_dict
+        self._transfer_manifest = TransferManifest(manifest_path)
+        os.makedirs(root_dir)
+
+
+    def format_path(self, path_str):
+        return os.path.join(self.root_dir, path_str.lstrip("/"))
+
+
+    def exec_command(self, command_str_arr, timeout=None):
+        if command_str_arr[0] == "scp":
+            # Copy to the directory of the node whose peer address is the target of the copy.
+            source_path = shlex.split(command_str_arr[-2])[0]
+            peer_address, target_path = shlex.split(command_str_arr[-1])[0].split(":", 1)
+            target_node = self._node_dict[peer_address.split("@")[1]]
+            if self.fail_send or target_node.fail_receive:
+                return "", "lost connection", 1
+            shutil.copy(source_path, target_path)
+            return "", "", 0
+        process = subprocess.run(" ".join(command_str_arr), shell=True, capture_output=True, text=True)
+        return process.stdout, process.stderr, process.returncode
+
+
+    def scp(self, local_path, remote_path, **kwargs):
+        if self.fail_receive:
+            with open(remote_path, "wb") as remote_handle:
+                remote_handle.write(b"partial")
+            raise IOError("Upload failed.")
+        shutil.copy(local_path, remote_path)
+        self._transfer_manifest.record(self.host, remote_path, local_path, "upload", os.path.getmtime(remote_path), "digest", 1024, False)
+        return {"size_byte": os.path.getsize(remote_path)}
+
+
+class TestBroadcastFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.local_path = os.path.join(self.temp_dir.name, "trace.csv")
+        with open(self.local_path, "wb") as local_handle:
+            local_handle.write(os.urandom(10000))
+        self.manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+
+        self.host_name_list = ["node{}".format(index) for index in range(6)]
+        config = {
+            "nodes": {host_name: {"host": host_name, "cred": "cred"} for host_name in self.host_name_list},
+            "creds": {"cred": {"type": "env", "user": "user", "val": "PW"}}
+        }
+        self.remote_fs = RemoteFS(config, lazy=True)
+        self.node_dict = {}
+        for host_name in self.host_name_list:
+            self.node_dict[host_name] = FakeNode(host_name, os.path.join(self.temp_dir.name, host_name), self.node_dict, self.manifest_path)
+        self.remote_fs.get_node = self.node_dict.get
+        self.remote_fs.get_all_live_host_names = lambda: list(self.host_name_list)
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def read_remote(self, host_name):
+        remote_path = self.node_dict[host_name].format_path("/trace.csv")
+        if not os.path.exists(remote_path):
+            return None
+        with open(remote_path, "rb") as remote_handle:
+            return remote_handle.read()
+
+
+    def get_leftover_list(self):
+        return [file_name for host_name in self.host_name_list
+                    for file_name in os.listdir(self.node_dict[host_name].root_dir) if file_name != "trace.csv"]
+
+
+    def test_broadcast_file(self):
+        report_dict = self.remote_fs.broadcast_file(self.local_path, "/trace.csv")
+        with open(self.local_path, "rb") as local_handle:
+            data = local_handle.read()
+        assert all(self.read_remote(host_name) == data for host_name in self.host_name_list)
+        assert all(report_dict[host_name]["status"] == "ok" for host_name in self.host_name_list)
+        assert self.get_leftover_list() == []
+
+        # One node per round gets the file from the local machine, the others from nodes that have it.
+        local_list = [host_name for host_name in self.host_name_list if report_dict[host_name]["source"] == "local"]
+        assert len(local_list) == max(report_dict[host_name]["round"] for host_name in self.host_name_list) + 1
+        assert len(local_list) < len(self.host_name_list)
+
+        # The manifest has the uploads at the path the file was moved to, not at the temporary path.
+        manifest = TransferManifest(self.manifest_path)
+        for host_name in local_list:
+            assert manifest.lookup(host_name, self.node_dict[host_name].format_path("/trace.csv")) is not None
+        assert len(manifest._load()) == len(local_list)
+
+        # Nodes that already have the file are skipped.
+        report_dict = self.remote_fs.broadcast_file(self.local_path, "/trace.csv")
+        assert all(report_dict[host_name]["status"] == "skipped" for host_name in self.host_name_list)
+
+
+    def test_failed_copies(self):
+        self.node_dict["node0"].fail_send = True
+        self.node_dict["node5"].fail_receive = True
+        report_dict = self.remote_fs.broadcast_file(self.local_path, "/trace.csv")
+
+        # A node that cannot send is no longer used as a sender, its targets get the file from elsewhere.
+        assert all(report_dict[host_name]["status"] == "ok" for host_name in self.host_name_list[:5])
+        assert all(report_dict[host_name]["source"] != "node0" or report_dict[host_name]["status"] != "ok"
+                    for host_name in self.host_name_list)
+        # A node that cannot receive fails once the local machine also failed to send to it.
+        assert report_dict["node5"]["status"] == "failed" and report_dict["node5"]["source"] == "local"
+        assert self.read_remote("node5") is None
+        assert self.get_leftover_list() == []
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""These tests check that an interrupted download resumes from the chunks recorded in its checkpoint whose CRC32
+still matches the partial file. The remote node is replaced by FakeSFTPPool so no node is needed.
+"""
+
+import os
+import zlib
+import unittest
+from tempfile import TemporaryDirectory
+
+from FakeSFTPPool import FakeSFTPPool
+from expK8.remoteFS.ChunkedTransfer import ChunkedTransfer, PART_SUFFIX
+from expK8.remoteFS.TransferCheckpoint import TransferCheckpoint
+from expK8.remoteFS.TransferManifest import ChunkedDigest
+
+
+CHUNK_SIZE_BYTE = 64*1024
+
+
+class TestChunkedTransfer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.checkpoint_dir = os.path.join(self.temp_dir.name, "checkpoints")
+        self.remote_path = os.path.join(self.temp_dir.name, "remote.file")
+        self.local_path = os.path.join(self.temp_dir.name, "local.file")
+        self.data = os.urandom(4*CHUNK_SIZE_BYTE + 1000)
+        with open(self.remote_path, "wb") as remote_handle:
+            remote_handle.write(self.data)
+        self.sftp_pool = FakeSFTPPool()
+        self.transfer = ChunkedTransfer(
+                            self.sftp_pool,
+                            parallelism=2,
+                            chunk_size_byte=CHUNK_SIZE_BYTE,
+                            host_name="test",
+                            checkpoint_dir=self.checkpoint_dir)
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def get_read_offset_set(self):
+        """Get the offsets of chunks that were read, combining the reads of each window of a chunk. """
+        return set(offset - offset % CHUNK_SIZE_BYTE for offset, _ in self.sftp_pool.read_list)
+
+
+    def test_download(self):
+        report = self.transfer.download(self.remote_path, self.local_path)
+        with open(self.local_path, "rb") as local_handle:
+            assert local_handle.read() == self.data
+        assert not os.path.exists(self.local_path + PART_SUFFIX)
+        assert report["size_byte"] == len(self.data) and report["chunks"] == 5 and report["resumed_byte"] == 0
+
+        digest = ChunkedDigest(CHUNK_SIZE_BYTE)
+        digest.update(self.data)
+        assert report["digest"] == digest.hexdigest()
+        assert report["remote_mtime"] == os.stat(self.remote_path).st_mtime
+
+
+    def test_single_chunk_is_not_checkpointed(self):
+        with open(self.remote_path, "wb") as remote_handle:
+            remote_handle.write(self.data[:CHUNK_SIZE_BYTE])
+        report = self.transfer.download(self.remote_path, self.local_path)
+        assert report["chunks"] == 1
+        assert not os.path.exists(self.checkpoint_dir)
+
+        # A file with more than one chunk is checkpointed.
+        with open(self.remote_path, "wb") as remote_handle:
+            remote_handle.write(self.data)
+        self.transfer.download(self.remote_path, self.local_path)
+        assert os.path.exists(self.checkpoint_dir)
+
+
+    def test_resume_from_checkpoint(self):
+        # A partial file where chunk 0 and 2 were downloaded but chunk 2 was corrupted after.
+        part_data = bytearray(len(self.data))
+        part_data[:CHUNK_SIZE_BYTE] = self.data[:CHUNK_SIZE_BYTE]
+        part_data[2*CHUNK_SIZE_BYTE:3*CHUNK_SIZE_BYTE] = os.urandom(CHUNK_SIZE_BYTE)
+        with open(self.local_path + PART_SUFFIX, "wb") as part_handle:
+            part_handle.write(part_data)
+
+        remote_stat = os.stat(self.remote_path)
+        checkpoint = TransferCheckpoint.for_transfer(self.checkpoint_dir, "download", "test", self.remote_path, self.local_path)
+        checkpoint.load(remote_stat.st_size, remote_stat.st_mtime, CHUNK_SIZE_BYTE)
+        checkpoint.mark_done(0, zlib.crc32(self.data[:CHUNK_SIZE_BYTE]))
+        checkpoint.mark_done(2*CHUNK_SIZE_BYTE, zlib.crc32(self.data[2*CHUNK_SIZE_BYTE:3*CHUNK_SIZE_BYTE]))
+
+        report = self.transfer.download(self.remote_path, self.local_path)
+        with open(self.local_path, "rb") as local_handle:
+            assert local_handle.read() == self.data
+        assert self.get_read_offset_set() == {CHUNK_SIZE_BYTE, 2*CHUNK_SIZE_BYTE, 3*CHUNK_SIZE_BYTE, 4*CHUNK_SIZE_BYTE}
+        assert report["resumed_byte"] == CHUNK_SIZE_BYTE
+
+        # The digest covers the resumed chunk, which was hashed from the partial file.
+        digest = ChunkedDigest(CHUNK_SIZE_BYTE)
+        digest.update(self.data)
+        assert report["digest"] == digest.hexdigest()
+        assert not checkpoint.path.exists()
+
+
+    def test_checkpoint_of_changed_source_is_ignored(self):
+        remote_stat = os.stat(self.remote_path)
+        checkpoint = TransferCheckpoint.for_transfer(self.checkpoint_dir, "download", "test", self.remote_path, self.local_path)
+        checkpoint.load(remote_stat.st_size + 1, remote_stat.st_mtime, CHUNK_SIZE_BYTE)
+        checkpoint.mark_done(0, zlib.crc32(self.data[:CHUNK_SIZE_BYTE]))
+        with open(self.local_path + PART_SUFFIX, "wb") as part_handle:
+            part_handle.write(self.data[:CHUNK_SIZE_BYTE])
+
+        report = self.transfer.download(self.remote_path, self.local_path)
+        assert report["resumed_byte"] == 0 and 0 in self.get_read_offset_set()
+        with open(self.local_path, "rb") as local_handle:
+            assert local_handle.read() == self.data
+
+
+if __name__ == '__main__':
+    unittest.main()
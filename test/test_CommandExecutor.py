@@ -0,0 +1,90 @@
+"""These tests check that CommandExecutor bounds the channels open at the same time and that commands which time
+out have their channel closed and are counted. The SSH client is replaced by FakeSSHClient so no node is needed.
+"""
+
+import unittest
+from time import time, sleep
+from threading import Thread
+
+from FakeSSHClient import FakeSSHClient, FakeTransport
+from expK8.remoteFS.CommandExecutor import CommandExecutor
+from expK8.remoteFS.NodeException import RemoteCommandTimeout, ChannelOpenError
+
+
+COMMAND_DICT = {
+    "echo hi": (b"hi\n", b"", 0, 0),
+    "false": (b"", b"failed\n", 1, 0),
+    "sleep": (b"", b"", 0, 0.3),
+    "hang": (b"", b"", 0, 60)
+}
+
+
+class TestCommandExecutor(unittest.TestCase):
+    def setUp(self):
+        self.transport = FakeTransport(COMMAND_DICT)
+        self.executor = CommandExecutor("test", FakeSSHClient(self.transport), max_channels=2, poll_interval_sec=0.01)
+
+
+    def test_run(self):
+        assert self.executor.run("echo hi") == ("hi\n", "", 0)
+        assert self.executor.run("false", timeout=5) == ("", "failed\n", 1)
+        assert list(self.executor.stream("echo hi")) == ["hi"]
+        assert self.executor.get_stats() == {"in_flight": 0, "timed_out": 0, "leaked": 0, "max_channels": 2}
+        assert self.transport.open_count == 0
+
+
+    def test_timeout_closes_channel(self):
+        start_time = time()
+        with self.assertRaises(RemoteCommandTimeout):
+            self.executor.run("hang", timeout=0.2)
+        assert time() - start_time < 2
+
+        # The command had not exited when its channel was closed, so it may still be running in the node.
+        assert self.transport.open_count == 0 and len(self.transport.killed_list) == 1
+        assert self.executor.get_stats() == {"in_flight": 0, "timed_out": 1, "leaked": 1, "max_channels": 2}
+
+        with self.assertRaises(RemoteCommandTimeout):
+            list(self.executor.stream("hang", timeout=0.2))
+        assert self.executor.get_stats()["leaked"] == 2
+
+        # A command that completes in time is not counted.
+        self.executor.run("sleep", timeout=5)
+        assert self.executor.get_stats()["timed_out"] == 2
+
+
+    def test_slot_limit(self):
+        thread_list = [Thread(target=self.executor.run, args=("sleep",)) for _ in range(2)]
+        for thread in thread_list:
+            thread.start()
+        while self.executor.get_stats()["in_flight"] < 2:
+            sleep(0.01)
+
+        # Both slots are taken, so a command waiting for a slot times out without opening a channel.
+        with self.assertRaises(RemoteCommandTimeout):
+            self.executor.run("echo hi", timeout=0.05)
+        assert self.executor.get_stats()["leaked"] == 0
+
+        # Once a slot is freed the queued commands run, never more than two at a time.
+        thread_list += [Thread(target=self.executor.run, args=("sleep",)) for _ in range(3)]
+        for thread in thread_list:
+            if not thread.is_alive():
+                thread.start()
+        for thread in thread_list:
+            thread.join(5)
+        assert self.transport.max_open_count == 2 and self.transport.open_count == 0
+
+
+    def test_inactive_transport(self):
+        self.transport.active = False
+        with self.assertRaises(ChannelOpenError):
+            self.executor.run("echo hi")
+        assert self.executor.get_stats()["in_flight"] == 0
+
+        # A slot is released when the channel fails to open, so commands run once the node is reconnected.
+        self.executor.set_client(FakeSSHClient(FakeTransport(COMMAND_DICT)))
+        for _ in range(3):
+            assert self.executor.run("echo hi", timeout=5)[2] == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""These tests check that DeltaSync only reads the blocks of a remote file that differ from the local copy. The
+remote node is replaced by local files, FakeSFTPPool and a command runner computing block hashes locally.
+"""
+
+import os
+import json
+import unittest
+from tempfile import TemporaryDirectory
+
+from FakeSFTPPool import FakeSFTPPool
+from expK8.remoteFS.DeltaSync import DeltaSync
+
+
+BLOCK_SIZE_BYTE = 1024
+
+
+class TestDeltaSync(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.remote_path = os.path.join(self.temp_dir.name, "remote.file")
+        self.local_path = os.path.join(self.temp_dir.name, "local.file")
+        self.sftp_pool = FakeSFTPPool()
+        self.delta_sync = DeltaSync("test", self.exec_command, self.sftp_pool, block_size_byte=BLOCK_SIZE_BYTE)
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def exec_command(self, command_str_arr):
+        """Compute the block hashes of the remote file the way REMOTE_HASH_SCRIPT does in a remote node. """
+        return json.dumps(self.delta_sync.get_local_hashes(self.remote_path)), "", 0
+
+
+    def write(self, path, data):
+        with open(path, "wb") as handle:
+            handle.write(data)
+
+
+    def read(self, path):
+        with open(path, "rb") as handle:
+            return handle.read()
+
+
+    def test_changed_blocks(self):
+        local_data = os.urandom(10*BLOCK_SIZE_BYTE)
+        remote_data = bytearray(local_data)
+        remote_data[3*BLOCK_SIZE_BYTE + 5] ^= 0xff
+        remote_data[7*BLOCK_SIZE_BYTE:7*BLOCK_SIZE_BYTE + 10] = os.urandom(10)
+        remote_data += os.urandom(BLOCK_SIZE_BYTE//2)
+        self.write(self.local_path, local_data)
+        self.write(self.remote_path, remote_data)
+
+        report = self.delta_sync.sync_file(self.remote_path, self.local_path)
+        assert self.read(self.local_path) == remote_data
+        assert report["verified"] and report["blocks"] == 11 and report["changed_blocks"] == 3
+        assert sorted(self.sftp_pool.read_list) == [
+            (3*BLOCK_SIZE_BYTE, BLOCK_SIZE_BYTE),
+            (7*BLOCK_SIZE_BYTE, BLOCK_SIZE_BYTE),
+            (10*BLOCK_SIZE_BYTE, BLOCK_SIZE_BYTE//2)]
+        assert report["fetched_byte"] == 2*BLOCK_SIZE_BYTE + BLOCK_SIZE_BYTE//2
+
+
+    def test_unchanged_and_truncated(self):
+        data = os.urandom(5*BLOCK_SIZE_BYTE)
+        self.write(self.local_path, data)
+        self.write(self.remote_path, data)
+        report = self.delta_sync.sync_file(self.remote_path, self.local_path)
+        assert report["changed_blocks"] == 0 and self.sftp_pool.read_list == []
+
+        # A remote file that shrank is truncated locally without reading any block.
+        self.write(self.remote_path, data[:2*BLOCK_SIZE_BYTE])
+        report = self.delta_sync.sync_file(self.remote_path, self.local_path)
+        assert self.read(self.local_path) == data[:2*BLOCK_SIZE_BYTE]
+        assert report["verified"] and report["changed_blocks"] == 0 and self.sftp_pool.read_list == []
+
+
+    def test_missing_local_file(self):
+        data = os.urandom(3*BLOCK_SIZE_BYTE + 1)
+        self.write(self.remote_path, data)
+        report = self.delta_sync.sync_file(self.remote_path, self.local_path)
+        assert self.read(self.local_path) == data
+        assert report["changed_blocks"] == 4 and report["fetched_byte"] == len(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""These tests check that facts of a node are only reused while the node has the boot ID they were stored with. """
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.Node import Node
+
+
+class TestFactsStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.facts_path = os.path.join(self.temp_dir.name, "facts.json")
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def test_boot_id_invalidation(self):
+        facts_store = FactsStore(self.facts_path)
+        facts = {"boot_id": "boot-a", "home": "/home/user", "mounted": ["/dev/sda1"]}
+        facts_store.put("host", facts)
+        assert facts_store.get("host", "boot-a") == facts
+
+        # After a reboot the node has a new boot ID and the stored facts, such as mounts, no longer hold.
+        assert facts_store.get("host", "boot-b") is None
+        assert facts_store.get("other_host", "boot-a") is None
+
+        facts_store.put("host", dict(facts, boot_id="boot-b"))
+        assert facts_store.get("host", "boot-a") is None
+        assert FactsStore(self.facts_path).get("host", "boot-b")["home"] == "/home/user"
+
+
+    def test_remove_and_corrupt_file(self):
+        facts_store = FactsStore(self.facts_path)
+        facts_store.put("host", {"boot_id": "boot-a"})
+        facts_store.remove("host")
+        assert facts_store.get("host", "boot-a") is None
+
+        with open(self.facts_path, "w") as facts_handle:
+            facts_handle.write("{not json")
+        assert facts_store.get("host", "boot-a") is None
+        facts_store.put("host", {"boot_id": "boot-a"})
+        assert facts_store.get("host", "boot-a") == {"boot_id": "boot-a"}
+
+
+    def test_update(self):
+        facts_store = FactsStore(self.facts_path)
+        facts_store.put("host", {"boot_id": "boot-a", "lsblk": {"blockdevices": []}})
+        facts_store.update("host", "boot-a", {"lsblk": None})
+        assert facts_store.get("host", "boot-a") == {"boot_id": "boot-a", "lsblk": None}
+
+        # Facts of an earlier boot or of an unknown host are not updated.
+        facts_store.update("host", "boot-b", {"lsblk": {"blockdevices": []}})
+        facts_store.update("other_host", "boot-a", {"lsblk": {"blockdevices": []}})
+        assert facts_store.get("host", "boot-a")["lsblk"] is None
+        assert facts_store.get("other_host", "boot-a") is None
+
+
+    def test_node_block_devices(self):
+        facts_store = FactsStore(self.facts_path)
+        node = Node("node", "host", {"user": "user"}, [], facts_store=facts_store, lazy=True)
+        command_list = []
+        def exec_command(command_str_arr, timeout=None):
+            command_list.append(command_str_arr[0])
+            if command_str_arr[0] == "lsblk":
+                return '{"blockdevices": [{"name": "sda"}]}', "", 0
+            return "", "", 0
+        node.exec_command = exec_command
+        node._boot_id = "boot-a"
+        facts_store.put("host", {"boot_id": "boot-a", "user": "user", "home": "/home/user", "mount_list": [], "lsblk": {"blockdevices": []}})
+
+        # A fresh lsblk is written to the store.
+        assert node.get_block_devices() == {"blockdevices": [{"name": "sda"}]}
+        assert facts_store.get("host", "boot-a")["lsblk"] == {"blockdevices": [{"name": "sda"}]}
+
+        # A command that can change block devices drops them from the store, so the next invocation runs lsblk.
+        node.rm("/tmp/file")
+        assert facts_store.get("host", "boot-a")["lsblk"] is None
+        next_node = Node("node", "host", {"user": "user"}, [], facts_store=facts_store, lazy=True)
+        next_node._get_boot_id_and_home_dir = lambda timeout=None: ("boot-a", "/home/user")
+        next_node.exec_command = exec_command
+        next_node._setup()
+        assert command_list == ["lsblk", "sudo"]
+        assert next_node.get_block_devices() == {"blockdevices": [{"name": "sda"}]}
+        assert command_list == ["lsblk", "sudo", "lsblk"]
+        assert facts_store.get("host", "boot-a")["lsblk"] == {"blockdevices": [{"name": "sda"}]}
+
+
+    def test_from_config(self):
+        assert FactsStore.from_config({}) is None
+        assert FactsStore.from_config({"facts_store_path": self.facts_path}).path.name == "facts.json"
+
+
+if __name__ == '__main__':
+    unittest.main()
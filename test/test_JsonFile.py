@@ -0,0 +1,42 @@
+"""These tests check that JSON files of local state are written atomically and that a missing or corrupt file
+reads as no data.
+"""
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.JsonFile import load_json, save_json
+
+
+class TestJsonFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.path = Path(self.temp_dir.name).joinpath("state", "state.json")
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def test_save_and_load(self):
+        assert load_json(self.path) is None
+        save_json(self.path, {"host": {"boot_id": "boot-a"}})
+        assert load_json(self.path) == {"host": {"boot_id": "boot-a"}}
+
+        # The temporary file replaces the file, none is left behind.
+        save_json(self.path, [1, 2], indent=None)
+        assert load_json(self.path) == [1, 2]
+        assert os.listdir(self.path.parent) == ["state.json"]
+
+
+    def test_corrupt_file(self):
+        self.path.parent.mkdir()
+        with self.path.open("w") as json_handle:
+            json_handle.write("{not json")
+        assert load_json(self.path) is None
+
+
+if __name__ == '__main__':
+    unittest.main()
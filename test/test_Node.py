@@ -28,5 +28,14 @@ class TestNode(unittest.TestCase):
             print("{} -> {}".format(remote_file_path, local_path))
 
 
+    def test_stat_paths(self):
+        temp_node = node_factory.get_node_list()[0]
+        missing_path = "~/expK8.missing.file"
+        path_info_dict = temp_node.stat_paths(["~", missing_path])
+        assert path_info_dict["~"]["exists"] and path_info_dict["~"]["type"] == "dir"
+        assert not path_info_dict[missing_path]["exists"] and path_info_dict[missing_path]["size"] == 0
+        assert temp_node.dir_exists("~") and not temp_node.file_exists(missing_path)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""These tests check requests and responses between NodeDaemonClient and NodeDaemon over a Unix socket. The
+RemoteFS of the daemon is replaced by objects that answer requests locally, so no node is needed.
+"""
+
+import os
+import stat
+import unittest
+from time import sleep
+from threading import Thread
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.NodeDaemon import NodeDaemon, NodeDaemonClient
+from expK8.remoteFS.NodeException import NodeDaemonError
+from expK8.remoteFS.ProcessSnapshot import ProcessSnapshot
+
+
+PROCESS_LIST = [{"pid": 100, "ppid": 1, "pgid": 100, "user": "user", "elapsed_sec": 5, "cmdline": "bin/cachebench"}]
+
+
+class FakeNode:
+    """Node that answers commands locally. """
+    def __init__(
+            self,
+            host_name: str
+    ) -> None:
+        self.host = host_name
+
+
+    def exec_command(self, command_str_arr, timeout=None):
+        return " ".join(command_str_arr), "", 0
+
+
+    def get_file_size(self, path):
+        return len(path)
+
+
+    def processes(self, max_age_sec=5, all_users=False):
+        return ProcessSnapshot(PROCESS_LIST)
+
+
+class FakeRemoteFS:
+    """RemoteFS whose nodes answer commands locally. """
+    def __init__(self):
+        self.node_dict = {host_name: FakeNode(host_name) for host_name in ["node0", "node1"]}
+        self.broadcast_list = []
+
+
+    def get_node(self, host_name):
+        return self.node_dict.get(host_name)
+
+
+    def get_all_host_names(self):
+        return list(self.node_dict)
+
+
+    def broadcast(self, command_str_arr, max_parallel=64, deadline=None, host_name_list=None):
+        self.broadcast_list.append((command_str_arr, max_parallel, deadline, host_name_list))
+        host_name_list = host_name_list if host_name_list is not None else list(self.node_dict)
+        return {host_name: {"stdout": " ".join(command_str_arr), "exit_code": 0} for host_name in host_name_list}
+
+
+class TestNodeDaemon(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "daemon", "daemon.sock")
+        self.node_daemon = NodeDaemon({"nodes": {}}, socket_path=self.socket_path)
+        self.node_daemon.remote_fs = FakeRemoteFS()
+        self.server_thread = Thread(target=self.node_daemon.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.client = NodeDaemonClient(socket_path=self.socket_path, timeout=5)
+        for _ in range(50):
+            if self.client.is_running():
+                break
+            sleep(0.1)
+
+
+    def tearDown(self):
+        self.client.request("shutdown")
+        self.client.close()
+        self.server_thread.join(5)
+        self.temp_dir.cleanup()
+
+
+    def test_request_response(self):
+        assert self.client.request("ping") == "pong"
+        assert self.client.request("hosts") == ["node0", "node1"]
+        assert self.client.exec_command("node0", ["ls", "-lh"]) == ("ls -lh", "", 0)
+        assert self.client.call("node1", "get_file_size", "/dev/shm/a") == 10
+        assert stat.S_IMODE(os.stat(self.socket_path).st_mode) == 0o600
+
+        # Errors in the daemon are raised in the client, which can keep sending requests on the same connection.
+        with self.assertRaises(NodeDaemonError):
+            self.client.call("node0", "_connect")
+        with self.assertRaises(NodeDaemonError):
+            self.client.exec_command("missing", ["ls"])
+        with self.assertRaises(NodeDaemonError):
+            self.client.request("unknown")
+        assert self.client.request("ping") == "pong"
+
+
+    def test_broadcast(self):
+        result_dict = self.client.broadcast(["uptime"], max_parallel=8, deadline=2.5, host_name_list=["node1"])
+        assert result_dict == {"node1": {"stdout": "uptime", "exit_code": 0}}
+        assert self.node_daemon.remote_fs.broadcast_list == [(["uptime"], 8, 2.5, ["node1"])]
+        assert sorted(self.client.broadcast(["uptime"])) == ["node0", "node1"]
+
+
+    def test_daemon_node(self):
+        node = self.client.get_node("node0")
+        assert node.exec_command(["echo", "hi"]) == ("echo hi", "", 0)
+        assert node.get_file_size("/a") == 2
+        snapshot = node.processes()
+        assert isinstance(snapshot, ProcessSnapshot) and snapshot.is_running("bin/cachebench")
+        # Broadcast is a method of RemoteFS, so the stand-in for a node does not have it.
+        with self.assertRaises(NodeDaemonError):
+            node.broadcast(["uptime"])
+
+
+if __name__ == '__main__':
+    unittest.main()
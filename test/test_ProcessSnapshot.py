@@ -0,0 +1,55 @@
+"""These tests check parsing the output of 'ps' into a ProcessSnapshot and walking the process tree. """
+
+import unittest
+
+from expK8.remoteFS.ProcessSnapshot import ProcessSnapshot
+
+
+PS_OUTPUT = """    1     0     1 root          9000 /sbin/init
+  100     1   100 user           500 nohup python3 Replay.py --trace /dev/shm/trace.csv
+  101   100   100 user           499 ./opt/cachelib/bin/cachebench --json_test_config config.json
+  102   101   100 root           498 sudo dd if=/dev/zero of=/dev/null
+  200     1   200 other           10 bin/cachebench --json_test_config other.json
+  300     1   300 user             1
+  400     1   400 user             0 ps -u user -o pid=,ppid=,pgid=,user=,etimes=,args=
+not a process row
+"""
+
+
+class TestProcessSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = ProcessSnapshot.from_ps_output(PS_OUTPUT, exclude_cmdline="ps -u user -o pid=,ppid=,pgid=,user=,etimes=,args=")
+
+
+    def test_from_ps_output(self):
+        assert len(self.snapshot) == 6
+        assert self.snapshot.get(400) is None
+        process = self.snapshot.get(100)
+        assert process == {
+            "pid": 100,
+            "ppid": 1,
+            "pgid": 100,
+            "user": "user",
+            "elapsed_sec": 500,
+            "cmdline": "nohup python3 Replay.py --trace /dev/shm/trace.csv"
+        }
+        # A process with no arguments, such as a zombie, has an empty command line.
+        assert self.snapshot.get(300)["cmdline"] == ""
+
+
+    def test_find(self):
+        assert [process["pid"] for process in self.snapshot.find("bin/cachebench")] == [101, 200]
+        assert [process["pid"] for process in self.snapshot.find("bin/cachebench", user="user")] == [101]
+        assert [process["pid"] for process in self.snapshot.find("bin/cachebench", "other.json")] == [200]
+        assert self.snapshot.is_running("Replay.py") and not self.snapshot.is_running("Replay.py", "missing")
+
+
+    def test_tree(self):
+        assert [process["pid"] for process in self.snapshot.children(1)] == [100, 200, 300]
+        assert [process["pid"] for process in self.snapshot.descendants(100)] == [101, 102]
+        assert self.snapshot.descendants(102) == []
+        assert sorted(process["pid"] for process in self.snapshot.group(100)) == [100, 101, 102]
+
+
+if __name__ == '__main__':
+    unittest.main()
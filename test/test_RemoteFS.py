@@ -14,6 +14,13 @@ fs = RemoteFS(test_config)
 class TestRemoteFS(unittest.TestCase):
     def test_connect(self):
         assert fs.all_up()
+    
+
+    def test_gather(self):
+        result_dict = fs.gather(lambda node: node.exec_command(["echo", node.host]))
+        for host_name in fs.get_all_live_host_names():
+            stdout, stderr, exit_code = result_dict[host_name]
+            assert stdout.rstrip() == host_name and not exit_code
 
 
 if __name__ == '__main__':
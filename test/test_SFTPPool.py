@@ -0,0 +1,76 @@
+"""These tests check that SFTPPool reuses idle SFTP sessions and drops them once the SSH transport they were opened
+on is closed or replaced. The SSH client is replaced by FakeSSHClient so no node is needed.
+"""
+
+import unittest
+
+from FakeSSHClient import FakeSSHClient, FakeTransport
+from expK8.remoteFS.SFTPPool import SFTPPool
+
+
+class TestSFTPPool(unittest.TestCase):
+    def setUp(self):
+        self.ssh_client = FakeSSHClient()
+        self.sftp_pool = SFTPPool(self.ssh_client, max_idle=2)
+
+
+    def test_reuse_idle_session(self):
+        with self.sftp_pool.session() as sftp:
+            pass
+        with self.sftp_pool.session() as reused_sftp:
+            assert reused_sftp is sftp
+        assert len(self.ssh_client.sftp_list) == 1 and not sftp.closed
+
+        # Only max_idle sessions are kept open after they are released.
+        sftp_list = [self.sftp_pool.acquire() for _ in range(3)]
+        for sftp in sftp_list:
+            self.sftp_pool.release(sftp)
+        assert [sftp.closed for sftp in sftp_list] == [False, False, True]
+
+
+    def test_session_that_raised_is_discarded(self):
+        with self.assertRaises(IOError):
+            with self.sftp_pool.session() as sftp:
+                raise IOError("Read failed.")
+        assert sftp.closed
+        with self.sftp_pool.session() as new_sftp:
+            assert new_sftp is not sftp
+
+
+    def test_transport_replaced(self):
+        sftp = self.sftp_pool.acquire()
+        self.sftp_pool.release(sftp)
+
+        # After a reconnect the client has a new transport, sessions of the old one are closed instead of reused.
+        self.ssh_client.transport = FakeTransport()
+        new_sftp = self.sftp_pool.acquire()
+        assert new_sftp is not sftp and sftp.closed
+        assert new_sftp.get_channel().get_transport() is self.ssh_client.transport
+
+        # A session acquired before the reconnect is closed when it is released.
+        old_sftp = new_sftp
+        self.ssh_client.transport = FakeTransport()
+        self.sftp_pool.acquire()
+        self.sftp_pool.release(old_sftp)
+        assert old_sftp.closed
+
+
+    def test_transport_closed(self):
+        sftp = self.sftp_pool.acquire()
+        self.sftp_pool.release(sftp)
+        # The transport dropped but was not replaced yet, so the idle session is closed as it is unhealthy.
+        self.ssh_client.transport.active = False
+        assert self.sftp_pool.acquire() is not sftp and sftp.closed
+
+
+    def test_set_client(self):
+        sftp = self.sftp_pool.acquire()
+        self.sftp_pool.release(sftp)
+        new_client = FakeSSHClient()
+        self.sftp_pool.set_client(new_client)
+        assert sftp.closed
+        assert self.sftp_pool.acquire() is new_client.sftp_list[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
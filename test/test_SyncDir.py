@@ -0,0 +1,89 @@
+"""These tests check the report of Node.sync_dir. The node is created lazily so it never connects, and the
+listing of the remote directory and the downloads are replaced by copies between local directories.
+"""
+
+import os
+import shutil
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.Node import Node
+from expK8.remoteFS.TransferManifest import TransferManifest
+
+
+class TestSyncDir(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.remote_dir = os.path.join(self.temp_dir.name, "remote")
+        self.local_dir = os.path.join(self.temp_dir.name, "local")
+        self.manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        os.makedirs(os.path.join(self.remote_dir, "sub"))
+        os.makedirs(self.local_dir)
+        self.file_size_dict = {"same.file": 100, "changed.file": 200, "sub/new.file": 300, "sub/fail.file": 400}
+        for file_name, file_size in self.file_size_dict.items():
+            with open(os.path.join(self.remote_dir, file_name), "wb") as remote_handle:
+                remote_handle.write(os.urandom(file_size))
+        shutil.copy(os.path.join(self.remote_dir, "same.file"), os.path.join(self.local_dir, "same.file"))
+        with open(os.path.join(self.local_dir, "changed.file"), "wb") as local_handle:
+            local_handle.write(b"x"*10)
+
+        self.node = Node("test", "test", {"type": "env", "user": "user", "val": "PW"}, [], lazy=True, manifest_path=self.manifest_path)
+        self.node.list_dir_tree = self.list_dir_tree
+        self.node.download = self.download
+        self.download_list = []
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def list_dir_tree(self, remote_dir_path):
+        file_dict = {}
+        for file_name in self.file_size_dict:
+            remote_path = os.path.join(remote_dir_path, file_name)
+            file_dict[remote_path] = {"size": os.path.getsize(remote_path), "mtime": os.path.getmtime(remote_path)}
+        return file_dict
+
+
+    def download(self, remote_path, local_path, parallelism=4, resume=True, **kwargs):
+        self.download_list.append((remote_path, parallelism))
+        if remote_path.endswith("fail.file"):
+            raise IOError("Connection dropped.")
+        shutil.copy(remote_path, local_path)
+        # Record the transfer the way a download does, which is written once the sync ends, even though the
+        # download runs in another thread than the sync.
+        assert not self.node._transfer_manifest.journal_path.exists()
+        self.node._transfer_manifest.record("test", remote_path, local_path, "download", 0, "digest", 1024, False)
+        return {"size_byte": os.path.getsize(local_path)}
+
+
+    def test_sync_dir_report(self):
+        sync_report = self.node.sync_dir(self.remote_dir, self.local_dir, max_parallel=2)
+        remote_path = lambda file_name: os.path.join(self.remote_dir, file_name)
+        assert sync_report["skipped"] == [remote_path("same.file")]
+        assert sorted(sync_report["downloaded"]) == sorted([remote_path("changed.file"), remote_path("sub/new.file")])
+        assert list(sync_report["failed"]) == [remote_path("sub/fail.file")]
+        assert isinstance(sync_report["failed"][remote_path("sub/fail.file")], IOError)
+
+        # Files are downloaded concurrently, each with a single session.
+        assert all(parallelism == 1 for _, parallelism in self.download_list) and len(self.download_list) == 3
+        for file_name in ["changed.file", "sub/new.file"]:
+            with open(remote_path(file_name), "rb") as remote_handle, open(os.path.join(self.local_dir, file_name), "rb") as local_handle:
+                assert remote_handle.read() == local_handle.read()
+        assert not Path(self.local_dir).joinpath("sub/fail.file").exists()
+
+        with self.node._transfer_manifest.journal_path.open("r") as journal_handle:
+            assert len(journal_handle.readlines()) == 2
+        assert len(TransferManifest(self.manifest_path)._load()) == 2
+
+
+    def test_sync_dir_up_to_date(self):
+        self.file_size_dict = {"same.file": 100}
+        sync_report = self.node.sync_dir(self.remote_dir, self.local_dir)
+        assert sync_report == {"downloaded": [], "skipped": [os.path.join(self.remote_dir, "same.file")], "failed": {}}
+        assert self.download_list == []
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""These tests check that TraceCache uploads a file to a node only once, verifies the uploaded file in the node and
+keeps the staged files under the size cap. The node is replaced by an object whose "remote" paths are local paths,
+so no node is needed.
+"""
+
+import os
+import shutil
+import subprocess
+import unittest
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.NodeException import RemoteRuntimeError
+from expK8.remoteFS.TransferManifest import ChunkedDigest
+from expK8.remoteFS.TraceCache import TraceCache, UPLOAD_CHUNK_SIZE_BYTE, UPLOAD_SUFFIX
+
+
+class FakeNode:
+    """Node whose remote file system is the local file system. """
+    def __init__(
+            self,
+            host_name: str
+    ) -> None:
+        self.host = host_name
+        self.upload_list = []
+        self.digest_list = []
+        self.corrupt_upload = False
+
+
+    def format_path(self, path_str):
+        return path_str
+
+
+    def exec_command(self, command_str_arr, timeout=None):
+        process = subprocess.run(" ".join(command_str_arr), shell=True, capture_output=True, text=True)
+        return process.stdout, process.stderr, process.returncode
+
+
+    def rm(self, path):
+        os.remove(path)
+
+
+    def stat_paths(self, path_list):
+        path_info_dict = {}
+        for path in path_list:
+            if os.path.isfile(path):
+                path_info_dict[path] = {"exists": True, "type": "file", "size": os.path.getsize(path), "mtime": os.path.getmtime(path)}
+            else:
+                path_info_dict[path] = {"exists": False, "type": None, "size": 0, "mtime": None}
+        return path_info_dict
+
+
+    def list_dir_tree(self, remote_dir_path):
+        file_dict = {}
+        for dir_path, _, file_name_list in os.walk(remote_dir_path):
+            for file_name in file_name_list:
+                file_path = os.path.join(dir_path, file_name)
+                file_dict[file_path] = {"size": os.path.getsize(file_path), "mtime": os.path.getmtime(file_path)}
+        return file_dict
+
+
+    def scp(self, local_path, remote_path, chunk_size_byte=None, **kwargs):
+        self.upload_list.append(remote_path)
+        shutil.copy(local_path, remote_path)
+        if self.corrupt_upload:
+            with open(remote_path, "r+b") as remote_handle:
+                remote_handle.write(b"corrupt")
+        return {"size_byte": os.path.getsize(remote_path)}
+
+
+    def get_remote_digest(self, remote_path, chunk_size_byte):
+        self.digest_list.append(remote_path)
+        digest = ChunkedDigest(chunk_size_byte)
+        with open(remote_path, "rb") as remote_handle:
+            digest.update(remote_handle.read())
+        return digest.hexdigest()
+
+
+class TestTraceCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.remote_dir = os.path.join(self.temp_dir.name, "remote")
+        self.local_dir = os.path.join(self.temp_dir.name, "local")
+        os.makedirs(self.local_dir)
+        self.index_path = os.path.join(self.temp_dir.name, "index.json")
+        self.node = FakeNode("host")
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def write_trace(self, file_name, size_byte):
+        local_path = os.path.join(self.local_dir, file_name)
+        with open(local_path, "wb") as local_handle:
+            local_handle.write(os.urandom(size_byte))
+        return local_path
+
+
+    def test_stage_once(self):
+        trace_cache = TraceCache(self.remote_dir, index_path=self.index_path)
+        local_path = self.write_trace("a.csv", 1000)
+        link_path = os.path.join(self.temp_dir.name, "trace.csv")
+        assert trace_cache.stage(self.node, local_path, link_path) == link_path
+
+        sha256 = trace_cache.get_local_hash(local_path)
+        blob_path = os.path.join(self.remote_dir, sha256)
+        assert os.path.realpath(link_path) == os.path.realpath(blob_path)
+        assert not os.path.exists(blob_path + UPLOAD_SUFFIX)
+        # The uploaded file is verified in the node before it is renamed to its staged path.
+        assert self.node.upload_list == [blob_path + UPLOAD_SUFFIX] and self.node.digest_list == [blob_path + UPLOAD_SUFFIX]
+
+        # A copy under another name is already staged, found with a stat and no upload.
+        copy_path = os.path.join(self.local_dir, "b.csv")
+        shutil.copy(local_path, copy_path)
+        assert TraceCache(self.remote_dir, index_path=self.index_path).stage(self.node, copy_path) == blob_path
+        assert len(self.node.upload_list) == 1 and trace_cache.get_host_hashes("host") == [sha256]
+
+
+    def test_corrupt_upload_is_rejected(self):
+        trace_cache = TraceCache(self.remote_dir, index_path=self.index_path)
+        local_path = self.write_trace("a.csv", 1000)
+        self.node.corrupt_upload = True
+        with self.assertRaises(RemoteRuntimeError):
+            trace_cache.stage(self.node, local_path)
+        assert os.listdir(self.remote_dir) == [] and trace_cache.get_host_hashes("host") == []
+
+        self.node.corrupt_upload = False
+        trace_cache.stage(self.node, local_path)
+        assert os.listdir(self.remote_dir) == [trace_cache.get_local_hash(local_path)]
+
+
+    def test_eviction(self):
+        trace_cache = TraceCache(self.remote_dir, index_path=self.index_path, max_size_byte=2500)
+        path_list = [self.write_trace("{}.csv".format(index), 1000) for index in range(3)]
+        sha256_list = [trace_cache.get_local_hash(local_path) for local_path in path_list]
+        trace_cache.stage(self.node, path_list[0])
+        trace_cache.stage(self.node, path_list[1])
+        # Staging the first file again makes the second the least recently staged.
+        trace_cache.stage(self.node, path_list[0])
+
+        # An upload left behind by a stage that was interrupted is removed along with the evicted file.
+        leftover_path = os.path.join(self.remote_dir, "f"*64 + UPLOAD_SUFFIX)
+        with open(leftover_path, "wb") as leftover_handle:
+            leftover_handle.write(os.urandom(400))
+
+        trace_cache.stage(self.node, path_list[2])
+        assert sorted(os.listdir(self.remote_dir)) == sorted([sha256_list[0], sha256_list[2]])
+        assert sorted(trace_cache.get_host_hashes("host")) == sorted([sha256_list[0], sha256_list[2]])
+        assert len(self.node.upload_list) == 3
+
+
+    def test_leftover_upload_removed_under_cap(self):
+        trace_cache = TraceCache(self.remote_dir, index_path=self.index_path, max_size_byte=10*UPLOAD_CHUNK_SIZE_BYTE)
+        os.makedirs(self.remote_dir)
+        leftover_path = os.path.join(self.remote_dir, "f"*64 + UPLOAD_SUFFIX)
+        with open(leftover_path, "wb") as leftover_handle:
+            leftover_handle.write(b"partial")
+        # An upload another thread is running is not a leftover.
+        running_path = os.path.join(self.remote_dir, "e"*64 + UPLOAD_SUFFIX)
+        with open(running_path, "wb") as running_handle:
+            running_handle.write(b"partial")
+        trace_cache._uploading_set.add(("host", "e"*64))
+
+        trace_cache.stage(self.node, self.write_trace("a.csv", 100))
+        assert not os.path.exists(leftover_path) and os.path.exists(running_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
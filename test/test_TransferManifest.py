@@ -0,0 +1,139 @@
+"""These tests check the digest of files transferred in chunks and the local manifest of transfers. """
+
+import os
+import hashlib
+import unittest
+from threading import Thread
+from tempfile import TemporaryDirectory
+
+from expK8.remoteFS.TransferManifest import TransferManifest, ChunkedDigest, combine_chunk_digests
+
+
+class TestChunkedDigest(unittest.TestCase):
+    def test_combine_chunk_digests(self):
+        chunk_list = [b"a"*10, b"b"*10, b"c"*3]
+        chunk_digest_list = [hashlib.sha256(chunk).digest() for chunk in chunk_list]
+        assert combine_chunk_digests(chunk_digest_list) == hashlib.sha256(b"".join(chunk_digest_list)).hexdigest()
+        assert combine_chunk_digests([]) == hashlib.sha256().hexdigest()
+
+
+    def test_streamed_digest_matches_chunks(self):
+        data = os.urandom(10*1024 + 7)
+        chunk_size_byte = 1024
+        chunk_digest_list = [hashlib.sha256(data[offset:offset + chunk_size_byte]).digest()
+                                for offset in range(0, len(data), chunk_size_byte)]
+
+        # Pieces that do not line up with chunks give the same digest as whole chunks.
+        for piece_size_byte in [1, 100, 1024, 3000, len(data)]:
+            digest = ChunkedDigest(chunk_size_byte)
+            for offset in range(0, len(data), piece_size_byte):
+                digest.update(data[offset:offset + piece_size_byte])
+            assert digest.hexdigest() == combine_chunk_digests(chunk_digest_list)
+
+
+    def test_digest_depends_on_chunk_size(self):
+        data = os.urandom(4096)
+        digest_a, digest_b = ChunkedDigest(1024), ChunkedDigest(2048)
+        digest_a.update(data)
+        digest_b.update(data)
+        assert digest_a.hexdigest() != digest_b.hexdigest()
+
+
+class TestTransferManifest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        self.local_path = os.path.join(self.temp_dir.name, "local.file")
+        with open(self.local_path, "wb") as local_handle:
+            local_handle.write(b"x"*100)
+
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+    def record(self, manifest, remote_path):
+        manifest.record("host", remote_path, self.local_path, "upload", 1000, "digest", 1024, False)
+
+
+    def test_record_and_lookup(self):
+        manifest = TransferManifest(self.manifest_path)
+        self.record(manifest, "/remote/a")
+        entry = manifest.lookup("host", "/remote/a")
+        assert entry["size_byte"] == 100 and entry["remote_mtime"] == 1000 and entry["digest"] == "digest"
+        assert manifest.is_current("host", "/remote/a", self.local_path)
+        assert manifest.lookup("other_host", "/remote/a") is None
+
+        with open(self.local_path, "ab") as local_handle:
+            local_handle.write(b"y")
+        assert not manifest.is_current("host", "/remote/a", self.local_path)
+
+        manifest.remove("host", "/remote/a")
+        assert TransferManifest(self.manifest_path).lookup("host", "/remote/a") is None
+
+
+    def test_batch_writes_once(self):
+        manifest = TransferManifest(self.manifest_path)
+        with manifest.batch():
+            for file_index in range(5):
+                self.record(manifest, "/remote/{}".format(file_index))
+            assert not manifest.journal_path.exists()
+            assert manifest.lookup("host", "/remote/4") is not None
+
+            # Entries written by another process during the batch are kept.
+            self.record(TransferManifest(self.manifest_path), "/remote/other")
+            assert manifest.lookup("host", "/remote/4") is not None
+        with manifest.journal_path.open("r") as journal_handle:
+            assert len(journal_handle.readlines()) == 6
+        assert len(TransferManifest(self.manifest_path)._load()) == 6
+
+
+    def test_batch_of_other_thread(self):
+        manifest = TransferManifest(self.manifest_path)
+        with manifest.batch() as batch:
+            self.record(manifest, "/remote/batched")
+
+            # A transfer of a thread outside the batch is written as it completes.
+            thread = Thread(target=self.record, args=(manifest, "/remote/other"))
+            thread.start()
+            thread.join()
+            assert TransferManifest(self.manifest_path).lookup("host", "/remote/other") is not None
+
+            # A thread that joins the batch has its changes written with the batch.
+            def record_in_batch():
+                with manifest.batch(batch):
+                    self.record(manifest, "/remote/joined")
+            thread = Thread(target=record_in_batch)
+            thread.start()
+            thread.join()
+            assert TransferManifest(self.manifest_path).lookup("host", "/remote/joined") is None
+            assert manifest.lookup("host", "/remote/joined") is not None
+        new_manifest = TransferManifest(self.manifest_path)
+        assert all(new_manifest.lookup("host", remote_path) is not None for remote_path in ["/remote/batched", "/remote/joined"])
+
+
+    def test_journal_compaction(self):
+        manifest = TransferManifest(self.manifest_path, max_journal_entries=4)
+        for file_index in range(10):
+            self.record(manifest, "/remote/{}".format(file_index % 3))
+        manifest.remove("host", "/remote/2")
+
+        # The journal is folded into the snapshot once it has more lines than the limit and the snapshot.
+        with manifest.journal_path.open("r") as journal_handle:
+            assert len(journal_handle.readlines()) <= 4
+        assert os.path.exists(self.manifest_path)
+        assert sorted(os.listdir(self.temp_dir.name)) == sorted(["local.file", "manifest.json", "manifest.json.journal"])
+        new_manifest = TransferManifest(self.manifest_path)
+        assert sorted(new_manifest._load()) == ["host:/remote/0", "host:/remote/1"]
+
+        # A line that is still being written is skipped until it is complete, a line that is never completed does
+        # not corrupt the lines after it.
+        with manifest.journal_path.open("a") as journal_handle:
+            journal_handle.write('["host:/remote/3", {"digest"')
+        assert sorted(new_manifest._load()) == ["host:/remote/0", "host:/remote/1"]
+        self.record(manifest, "/remote/4")
+        assert sorted(new_manifest._load()) == ["host:/remote/0", "host:/remote/1", "host:/remote/4"]
+
+
+if __name__ == '__main__':
+    unittest.main()
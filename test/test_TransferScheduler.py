@@ -0,0 +1,137 @@
+"""These tests check the order in which TransferScheduler starts transfers, its limits and its bandwidth cap. The
+nodes are replaced by objects whose transfers record when they run, so no node is needed.
+"""
+
+import unittest
+from time import time, sleep
+from threading import Event, Lock
+
+from expK8.remoteFS.TransferScheduler import TransferScheduler, _TokenBucket, PRIORITY_STAGING, PRIORITY_ARCHIVE
+
+
+class FakeNode:
+    """Node whose transfers record their source path and wait until released. """
+    def __init__(
+            self,
+            host_name: str,
+            start_list: list,
+            lock: Lock
+    ) -> None:
+        self.host = host_name
+        self.release_event = Event()
+        self.running = 0
+        self.max_running = 0
+        self._start_list = start_list
+        self._lock = lock
+
+
+    def scp(self, source_path, target_path, progress_callback=None, **kwargs):
+        with self._lock:
+            self._start_list.append(source_path)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.release_event.wait(5)
+        if progress_callback is not None:
+            progress_callback(100)
+        with self._lock:
+            self.running -= 1
+        if source_path == "fail":
+            raise IOError("Transfer failed.")
+        return {"size_byte": 100, "source": source_path}
+
+
+    download = scp
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate(self):
+        bucket = _TokenBucket(1000000)
+        start_time = time()
+        # The bucket starts full, so the first second worth of bytes goes through at once.
+        bucket.consume(1000000)
+        assert time() - start_time < 0.1
+        bucket.consume(300000)
+        assert time() - start_time >= 0.25
+
+
+class TestTransferScheduler(unittest.TestCase):
+    def setUp(self):
+        self.start_list = []
+        self.lock = Lock()
+
+
+    def test_priority_order(self):
+        scheduler = TransferScheduler(max_concurrent=1)
+        node = FakeNode("host", self.start_list, self.lock)
+        # The first transfer takes the only slot, the rest are queued.
+        future_list = [scheduler.submit(node, "upload", "first", "target")]
+        future_list.append(scheduler.submit(node, "upload", "archive", "target", priority=PRIORITY_ARCHIVE))
+        future_list.append(scheduler.submit(node, "download", "default_a", "target"))
+        future_list.append(scheduler.submit(node, "upload", "staging", "target", priority=PRIORITY_STAGING))
+        future_list.append(scheduler.submit(node, "upload", "default_b", "target"))
+        assert scheduler.get_stats()["queued"] == 4
+
+        node.release_event.set()
+        assert [future.result(5)["source"] for future in future_list] == ["first", "archive", "default_a", "staging", "default_b"]
+        assert self.start_list == ["first", "staging", "default_a", "default_b", "archive"]
+        scheduler.shutdown()
+
+
+    def test_per_host_limit(self):
+        scheduler = TransferScheduler(max_concurrent=4, max_per_host=1)
+        busy_node = FakeNode("busy", self.start_list, self.lock)
+        idle_node = FakeNode("idle", self.start_list, self.lock)
+        future_list = [scheduler.submit(busy_node, "upload", "busy_{}".format(index), "target") for index in range(3)]
+        future_list.append(scheduler.submit(idle_node, "upload", "idle_0", "target", priority=PRIORITY_ARCHIVE))
+
+        # The transfer to the idle host is not held back by the queued transfers of the busy host.
+        sleep(0.2)
+        assert sorted(self.start_list) == ["busy_0", "idle_0"]
+        assert scheduler.get_stats()["running_per_host"] == {"busy": 1, "idle": 1}
+
+        busy_node.release_event.set()
+        idle_node.release_event.set()
+        for future in future_list:
+            future.result(5)
+        assert busy_node.max_running == 1
+        scheduler.shutdown()
+
+
+    def test_stats(self):
+        scheduler = TransferScheduler()
+        node = FakeNode("host", self.start_list, self.lock)
+        node.release_event.set()
+        progress_list = []
+        ok_future = scheduler.submit(node, "upload", "ok", "target", progress_callback=progress_list.append)
+        fail_future = scheduler.submit(node, "upload", "fail", "target")
+        ok_future.result(5)
+        with self.assertRaises(IOError):
+            fail_future.result(5)
+
+        stat_dict = scheduler.get_stats()
+        assert stat_dict["completed"] == 1 and stat_dict["failed"] == 1 and stat_dict["transferred_byte"] == 200
+        assert progress_list == [100]
+        with self.assertRaises(ValueError):
+            scheduler.submit(node, "sideways", "source", "target")
+        scheduler.shutdown()
+
+
+    def test_submit_from_job_runs_inline(self):
+        scheduler = TransferScheduler(max_concurrent=1)
+        node = FakeNode("host", self.start_list, self.lock)
+        node.release_event.set()
+        inner_future_list = []
+        def progress_callback(num_bytes):
+            # Waiting on a queued transfer here would deadlock as this job holds the only slot.
+            inner_future_list.append(scheduler.submit(node, "upload", "inner", "target"))
+            assert inner_future_list[0].done()
+
+        future = scheduler.submit(node, "upload", "outer", "target", progress_callback=progress_callback)
+        assert future.result(5)["source"] == "outer"
+        assert inner_future_list[0].result()["source"] == "inner"
+        assert scheduler.get_stats()["completed"] == 2
+        scheduler.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
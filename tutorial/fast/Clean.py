@@ -1,3 +1,4 @@
+import re 
 from pathlib import Path 
 from json import loads
 from collections import defaultdict
@@ -103,19 +104,15 @@ def is_replay_running(node: Node) -> bool:
         Returns:
             running: Boolean indicating if any replay processes is found running. 
         """
-        running = False 
-        ps_output = node.ps()
+        process_snapshot = node.processes()
         """There are 3 processes running per block trace replay so we need to check and kill them all. 
             1. nohup - The nohup processing running the TraceReplay.py python script. 
             2. python script - The python script that runs trace replay and tracks
                 memory, cpu and power usage. 
             3. c++ binary - The CacheBench binary running block trace replay. 
         """
-        for ps_row in ps_output.split("\n"):
-            if check_if_replay_process(ps_row):
-                running = True 
-                break
-        return running 
+        return process_snapshot.is_running(CONFIG.replay_python_script_substring) \
+                or process_snapshot.is_running(CONFIG.replay_cachebench_binary_substring)
 
 
 def check_if_replay_process(ps_row: str) -> bool:
@@ -138,17 +135,17 @@ def kill_trace_replay(node: Node) -> None:
     Args:
         node: Node where the process is to be killed. 
     """
-    ps_output = node.ps()
     """There are 3 processes running per block trace replay so we need to check and kill them all. 
         1. nohup - The nohup processing running the TraceReplay.py python script. 
         2. python script - The python script that runs trace replay and tracks
             memory, cpu and power usage. 
         3. c++ binary - The CacheBench binary running block trace replay. 
+    They are killed along with their descendants in a single remote command. 
     """
-    for ps_row in ps_output.split("\n"):
-        if check_if_replay_process(ps_row):
-            pid = int(ps_row.strip().split(' ')[0])
-            node.kill(pid)
+    replay_pattern = "|".join([re.escape(CONFIG.replay_python_script_substring), 
+                                re.escape(CONFIG.replay_cachebench_binary_substring)])
+    for process in node.kill_matching(replay_pattern):
+        print("{}: Killed {} with SIG{}: {}".format(node.host, process["pid"], process["signal"], process["cmdline"]))
 
 
 def kill_ghost_replay() -> None:
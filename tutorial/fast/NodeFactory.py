@@ -7,13 +7,17 @@ from pandas import DataFrame
 from Setup import is_replay_running, test_cachebench, check_file
 
 from expK8.remoteFS.Node import Node
+from expK8.remoteFS.NodeConnector import NodeConnector
+from expK8.remoteFS.NodeDaemon import NodeDaemonClient
 
 
 class NodeFactory:
     def __init__(
         self, 
-        node_config_file_path: str
+        node_config_file_path: str,
+        daemon_client: NodeDaemonClient = None 
     ) -> None:
+        self.daemon_client = daemon_client
         self._load_config(node_config_file_path)
         self._load_nodes()
 
@@ -28,15 +32,21 @@ class NodeFactory:
         
     
     def _load_nodes(self) -> None: 
-        self.nodes = []
+        if self.daemon_client is not None:
+            # Nodes are reached through the daemon, which is already connected to them. 
+            self.nodes = [self.daemon_client.get_node(self.config["nodes"][node_name]["host"]) for node_name in self.config["nodes"]]
+            return 
+
+        node_spec_list = []
         for node_name in self.config["nodes"]:
             node_info = self.config["nodes"][node_name]
-            node = Node(
-                    node_info["host"], 
-                    node_info["host"], 
-                    self.config["creds"][node_info["cred"]], 
-                    self.config["mounts"][node_info["mount"]])
-            self.nodes.append(node)
+            node_spec_list.append({
+                "name": node_info["host"], 
+                "host": node_info["host"], 
+                "cred": self.config["creds"][node_info["cred"]], 
+                "mount_list": self.config["mounts"][node_info["mount"]]
+            })
+        self.nodes = NodeConnector().connect(node_spec_list)
     
 
     def get_node_list(self) -> list:
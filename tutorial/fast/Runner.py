@@ -132,16 +132,11 @@ def transfer_block_trace(
         remote_block_trace_path: Path in remote node where block trace was transfered.
     """
 
-    local_block_trace_size_byte = Path(replay_params["block_trace_path"]).expanduser().stat().st_size
     remote_block_trace_path = get_remote_block_trace_path(replay_params)
-    remote_block_trace_size_byte = node.get_file_size(remote_block_trace_path)
 
-    if local_block_trace_size_byte != remote_block_trace_size_byte:
+    # The manifest records the digest of verified transfers, so a trace of the same size is not mistaken for it. 
+    if not node.is_transferred(replay_params["block_trace_path"], remote_block_trace_path):
         node.scp(replay_params["block_trace_path"], remote_block_trace_path)
-    
-    remote_block_trace_size_byte = node.get_file_size(remote_block_trace_path)
-    assert local_block_trace_size_byte == remote_block_trace_size_byte, \
-        "Remote {} and local {} block trace have differnet sizes.".format(remote_block_trace_size_byte, local_block_trace_size_byte)
 
     return remote_block_trace_path
 
@@ -14,13 +14,7 @@ def is_dd_running(
     Returns:
         is_running: Boolean indicating if the file with the specified path is currently being created using 'dd'. 
     """
-    is_running = False 
-    ps_stdout = node.ps()
-    for ps_row in ps_stdout.split('\n'):
-        if "dd" in ps_row and file_path in ps_row:
-            is_running = True 
-            break 
-    return is_running
+    return node.processes().is_running("dd", file_path)
         
 
 def is_replay_running(node: Node) -> bool:
@@ -32,13 +26,7 @@ def is_replay_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def is_replay_test_running(node: Node) -> bool:
@@ -50,14 +38,8 @@ def is_replay_test_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay test is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
     test_config_file_path = "~/disk/CacheLib/cachelib/cachebench/test_configs/block_replay/sample_config.json"
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row and test_config_file_path in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench", test_config_file_path)
 
 
 def check_file(
@@ -126,22 +108,7 @@ def check_storage_file(
         print("No valid mount found!")
         return 0 
     
-    create_file_ps_row = None
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "dd" not in ps_row:
-            continue 
-        
-        if node.format_path(mountpoint) not in ps_row:
-            continue 
-        
-        if path_relative_to_mountpoint not in ps_row:
-            continue 
-        
-        create_file_ps_row = ps_row 
-        break 
-    
-    create_file_live = create_file_ps_row is not None 
+    create_file_live = node.processes().is_running("dd", node.format_path(mountpoint), path_relative_to_mountpoint)
     if create_file_live:
         return -1 
     else:
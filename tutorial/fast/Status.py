@@ -1,5 +1,8 @@
-
 from NodeFactory import NodeFactory
 
-node_factory = NodeFactory("../fast24/config.json")
+from expK8.remoteFS.NodeDaemon import NodeDaemonClient
+
+# Use the connections of a running NodeDaemon if there is one, else connect to each node. 
+daemon_client = NodeDaemonClient()
+node_factory = NodeFactory("../fast24/config.json", daemon_client=daemon_client if daemon_client.is_running() else None)
 node_factory.print_node_status()
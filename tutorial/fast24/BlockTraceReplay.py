@@ -89,8 +89,9 @@ class BlockTraceReplay:
             chown_mountpoint: Flag indicating whether to change ownership of mountpoints to the user. 
         """
         mount_setup_flag = True 
-        backing_dir_exists = self.remote_fs.dir_exists(host_name, BACKING_FILE_DIR)
-        nvm_dir_exists = self.remote_fs.dir_exists(host_name, NVM_FILE_DIR)
+        path_info_dict = self.remote_fs.stat_paths(host_name, [BACKING_FILE_DIR, NVM_FILE_DIR])
+        backing_dir_exists = path_info_dict[BACKING_FILE_DIR]["type"] == "dir"
+        nvm_dir_exists = path_info_dict[NVM_FILE_DIR]["type"] == "dir"
         
         if backing_dir_exists and nvm_dir_exists:
             base_log_msg = "Mount setup correct."
@@ -152,9 +153,13 @@ class BlockTraceReplay:
         host_name = node.host 
         backing_file_path, nvm_file_path = self.get_backing_file_path(), self.get_nvm_file_path()
 
-        latest_backing_file_size_mb = node.get_file_size(backing_file_path)//(1024**2)
+        path_info_dict = node.stat_paths([backing_file_path, nvm_file_path])
+        backing_file_size_byte = path_info_dict[backing_file_path]["size"]
+        nvm_file_size_byte = path_info_dict[nvm_file_path]["size"]
+
+        latest_backing_file_size_mb = backing_file_size_byte//(1024**2)
         self.base_logger.info("{}: Backing file of size {}MB".format(host_name, latest_backing_file_size_mb))
-        if not node.get_file_size(backing_file_path):
+        if not backing_file_size_byte:
             self.base_logger.info("{}: Creating a backing file.".format(host_name))
             node.create_random_file_nonblock(backing_file_path, self.get_backing_file_size_mb(node))
         else:
@@ -163,9 +168,9 @@ class BlockTraceReplay:
                 node.exec_command(["sudo", "rm", "-rf", backing_file_path])
                 node.create_random_file_nonblock(backing_file_path, self.get_backing_file_size_mb(node))
         
-        latest_nvm_file_size_mb = node.get_file_size(backing_file_path)//(1024**2)
+        latest_nvm_file_size_mb = nvm_file_size_byte//(1024**2)
         self.base_logger.info("{}: NVM file of size {}MB".format(host_name, latest_nvm_file_size_mb))
-        if not node.get_file_size(nvm_file_path):
+        if not nvm_file_size_byte:
             self.base_logger.info("{}: Creating a NVM file.".format(host_name))
             node.create_random_file_nonblock(nvm_file_path, self.get_nvm_file_size_mb(node))
         else:
@@ -199,15 +204,19 @@ class BlockTraceReplay:
         pip3 install ~/disk/CacheLib/phdthesis/cydonia --user
         touch {}""".format(self.package_install_complete_file_path)
 
-        for install_cmd in multi_command_install.split("\n"):
-            self.base_logger.info("{}: Install cmd {}".format(host_name, install_cmd.strip()))
-            stdout, stderr, exit_code = self.remote_fs.get_node(host_name).exec_command(install_cmd.strip().split(' '), timeout=600)
-            if exit_code:
-                self.base_logger.info("{}: Install failed".format(host_name))
-                self.base_logger.info("{}: Install stdout {}".format(host_name, stdout))
-                self.base_logger.info("{}: Install stderr {}".format(host_name, stderr))
-                self.base_logger.info("{}: Install exit code {}".format(host_name, exit_code))
-                self.setup_status_logger.error("{}:cmd={},exit_code={}".format(host_name, install_cmd.strip(), exit_code))
+        script_result = self.remote_fs.get_node(host_name).run_script(multi_command_install, timeout=3600)
+        for step_result in script_result["steps"]:
+            duration_str = "{:.1f}s".format(step_result["duration_sec"]) if step_result["duration_sec"] is not None else "unfinished"
+            self.base_logger.info("{}: Install cmd {} exit code {} in {}".format(
+                                    host_name, step_result["cmd"], step_result["exit_code"], duration_str))
+        if script_result["exit_code"]:
+            failed_step = script_result["failed_step"]
+            failed_cmd = script_result["steps"][failed_step]["cmd"] if failed_step is not None else ""
+            self.base_logger.info("{}: Install failed".format(host_name))
+            self.base_logger.info("{}: Install stdout {}".format(host_name, script_result["stdout"]))
+            self.base_logger.info("{}: Install stderr {}".format(host_name, script_result["stderr"]))
+            self.base_logger.info("{}: Install exit code {}".format(host_name, script_result["exit_code"]))
+            self.setup_status_logger.error("{}:cmd={},exit_code={}".format(host_name, failed_cmd, script_result["exit_code"]))
 
         
     def setup(self) -> None:
@@ -235,17 +244,19 @@ class BlockTraceReplay:
             nvm_file_path = "{}/{}".format(NVM_FILE_DIR, IO_FILE_NAME)
             backing_file_size_mb = self.get_backing_file_size_mb(remote_node)
             nvm_file_size_mb = self.get_nvm_file_size_mb(remote_node)
-            if remote_node.get_file_size(nvm_file_path)//(1024**2) >= nvm_file_size_mb and \
-                remote_node.get_file_size(backing_file_path)//(1024*2) >= backing_file_size_mb:
-                node.touch(self.setup_complete_file_path)
+            path_info_dict = remote_node.stat_paths([backing_file_path, nvm_file_path])
+            current_backing_file_size_mb = path_info_dict[backing_file_path]["size"]//(1024**2)
+            current_nvm_file_size_mb = path_info_dict[nvm_file_path]["size"]//(1024**2)
+            if current_nvm_file_size_mb >= nvm_file_size_mb and current_backing_file_size_mb >= backing_file_size_mb:
+                remote_node.touch(self.setup_complete_file_path)
                 self.base_logger.info("{}: Ready to run experiments.".format(host_name))
             else:
                 self.base_logger.info("{}: Waiting for file creation to complete. Backing: {}/{}, NVM: {}/{}".format(
                     host_name,
                     backing_file_size_mb,
-                    remote_node.get_file_size(backing_file_path)//(1024**2),
+                    current_backing_file_size_mb,
                     nvm_file_size_mb, 
-                    remote_node.get_file_size(nvm_file_path)//(1024**2)))
+                    current_nvm_file_size_mb))
             
             setup_log = "{},{}".format(backing_file_size_mb, nvm_file_size_mb)
             self.setup_status_logger.info("{}:{}".format(host_name, setup_log))
@@ -15,13 +15,7 @@ DISK_MOUNTPOINT, NVM_MOUNTPOINT = "~/disk", "~/nvm"
 def is_replay_running(
     node: Node
 ) -> bool:
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output:
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def create_backing_file(
@@ -114,11 +108,7 @@ def install_packages(node):
     pip3 install ~/disk/CacheLib/phdthesis/cydonia --user
     touch /dev/shm/package.install.done"""
 
-    for install_cmd in multi_command_install.split("\n"):
-        stdout, stderr, exit_code = node.exec_command(install_cmd.strip().split(' '), timeout=600)
-        if exit_code:
-            return exit_code 
-    return 0
+    return node.run_script(multi_command_install, timeout=3600)["exit_code"]
 
 
 def clone_cydonia(node: Node) -> int:
@@ -177,17 +167,10 @@ def install_cachelib(node: Node) -> int:
 
             
 def get_create_file_processes(node: Node) -> list:
-    process_list = []
-    ps_output = node.ps()
     """There are 2 processes that could be running to create file: a nohup process to prevent termination
         and the file creation process. Both contains substring "disk.file" and "dd" in it so we can 
         terminate process containing this substring in kill both processes."""
-    for ps_row in ps_output.split("\n"):
-        is_disk_file_in_ps_command = IO_FILE_NAME in ps_row 
-        is_dd_in_ps_command = "dd" in ps_row 
-        if is_disk_file_in_ps_command and is_dd_in_ps_command:
-            process_list.append(ps_row)
-    return process_list
+    return node.processes().find(IO_FILE_NAME, "dd")
 
 
 def kill_create_file_process(node: Node) -> bool:
@@ -201,8 +184,7 @@ def kill_create_file_process(node: Node) -> bool:
     """
     killed = False  
     create_file_process_list = get_create_file_processes(node)
-    for ps_row in create_file_process_list:
-        pid = int(ps_row.strip().split(' ')[0])
-        node.kill(pid)
+    for process in create_file_process_list:
+        node.kill(process["pid"])
         killed = True 
     return killed 
\ No newline at end of file
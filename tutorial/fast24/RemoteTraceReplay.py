@@ -1,4 +1,5 @@
 """BlockTraceReplay runs block trace replay in remote nodes. """
+import re 
 from time import sleep 
 from json import load, loads, dumps 
 from pathlib import Path 
@@ -7,6 +8,7 @@ from logging import getLogger, Formatter, INFO, handlers, Logger
 
 from expK8.remoteFS.RemoteFS import RemoteFS
 from expK8.remoteFS.Node import Node, RemoteRuntimeError
+from expK8.remoteFS.TraceCache import TraceCache
 from ReplayDB import ReplayDB
 
 from NodeSetup import create_backing_file, create_nvm_file, install_cachelib, install_cydonia
@@ -18,6 +20,8 @@ CONST_DICT = {
     "default_replay_output_dir": "/research2/mtc/cp_traces/pranav/replay",
 
     "remote_block_trace_dir": "/dev/shm",
+    "remote_trace_cache_dir": "/dev/shm/trace_cas",
+    "remote_trace_cache_max_gb": 32,
     "remote_replay_output_dir": "/dev/shm/tracereplay/",
     "remote_setup_status_file": "/dev/shm/setup.status",
     "remote_install_status_file": "/dev/shm/install.status",
@@ -40,10 +44,14 @@ class RemoteTraceReplay:
         Attributes:
             remote_fs: RemoteFS is used to communciate with remote nodes. 
             replay_db: ReplayDB is used to manage output from block trace replay.
+            trace_cache: TraceCache is used to upload each block trace once per remote node. 
             logger: Logger to log important events to a log file. 
         """
         self.remote_fs = remote_fs 
         self.replay_db = ReplayDB("/research2/mtc/cp_traces/pranav/replay/")
+        self.trace_cache = TraceCache(
+                            CONST_DICT["remote_trace_cache_dir"], 
+                            max_size_byte=CONST_DICT["remote_trace_cache_max_gb"]*1024**3)
 
         # Setup logger 
         self.logger = getLogger("remote_trace_replay")
@@ -156,17 +164,17 @@ class RemoteTraceReplay:
         Args:
             node: Node where the process is to be killed. 
         """
-        ps_output = node.ps()
         """There are 3 processes running per block trace replay so we need to check and kill them all. 
             1. nohup - The nohup processing running the TraceReplay.py python script. 
             2. python script - The python script that runs trace replay and tracks
                 memory, cpu and power usage. 
             3. c++ binary - The CacheBench binary running block trace replay. 
+        They are killed along with their descendants in a single remote command. 
         """
-        for ps_row in ps_output.split("\n"):
-            if self.check_if_replay_process(ps_row):
-                pid = int(ps_row.strip().split(' ')[0])
-                node.kill(pid)
+        replay_pattern = "|".join([re.escape(CONST_DICT["replay_python_script_substring"]), 
+                                    re.escape(CONST_DICT["replay_cachebench_binary_substring"])])
+        for process in node.kill_matching(replay_pattern):
+            self.logger.info("{}:killed:pid={},signal={},cmd={}".format(node.host, process["pid"], process["signal"], process["cmdline"]))
     
 
     def kill_create_file_process(
@@ -206,19 +214,15 @@ class RemoteTraceReplay:
         Returns:
             running: Boolean indicating if any replay processes is found running. 
         """
-        running = False 
-        ps_output = node.ps()
+        process_snapshot = node.processes()
         """There are 3 processes running per block trace replay so we need to check and kill them all. 
             1. nohup - The nohup processing running the TraceReplay.py python script. 
             2. python script - The python script that runs trace replay and tracks
                 memory, cpu and power usage. 
             3. c++ binary - The CacheBench binary running block trace replay. 
         """
-        for ps_row in ps_output.split("\n"):
-            if self.check_if_replay_process(ps_row):
-                running = True 
-                break
-        return running 
+        return process_snapshot.is_running(CONST_DICT["replay_python_script_substring"]) \
+                or process_snapshot.is_running(CONST_DICT["replay_cachebench_binary_substring"])
     
 
     def create_file(
@@ -330,21 +334,9 @@ class RemoteTraceReplay:
         install_cydonia(node)
 
         # make sure the latest version of the package is running 
-        remote_trace_path = self.get_remote_block_trace_path(block_trace_path)
-        local_block_trace_size_bytes = Path(block_trace_path).expanduser().stat().st_size
-        remote_block_trace_size_bytes = node.get_file_size(remote_trace_path)
-
-        print("{}: Local trace {}={}, remote trace {}={}".format(host_name, 
-            block_trace_path, 
-            local_block_trace_size_bytes, 
-            remote_trace_path, 
-            remote_block_trace_size_bytes))
-
-        if local_block_trace_size_bytes != remote_block_trace_size_bytes:
-            node.scp(block_trace_path, remote_trace_path)
-            print("{}: Transfer local path {} to remote path {}.".format(host_name, block_trace_path, remote_trace_path))
-        else:
-            print("{}: Corresponding remote path {} already exists for local path {}.".format(host_name, remote_trace_path, block_trace_path))
+        # the trace is uploaded only if the node does not hold a trace with the same contents 
+        remote_trace_path = self.trace_cache.stage(node, block_trace_path, self.get_remote_block_trace_path(block_trace_path))
+        print("{}: Local trace {} staged at remote path {}.".format(host_name, block_trace_path, remote_trace_path))
         
         self.logger.info("{}:start:machine={},trace={},replay={},t1={},t2={}".format(
             host_name,
@@ -423,12 +415,16 @@ class RemoteTraceReplay:
         """
         multi_command_install = """cd ~/disk/CacheLib/phdthesis/; git pull origin main
         pip3 install ~/disk/CacheLib/phdthesis/cydonia --user"""
-        for install_cmd in multi_command_install.split("\n"):
-            stdout, stderr, exit_code = node.exec_command(
-                                            install_cmd.strip().split(' '), 
-                                            timeout=600)
-            if exit_code:
-                raise RemoteRuntimeError(install_cmd, node.host, exit_code, stdout, stderr)
+        script_result = node.run_script(multi_command_install, timeout=1200)
+        if script_result["exit_code"]:
+            failed_step = script_result["failed_step"]
+            failed_cmd = script_result["steps"][failed_step]["cmd"] if failed_step is not None else multi_command_install
+            raise RemoteRuntimeError(
+                    [failed_cmd], 
+                    node.host, 
+                    script_result["exit_code"], 
+                    script_result["stdout"], 
+                    script_result["stderr"])
    
 
     def run(
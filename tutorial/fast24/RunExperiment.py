@@ -8,9 +8,13 @@ from SetupPackages import test_cachebench, setup_cydonia, install_cachebench
 from SetupNode import setup_node
 from ReplayDB import ReplayDB
 from expK8.remoteFS.Node import Node, RemoteRuntimeError
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.TraceCache import TraceCache
 
 
 replay_db = ReplayDB("/research2/mtc/cp_traces/pranav/replay/")
+# Traces are staged in memory as replays read them from /dev/shm, capped so they leave memory for the cache. 
+trace_cache = TraceCache("/dev/shm/trace_cas", max_size_byte=32*1024**3)
 
 with open("./experiments/sample_cp-test_w66.json", "r") as experiment_file_handle:
     experiment_list = load(experiment_file_handle)
@@ -27,13 +31,7 @@ def check_for_complete_experiment(
 def is_replay_running(
     node: Node
 ) -> bool:
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def run_experiment(host_name: str) -> bool:
@@ -48,7 +46,8 @@ def run_experiment(host_name: str) -> bool:
             node_info["host"], 
             node_info["host"], 
             creds[node_info["cred"]], 
-            mounts[node_info["mount"]])
+            mounts[node_info["mount"]],
+            facts_store=FactsStore.from_config(config_dict))
     host_name = node.host 
     machine_name = node.machine_name
 
@@ -114,21 +113,9 @@ def run_next_experiment(node: Node):
         exit_code, stdout, stderr = node.exec_command(chmod_cmd.split(' '))
 
         # make sure the latest version of the package is running 
-        remote_trace_path = get_remote_block_trace_path(replay_db, block_trace_path)
-        local_block_trace_size_bytes = Path(block_trace_path).expanduser().stat().st_size
-        remote_block_trace_size_bytes = node.get_file_size(remote_trace_path)
-
-        print("{}: Local trace {}={}, remote trace {}={}".format(host_name, 
-            block_trace_path, 
-            local_block_trace_size_bytes, 
-            remote_trace_path, 
-            remote_block_trace_size_bytes))
-
-        if local_block_trace_size_bytes != remote_block_trace_size_bytes:
-            node.scp(block_trace_path, remote_trace_path)
-            print("{}: Transfer local path {} to remote path {}.".format(host_name, block_trace_path, remote_trace_path))
-        else:
-            print("{}: Corresponding remote path {} already exists for local path {}.".format(host_name, remote_trace_path, block_trace_path))
+        # the trace is uploaded only if the node does not hold a trace with the same contents 
+        remote_trace_path = trace_cache.stage(node, block_trace_path, get_remote_block_trace_path(replay_db, block_trace_path))
+        print("{}: Local trace {} staged at remote path {}.".format(host_name, block_trace_path, remote_trace_path))
         
         replay_db.mark_replay_started(machine_name, host_name, block_trace_path, replay_rate, t1_size_mb, t2_size_mb)
         replay_cmd = "nohup python3 ~/disk/CacheLib/phdthesis/scripts/fast24/TraceReplay.py {} {} >> /dev/shm/replay.log 2>&1".format(
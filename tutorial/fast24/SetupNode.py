@@ -1,3 +1,4 @@
+import re 
 from json import load 
 
 from expK8.remoteFS.RemoteFS import RemoteFS
@@ -7,13 +8,7 @@ from expK8.remoteFS.Node import Node
 def is_replay_running(
     node: Node
 ) -> bool:
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output:
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def check_if_ps_row_is_cachebench(ps_row: str) -> bool:
@@ -37,52 +32,32 @@ def check_if_dd_nvm_file(ps_row: str) -> bool:
 
 
 def get_create_file_processes(node: Node, path_substr: str) -> list:
-    process_list = []
-    ps_output = node.ps()
-    for ps_row in ps_output.split("\n"):
-        if check_if_dd_backing_file(ps_row) or check_if_dd_nvm_file(ps_row):
-            process_list.append(ps_row)
-    return process_list
+    return [process for process in node.processes() 
+                if check_if_dd_backing_file(process["cmdline"]) or check_if_dd_nvm_file(process["cmdline"])]
 
 
 def get_replay_processes(node: Node) -> list:
-    process_list = []
-    ps_output = node.ps()
-    for ps_row in ps_output.split("\n"):
-        if check_if_ps_row_is_cachebench(ps_row) or check_if_ps_row_is_cydonia(ps_row):
-            process_list.append(ps_row)
-    return process_list
+    return [process for process in node.processes() 
+                if check_if_ps_row_is_cachebench(process["cmdline"]) or check_if_ps_row_is_cydonia(process["cmdline"])]
 
 
 def kill_create_file_process(node: Node, path_substr: str) -> bool:
     killed = False  
     create_file_process_list = get_create_file_processes(node, path_substr)
-    for ps_row in create_file_process_list:
-        pid = int(ps_row.strip().split(' ')[0])
-        node.kill(pid)
+    for process in create_file_process_list:
+        node.kill(process["pid"])
         killed = True 
     return killed 
 
 
 def kill_replay_process(node: Node) -> bool:
-    killed = False  
-    process_list = get_replay_processes(node)
-    for ps_row in process_list:
-        pid = int(ps_row.strip().split(' ')[0])
-        node.kill(pid)
-        killed = True 
-    return killed 
+    replay_pattern = "{}|{}".format(re.escape("bin/cachebench"), re.escape("Replay.py"))
+    return len(node.kill_matching(replay_pattern)) > 0
 
 
 def kill_cachebench_test(node: Node) -> bool:
-    killed = False 
-    process_list = get_replay_processes(node)
-    for ps_row in process_list:
-        if "test_configs/block_replay" in ps_row:
-            pd = int(ps_row.strip().split(' ')[0])
-            node.kill(pid)
-            killed = True 
-    return killed 
+    test_pattern = "({}|{}).*{}".format(re.escape("bin/cachebench"), re.escape("Replay.py"), re.escape("test_configs/block_replay"))
+    return len(node.kill_matching(test_pattern)) > 0
 
 
 def setup_backing_storage(node: Node, force: bool = False) -> bool:
@@ -3,6 +3,7 @@ from json import load, dumps
 from SetupNode import setup_node
 from ReplayDB import ReplayDB
 from expK8.remoteFS.Node import Node, RemoteRuntimeError
+from expK8.remoteFS.FactsStore import FactsStore
 
 
 TEST_CONFIG_PATH = "cachelib/cachebench/test_configs/block_replay/sample_config.json"
@@ -10,13 +11,7 @@ TEST_CONFIG_PATH = "cachelib/cachebench/test_configs/block_replay/sample_config.
 def is_replay_running(
     node: Node
 ) -> bool:
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def install_cachebench(node: Node):
@@ -95,6 +90,7 @@ def setup_packages(config_file_path: str) -> dict:
         creds = config_dict["creds"]
         mounts = config_dict["mounts"]
         nodes = config_dict["nodes"]
+        facts_store = FactsStore.from_config(config_dict)
     
     setup_status = {}
     for node_name in nodes:
@@ -102,7 +98,8 @@ def setup_packages(config_file_path: str) -> dict:
         node = Node(node_info["host"], 
                         node_info["host"], 
                         creds[node_info["cred"]], 
-                        mounts[node_info["mount"]])
+                        mounts[node_info["mount"]],
+                        facts_store=facts_store)
 
 
         if is_replay_running(node):
@@ -28,22 +28,7 @@ def check_storage_file(
         print("No valid mount found!")
         return 0 
     
-    create_file_ps_row = None
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "dd" not in ps_row:
-            continue 
-        
-        if node.format_path(mountpoint) not in ps_row:
-            continue 
-        
-        if path_relative_to_mountpoint not in ps_row:
-            continue 
-        
-        create_file_ps_row = ps_row 
-        break 
-    
-    create_file_live = create_file_ps_row is not None 
+    create_file_live = node.processes().is_running("dd", node.format_path(mountpoint), path_relative_to_mountpoint)
     if create_file_live:
         return -1 
     else:
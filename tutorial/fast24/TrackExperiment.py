@@ -3,9 +3,12 @@ from pathlib import Path
 from RunExperiment import is_replay_running
 from ReplayDB import ReplayDB
 from expK8.remoteFS.Node import Node, RemoteRuntimeError
+from expK8.remoteFS.FactsStore import FactsStore
+from expK8.remoteFS.TransferScheduler import TransferScheduler, PRIORITY_ARCHIVE
 
 
 replay_db = ReplayDB("/research2/mtc/cp_traces/pranav/replay/")
+transfer_scheduler = TransferScheduler()
 
 
 
@@ -62,6 +65,7 @@ def track_all_experiments(config_file_path: str) -> dict:
         creds = config_dict["creds"]
         mounts = config_dict["mounts"]
         nodes = config_dict["nodes"]
+        facts_store = FactsStore.from_config(config_dict)
 
     status = {}
     for node_name in nodes:
@@ -69,7 +73,8 @@ def track_all_experiments(config_file_path: str) -> dict:
         node = Node(node_info["host"], 
                         node_info["host"], 
                         creds[node_info["cred"]], 
-                        mounts[node_info["mount"]])
+                        mounts[node_info["mount"]],
+                        facts_store=facts_store)
         
         is_replay_running_flag = is_replay_running(node)
         has_output_file = check_for_complete_experiment(node)
@@ -103,13 +108,18 @@ def track_all_experiments(config_file_path: str) -> dict:
                 remote_stderr_file_path = "{}/stderr.dump".format(remote_output_dir)
                 remote_stdout_file_path = "{}/stdout.dump".format(remote_output_dir)
 
-                node.download(remote_stat_file_path, stat_file_path)
-                node.download(remote_ts_stat_file_path, ts_stat_file_path)
-                node.download(remote_config_file_path, config_file_path)
-                node.download(remote_power_file_path, power_file_path)
-                node.download(remote_usage_file_path, usage_file_path)
-                node.download(remote_stderr_file_path, stderr_file_path)
-                node.download(remote_stdout_file_path, stdout_file_path)
+                # Outputs are archived with low priority so they do not hold back staging traces to idle nodes. 
+                future_list = [transfer_scheduler.submit(node, "download", remote_path, local_path, priority=PRIORITY_ARCHIVE)
+                                for remote_path, local_path in [
+                                    (remote_stat_file_path, stat_file_path),
+                                    (remote_ts_stat_file_path, ts_stat_file_path),
+                                    (remote_config_file_path, config_file_path),
+                                    (remote_power_file_path, power_file_path),
+                                    (remote_usage_file_path, usage_file_path),
+                                    (remote_stderr_file_path, stderr_file_path),
+                                    (remote_stdout_file_path, stdout_file_path)]]
+                for future in future_list:
+                    future.result()
 
                 if Path(stat_file_path).exists():
                     node.rm(remote_stat_file_path)
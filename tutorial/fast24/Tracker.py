@@ -2,6 +2,7 @@ from json import load
 from time import sleep 
 
 from expK8.remoteFS.RemoteFS import RemoteFS
+from expK8.remoteFS.NodeDaemon import NodeDaemonClient
 
 from RunExperiment import is_replay_running
 
@@ -14,23 +15,68 @@ class Tracker:
         self.config_file_path = config_file_path
     
 
+    @staticmethod
+    def get_output_size(node) -> int:
+        return node.get_file_size("/dev/shm/tracereplay/stat0.out")
+
+
+    @staticmethod
+    def print_status(
+        node_dict: dict,
+        replay_running_dict: dict,
+        output_size_dict: dict 
+    ) -> None:
+        for host_name, node in node_dict.items():
+            print(host_name, replay_running_dict[host_name])
+
+            if replay_running_dict[host_name] is True:
+                print("{}: {}: Live".format(host_name, node.name))
+            else:
+                if isinstance(output_size_dict[host_name], int) and output_size_dict[host_name]:
+                    print("{}: Complete experiment detected".format(host_name))
+                else:
+                    print("{}: Not running".format(host_name))
+
+
+    def track_with_daemon(
+        self,
+        client: NodeDaemonClient
+    ) -> None:
+        """Print the status of nodes through a running NodeDaemon, which keeps its connections open across runs."""
+        node_dict = {host_name: client.get_node(host_name) for host_name in client.request("hosts", live=True)}
+        replay_running_dict, output_size_dict = {}, {}
+        for host_name, node in node_dict.items():
+            try:
+                replay_running_dict[host_name] = is_replay_running(node)
+                output_size_dict[host_name] = self.get_output_size(node)
+            except Exception as e:
+                replay_running_dict.setdefault(host_name, e)
+                output_size_dict[host_name] = e 
+        self.print_status(node_dict, replay_running_dict, output_size_dict)
+
+
     def start_tracking(self):
+        client = NodeDaemonClient()
+        if client.is_running():
+            self.track_with_daemon(client)
+            client.close()
+            return 
+
+        # No daemon is running, so connect to the nodes directly. 
+        fs, fs_config = None, None 
         while True:
             with open(self.config_file_path, "r") as config_file_handle:
-                fs_config = load(config_file_handle)
-            fs = RemoteFS(fs_config)
-
-            for host_name in fs.get_all_live_host_names():
-                node = fs.get_node(host_name)
-                print(host_name, is_replay_running(node))
+                latest_fs_config = load(config_file_handle)
+            
+            # Only reconnect when nodes were added or removed from the configuration. 
+            if latest_fs_config != fs_config:
+                fs_config = latest_fs_config
+                fs = RemoteFS(fs_config)
 
-                if is_replay_running(node):
-                    print("{}: {}: Live".format(host_name, node.name))
-                else:
-                    if node.get_file_size("/dev/shm/tracereplay/stat0.out"):
-                        print("{}: Complete experiment detected".format(host_name))
-                    else:
-                        print("{}: Not running".format(host_name))
+            replay_running_dict = fs.gather(is_replay_running)
+            output_size_dict = fs.gather(self.get_output_size)
+            node_dict = {host_name: fs.get_node(host_name) for host_name in fs.get_all_live_host_names()}
+            self.print_status(node_dict, replay_running_dict, output_size_dict)
             break 
 
 
@@ -13,13 +13,7 @@ def is_replay_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 class LiveExperiments:
@@ -27,16 +27,11 @@ def transfer_block_trace(
         remote_block_trace_path: Path in remote node where block trace was transfered.
     """
 
-    local_block_trace_size_byte = Path(replay_params["block_trace_path"]).expanduser().stat().st_size
     remote_block_trace_path = get_remote_block_trace_path(replay_params)
-    remote_block_trace_size_byte = node.get_file_size(remote_block_trace_path)
 
-    if local_block_trace_size_byte != remote_block_trace_size_byte:
+    # The manifest records the digest of verified transfers, so a trace of the same size is not mistaken for it. 
+    if not node.is_transferred(replay_params["block_trace_path"], remote_block_trace_path):
         node.scp(replay_params["block_trace_path"], remote_block_trace_path)
-    
-    remote_block_trace_size_byte = node.get_file_size(remote_block_trace_path)
-    assert local_block_trace_size_byte == remote_block_trace_size_byte, \
-        "Remote {} and local {} block trace have differnet sizes.".format(remote_block_trace_size_byte, local_block_trace_size_byte)
 
     return remote_block_trace_path
 
@@ -248,16 +243,9 @@ def run_experiment(
     Returns:
         running: Boolean indicating if new block trace replay was started. 
     """
-    local_block_trace_size_bytes = Path(local_block_trace_path).expanduser().stat().st_size
-    remote_block_trace_size_bytes = node.get_file_size(remote_block_trace_path)
-
-    if local_block_trace_size_bytes != remote_block_trace_size_bytes:
+    if not node.is_transferred(local_block_trace_path, remote_block_trace_path):
         node.scp(local_block_trace_path, remote_block_trace_path)
     
-    remote_block_trace_size_bytes = node.get_file_size(remote_block_trace_path)
-    assert local_block_trace_size_bytes == remote_block_trace_size_bytes, \
-        "Local {} and remote trace {} not the same size.".format(local_block_trace_size_bytes, remote_block_trace_size_bytes)
-    
     experiment_name_str = get_experiment_name_str(t1_size_mb, t2_size_mb, replay_rate, max_pending_block_requests, 
                                                     num_block_threads, num_async_threads, iteration)
     workload_name_str = get_workload_name(local_block_trace_path)
@@ -329,13 +317,7 @@ def is_replay_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def runner(args):
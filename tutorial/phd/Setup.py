@@ -13,13 +13,7 @@ def is_replay_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench")
 
 
 def is_replay_test_running(node: Node) -> bool:
@@ -31,13 +25,7 @@ def is_replay_test_running(node: Node) -> bool:
     Returns:
         running: Boolean indicating if trace replay test is already running in the node. 
     """
-    running = False 
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "bin/cachebench" in ps_row and CACHELIB_TEST_CONFIG_FILE_PATH in ps_row:
-            running = True 
-            break 
-    return running
+    return node.processes().is_running("bin/cachebench", CACHELIB_TEST_CONFIG_FILE_PATH)
 
 
 def check_storage_file(
@@ -64,22 +52,7 @@ def check_storage_file(
         print("No valid mount found!")
         return 0 
     
-    create_file_ps_row = None
-    ps_output = node.ps()
-    for ps_row in ps_output.split('\n'):
-        if "dd" not in ps_row:
-            continue 
-        
-        if node.format_path(mountpoint) not in ps_row:
-            continue 
-        
-        if path_relative_to_mountpoint not in ps_row:
-            continue 
-        
-        create_file_ps_row = ps_row 
-        break 
-    
-    create_file_live = create_file_ps_row is not None 
+    create_file_live = node.processes().is_running("dd", node.format_path(mountpoint), path_relative_to_mountpoint)
     if create_file_live:
         return -1 
     else: